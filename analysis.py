@@ -0,0 +1,917 @@
+"""
+Document Analysis for DocuSense AI
+Prompt templates, OpenAI calls and map-reduce analysis of long documents,
+independent of the Streamlit UI
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chunking import chunk_text, count_tokens
+from json_stream import IncrementalJSONParser
+from llm_backend import client_backend
+from metrics import annotate, record_failed_call, record_usage, span, with_current_trace
+from invoice_checker import format_check_summary, merge_invoice_feedback
+from model_router import ROUTER, TEMPERATURE
+from near_duplicates import signature
+from preanalysis import format_digest
+from response_cache import make_key, normalize_text
+from revisions import MAX_SECTION_MULTIPLE, SECTION_TOKENS, Revision, section_target
+from schemas import (feedback_schema, list_fields, parse_feedback, repair_prompt, response_format, revision_schema,
+                     section_field, subschema, validate_feedback)
+
+# Model families that accept a JSON schema as response_format; others get JSON mode
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+# A repair asks only for the fields missing from the first reply
+REPAIR_MAX_TOKENS = 800
+
+# Documents too long for one routed request are analyzed in chunks of at most
+# this many tokens; smaller chunks finish sooner, and latency is bounded by the slowest one
+CHUNK_TOKENS = int(os.getenv("DOCUSENSE_CHUNK_TOKENS", "6000"))
+CHUNK_CONCURRENCY = int(os.getenv("DOCUSENSE_CHUNK_CONCURRENCY", "4"))
+
+# Chunks never shrink below this, however much room a job description takes
+MIN_CHUNK_TOKENS = 1000
+
+# Sections whose list feedback one revision request asks for; more would overflow the reply
+MAX_LISTED_SECTIONS = 8
+
+# A revision whose changed sections hold more than this share of the document is read whole again
+MAX_UPDATE_SHARE = 0.5
+
+# Words of the outline sent with a revision's changed sections, shared among all sections
+OUTLINE_WORDS = 240
+
+# Bump whenever the prompts or parsing change so cached responses are invalidated
+PROMPT_VERSION = "3"
+
+SYSTEM_PROMPT = "You are an expert document analyzer providing detailed, constructive feedback."
+
+RESPONSE_FORMATS = {
+    "Student Essay": """
+        {{
+            "overall_score": <score out of 100>,
+            "grammar_score": <score out of 100>,
+            "content_score": <score out of 100>,
+            "structure_score": <score out of 100>,
+            "grammar_issues": [<list of grammar errors with corrections>],
+            "content_feedback": "<detailed feedback on content quality, arguments, and ideas>",
+            "structure_feedback": "<feedback on essay structure, flow, and organization>",
+            "suggestions": [<list of specific improvement suggestions>],
+            "strengths": [<list of essay strengths>],
+            "areas_for_improvement": [<list of areas that need work>]
+        }}
+        """,
+
+    "Resume": """
+        {{
+            "overall_score": <score out of 100>,
+            "content_score": <score out of 100>,
+            "formatting_score": <score out of 100>,
+            "impact_score": <score out of 100>,
+            "content_feedback": "<detailed feedback on resume content, skills, and experience>",
+            "formatting_feedback": "<feedback on layout, structure, and presentation>",
+            "impact_feedback": "<feedback on how compelling and impactful the resume is>",
+            "suggestions": [<list of specific improvement suggestions>],
+            "strengths": [<list of resume strengths>],
+            "areas_for_improvement": [<list of areas that need work>],
+            "keywords_missing": [<list of relevant keywords that could be added>]
+        }}
+        """,
+
+    "Invoice": """
+        {{
+            "overall_score": <score out of 100>,
+            "completeness_score": <score out of 100>,
+            "clarity_score": <score out of 100>,
+            "professionalism_score": <score out of 100>,
+            "completeness_feedback": "<feedback on whether all required invoice elements are present>",
+            "clarity_feedback": "<feedback on clarity and readability of the invoice>",
+            "professionalism_feedback": "<feedback on professional presentation and formatting>",
+            "suggestions": [<list of specific improvement suggestions>],
+            "strengths": [<list of invoice strengths>],
+            "areas_for_improvement": [<list of areas that need work>],
+            "missing_elements": [<list of missing invoice elements>]
+        }}
+        """
+}
+
+PROMPT_TEMPLATES = {
+    "Student Essay": """
+        Analyze the following student essay and provide comprehensive feedback:
+        {part_note}
+        ESSAY:
+        {text}
+
+        Please provide feedback in the following JSON format:""" + RESPONSE_FORMATS["Student Essay"],
+
+    "Resume": """
+        Analyze the following resume and provide professional feedback:
+        {part_note}
+        RESUME:
+        {text}
+
+        Please provide feedback in the following JSON format:""" + RESPONSE_FORMATS["Resume"],
+
+    "Invoice": """
+        Analyze the following invoice document and provide feedback:
+        {part_note}
+        INVOICE:
+        {text}
+
+        Please provide feedback in the following JSON format:""" + RESPONSE_FORMATS["Invoice"]
+}
+
+# Used when part of the analysis was computed locally: essays send a digest
+# instead of the full text, and invoices ask only for the subjective scores
+LOCAL_PROMPT_TEMPLATES = {
+    "Student Essay": """
+        Analyze the following student essay and provide comprehensive feedback.
+        The essay was pre-processed locally: instead of the full text you are given its
+        writing statistics, introduction, topic sentences, conclusion and the sentences
+        flagged for possible grammar or style problems. Base grammar_issues on the
+        flagged sentences and use the statistics when judging grammar and structure.
+
+        ESSAY DIGEST:
+        {text}
+
+        Please provide feedback in the following JSON format:""" + RESPONSE_FORMATS["Student Essay"],
+
+    "Invoice": """
+        Review the clarity and professionalism of the following invoice.
+        Its completeness and line-item arithmetic have already been checked locally,
+        with this result. The line-item table itself is replaced by that summary.{part_note}
+        {local_summary}
+
+        INVOICE:
+        {text}
+
+        Please provide feedback in the following JSON format:
+        {{
+            "clarity_score": <score out of 100>,
+            "professionalism_score": <score out of 100>,
+            "clarity_feedback": "<feedback on clarity and readability of the invoice>",
+            "professionalism_feedback": "<feedback on professional presentation and formatting>",
+            "suggestions": [<list of specific improvement suggestions>],
+            "strengths": [<list of invoice strengths>],
+            "areas_for_improvement": [<list of areas that need work>]
+        }}
+        """
+}
+
+
+REVISION_NOTE = """
+        The document is split into numbered sections. {scope}.
+"""
+
+
+REVISION_UPDATE_NOTE = """
+        This is a revision of a document reviewed before, when it scored {scores}.
+        Only its changed sections are given in full, after an outline of the whole
+        document. Update the scores and overall feedback for the revised document,
+        and {scope}.
+"""
+
+
+JOB_NOTE = """
+        The candidate is applying for the role described below. Judge content and impact
+        against it, and list in keywords_missing the skills and terms it asks for that
+        the resume lacks.
+
+        JOB DESCRIPTION:
+        {job_description}
+"""
+
+
+def _part_note(part, total_parts):
+    if part is None:
+        return ""
+    return (
+        f"\n        This is part {part} of {total_parts} of a longer document. "
+        "Assess only this part; the parts are combined afterwards.\n"
+    )
+
+
+def build_local_prompt(text, mode, local_analysis, part=None, total_parts=None):
+    """Fill the mode's template for a document with a local analysis result
+
+    For an invoice, text is the part of the invoice sent alongside the check.
+    """
+    if mode == "Student Essay":
+        return LOCAL_PROMPT_TEMPLATES[mode].format(text=format_digest(local_analysis))
+    return LOCAL_PROMPT_TEMPLATES[mode].format(
+        text=text, local_summary=format_check_summary(local_analysis), part_note=_part_note(part, total_parts)
+    )
+
+
+def build_prompt(text, mode, part=None, total_parts=None, job_description=None):
+    """Fill the mode's prompt template, noting which part of a long document this is
+
+    With a job_description the document is judged against that role.
+    """
+    part_note = _part_note(part, total_parts)
+    if job_description:
+        part_note += JOB_NOTE.format(job_description=job_description)
+    return PROMPT_TEMPLATES[mode].format(text=text, part_note=part_note)
+
+
+def _messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _route(prompt, mode):
+    return ROUTER.route(mode, count_tokens(SYSTEM_PROMPT) + count_tokens(prompt))
+
+
+def _completion_params(messages, schema, route, model=None, max_tokens=None):
+    model = model or route["model"]
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": route["temperature"],
+        "max_tokens": max_tokens or route["max_tokens"],
+        "response_format": response_format(schema, "feedback", strict=model.startswith(STRUCTURED_OUTPUT_MODELS)),
+        "timeout": route["timeout_s"]
+    }
+
+
+def _repair_messages(prompt, reply, schema, missing):
+    """Continue the conversation, asking only for the fields the reply lacked"""
+    return _messages(prompt) + [
+        {"role": "assistant", "content": reply},
+        {"role": "user", "content": repair_prompt(schema, missing)}
+    ]
+
+
+def _complete_feedback(feedback, schema):
+    """Fill an overall score the model never gave from the other scores"""
+    if not feedback:
+        raise ValueError("The model's reply could not be parsed as feedback")
+    scores = [value for key, value in feedback.items() if key.endswith("_score") and key != "overall_score"]
+    if "overall_score" in schema["properties"] and "overall_score" not in feedback and scores:
+        feedback["overall_score"] = round(sum(scores) / len(scores))
+    return feedback
+
+
+def _record_usage(usage, params, reply, attrs):
+    """Count a call's tokens, counting locally when the reply carried no usage"""
+    if usage is not None and getattr(usage, "total_tokens", 0):
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        prompt_tokens = sum(count_tokens(message["content"]) for message in params["messages"])
+        completion_tokens = count_tokens(reply)
+    attrs.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    record_usage(params["model"], prompt_tokens, completion_tokens)
+    return prompt_tokens, completion_tokens
+
+
+def _create(client, messages, schema, route, max_tokens=None, **attrs):
+    """Make one chat completion on the routed model and return its text
+
+    A call that times out is retried once on the route's fallback model.
+    Each call is timed and its usage recorded.
+    """
+    model = route["model"]
+    while True:
+        params = _completion_params(messages, schema, route, model, max_tokens)
+        started = time.perf_counter()
+        with span("llm", model=model, **attrs) as call_attrs:
+            try:
+                response = client.chat.completions.create(**params)
+            except Exception as e:
+                record_failed_call(model)
+                call_attrs["error"] = True
+                model = ROUTER.fallback(route, model, e)
+                if model is None:
+                    raise
+                continue
+            reply = response.choices[0].message.content or ""
+            tokens = _record_usage(response.usage, params, reply, call_attrs)
+        ROUTER.observe(params["model"], *tokens, time.perf_counter() - started)
+        return reply
+
+
+async def _create_async(client, messages, schema, route, max_tokens=None, **attrs):
+    """Awaitable _create for an AsyncOpenAI client"""
+    model = route["model"]
+    while True:
+        params = _completion_params(messages, schema, route, model, max_tokens)
+        started = time.perf_counter()
+        with span("llm", model=model, **attrs) as call_attrs:
+            try:
+                response = await client.chat.completions.create(**params)
+            except Exception as e:
+                record_failed_call(model)
+                call_attrs["error"] = True
+                model = ROUTER.fallback(route, model, e)
+                if model is None:
+                    raise
+                continue
+            reply = response.choices[0].message.content or ""
+            tokens = _record_usage(response.usage, params, reply, call_attrs)
+        ROUTER.observe(params["model"], *tokens, time.perf_counter() - started)
+        return reply
+
+
+def _parse(reply, schema):
+    with span("parse"):
+        return parse_feedback(reply, schema)
+
+
+def repair_feedback(client, prompt, reply, schema, missing, route):
+    """Request only the missing fields, returning whichever come back valid"""
+    try:
+        repair_reply = _create(
+            client, _repair_messages(prompt, reply, schema, missing), subschema(schema, missing), route,
+            max_tokens=REPAIR_MAX_TOKENS, repair=True
+        )
+    except Exception:
+        # A failed repair shouldn't discard the fields already paid for
+        return {}
+    repaired, _ = _parse(repair_reply, subschema(schema, missing))
+    return repaired
+
+
+async def repair_feedback_async(client, prompt, reply, schema, missing, route):
+    """Awaitable repair_feedback for an AsyncOpenAI client"""
+    try:
+        repair_reply = await _create_async(
+            client, _repair_messages(prompt, reply, schema, missing), subschema(schema, missing), route,
+            max_tokens=REPAIR_MAX_TOKENS, repair=True
+        )
+    except Exception:
+        return {}
+    repaired, _ = _parse(repair_reply, subschema(schema, missing))
+    return repaired
+
+
+def request_feedback(client, prompt, schema, mode):
+    """Send one analysis prompt to the mode's routed model and return the validated feedback
+
+    Fields missing from the reply are requested again.
+    """
+    route = _route(prompt, mode)
+    reply = _create(client, _messages(prompt), schema, route)
+    feedback, missing = _parse(reply, schema)
+    if missing:
+        feedback.update(repair_feedback(client, prompt, reply, schema, missing, route))
+    return _complete_feedback(feedback, schema)
+
+
+async def request_feedback_async(client, prompt, schema, mode):
+    """Send one analysis prompt with an AsyncOpenAI client"""
+    route = _route(prompt, mode)
+    reply = await _create_async(client, _messages(prompt), schema, route)
+    feedback, missing = _parse(reply, schema)
+    if missing:
+        feedback.update(await repair_feedback_async(client, prompt, reply, schema, missing, route))
+    return _complete_feedback(feedback, schema)
+
+
+def _merge_list(values):
+    """Concatenate lists, dropping case-insensitive duplicates but keeping order"""
+    merged = []
+    seen = set()
+    for items in values:
+        for item in items:
+            key = json.dumps(item, sort_keys=True).lower() if not isinstance(item, str) else item.strip().lower()
+            if key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+
+def merge_feedback(results, weights=None):
+    """Reduce per-chunk feedback into a single result with the same schema
+
+    Scores are averaged (weighted by chunk size when weights are given),
+    lists are merged and deduplicated, and text feedback is joined.
+    """
+    if len(results) == 1:
+        return results[0]
+
+    weights = weights or [1] * len(results)
+    merged = {}
+    keys = []
+    for result in results:
+        keys.extend(key for key in result if key not in keys)
+
+    for key in keys:
+        present = [(result[key], weight) for result, weight in zip(results, weights) if key in result]
+        values = [value for value, _ in present]
+
+        if key.endswith("_score"):
+            numeric = [(value, weight) for value, weight in present if isinstance(value, (int, float))]
+            total_weight = sum(weight for _, weight in numeric)
+            if total_weight:
+                merged[key] = round(sum(value * weight for value, weight in numeric) / total_weight)
+        elif all(isinstance(value, list) for value in values):
+            merged[key] = _merge_list(values)
+        else:
+            merged[key] = "\n\n".join(str(value) for value in values if value)
+
+    return merged
+
+
+def input_token_budget():
+    """Return the most document tokens a chunk may carry, whichever model it is routed to"""
+    return min(CHUNK_TOKENS, ROUTER.smallest_context_budget())
+
+
+def plan_requests(text, mode, local_analysis=None, job_description=None):
+    """Return the prompts for a document and the chunk weights used to merge them
+
+    A document goes in one request when a model the mode routes to can take
+    it within its context and latency target; otherwise it is chunked.
+    """
+    with span("prompt") as attrs:
+        weights = None
+        # A job description rides along in every request, leaving less room for the document
+        job_tokens = count_tokens(job_description) if job_description else 0
+        if mode == "Student Essay" and _uses_local_analysis(mode, local_analysis):
+            # The digest is bounded by its sentence limits, whatever the essay's length
+            prompts = [build_local_prompt(text, mode, local_analysis)]
+        elif _uses_local_analysis(mode, local_analysis):
+            # An invoice whose table wasn't found still carries its whole text
+            body = local_analysis.get("prompt_text") or text
+            if count_tokens(body) <= ROUTER.input_budget(mode):
+                prompts = [build_local_prompt(body, mode, local_analysis)]
+            else:
+                chunks = chunk_text(body, max(input_token_budget(), MIN_CHUNK_TOKENS))
+                prompts = [
+                    build_local_prompt(chunk, mode, local_analysis, i, len(chunks)) for i, chunk in enumerate(chunks, 1)
+                ]
+                weights = [count_tokens(chunk) for chunk in chunks]
+        elif count_tokens(text) <= ROUTER.input_budget(mode) - job_tokens:
+            prompts = [build_prompt(text, mode, job_description=job_description)]
+        else:
+            chunks = chunk_text(text, max(input_token_budget() - job_tokens, MIN_CHUNK_TOKENS))
+            prompts = [
+                build_prompt(chunk, mode, i, len(chunks), job_description) for i, chunk in enumerate(chunks, 1)
+            ]
+            weights = [count_tokens(chunk) for chunk in chunks]
+        attrs["requests"] = len(prompts)
+    return prompts, weights
+
+
+def _uses_local_analysis(mode, local_analysis):
+    return local_analysis is not None and mode in LOCAL_PROMPT_TEMPLATES
+
+
+def _schema(mode, local_analysis):
+    return feedback_schema(mode, local=_uses_local_analysis(mode, local_analysis))
+
+
+def _cache_version(mode, local_analysis, job_description=None):
+    version = PROMPT_VERSION + ("-local" if _uses_local_analysis(mode, local_analysis) else "")
+    if job_description:
+        # The same resume screened for different roles is cached once per role
+        version += "-job-" + hashlib.sha256(normalize_text(job_description).encode("utf-8")).hexdigest()[:16]
+    return version
+
+
+def _model_tag(client):
+    """Identify the model choice in cache keys, and the backend when it isn't OpenAI
+
+    Fake and replayed feedback then never answers for, or is matched as a
+    near-duplicate of, a real analysis sharing the same cache directory.
+    """
+    backend = client_backend(client)
+    return ROUTER.cache_tag() if backend == "openai" else f"{backend}:{ROUTER.cache_tag()}"
+
+
+def feedback_cache_key(text, mode, client, local_analysis=None, job_description=None):
+    """Return the response cache key a document's feedback from client is stored under"""
+    return make_key(mode, _model_tag(client), TEMPERATURE, _cache_version(mode, local_analysis, job_description), text)
+
+
+def _near_duplicate_lookup(text, mode, client, key, cache, refresh, local_analysis=None, job_description=None):
+    """Find an earlier, nearly identical document in the cache's near-duplicate index
+
+    Returns (feedback, finish). feedback is the match's cached feedback
+    adapted to this document, or None when there is nothing to reuse or
+    refresh is set. Call finish(feedback) with fresh feedback to flag any
+    match, cache the feedback and index the document.
+    """
+    index = cache.near_duplicates if cache is not None else None
+    if index is None:
+        def store(feedback):
+            if cache is not None:
+                cache.put(key, feedback)
+            return feedback
+        return None, store
+
+    namespace = f"{mode}|{_model_tag(client)}|{TEMPERATURE}|{_cache_version(mode, local_analysis, job_description)}"
+    with span("near_duplicates") as attrs:
+        sig = signature(text)
+        # An entry for this exact text is a plain cache hit or miss, not a near-duplicate
+        matches = [match for match in index.find(namespace, sig=sig) if match["feedback_key"] != key]
+        match = matches[0] if matches else None
+        reused = None
+        if match is not None and not refresh:
+            reused = cache.get(match["feedback_key"])
+        attrs["similarity"] = match["similarity"] if match else None
+
+    def finish(feedback):
+        feedback = _flag_near_duplicate(feedback, mode, match, reused is not None)
+        cache.put(key, feedback)
+        index.add(namespace, key, sig=sig)
+        return feedback
+
+    if reused is not None:
+        annotate(near_duplicate=match["similarity"])
+        # Locally computed fields are recomputed for this document; the model's judgement is reused
+        reused = finish(_add_local_metrics(dict(reused), mode, local_analysis))
+    return reused, finish
+
+
+def _flag_near_duplicate(feedback, mode, match, reused):
+    """Record a near-duplicate match, and warn of possible plagiarism in Student Essay mode"""
+    if match is None:
+        return feedback
+    analyzed_on = time.strftime("%Y-%m-%d", time.localtime(match["analyzed_at"]))
+    feedback["near_duplicate"] = {"similarity": match["similarity"], "analyzed_on": analyzed_on, "reused_feedback": reused}
+    if mode == "Student Essay":
+        warning = (
+            f"Possible plagiarism or resubmission: this essay is {round(match['similarity'] * 100)}% similar "
+            f"to a submission analyzed on {analyzed_on}"
+        )
+        areas = [area for area in feedback.get("areas_for_improvement") or [] if area != feedback.get("plagiarism_warning")]
+        feedback["plagiarism_warning"] = warning
+        feedback["areas_for_improvement"] = [warning] + areas
+    return feedback
+
+
+def _local_fields(mode, local_analysis):
+    """Return the feedback fields computed locally, before any model output"""
+    if not _uses_local_analysis(mode, local_analysis):
+        return {}
+    if mode == "Invoice":
+        keys = ("completeness_score", "completeness_feedback", "missing_elements", "detected_fields", "table_check")
+        return {key: local_analysis.get(key) for key in keys}
+    return {"writing_statistics": local_analysis["statistics"]}
+
+
+def _add_local_metrics(feedback, mode, local_analysis):
+    """Fold the locally computed results into the model's feedback"""
+    if mode == "Invoice" and _uses_local_analysis(mode, local_analysis):
+        return merge_invoice_feedback(local_analysis, feedback)
+    feedback.update(_local_fields(mode, local_analysis))
+    return feedback
+
+
+def analyze_text(text, mode, client, max_concurrency=CHUNK_CONCURRENCY, cache=None, refresh=False, local_analysis=None,
+                 job_description=None):
+    """Analyze a document, reusing cached feedback when available
+
+    Long documents are mapped over concurrent chunk requests. With a
+    local_analysis (an essay digest or an invoice check) only the parts the
+    model still has to judge are requested. A job_description has a resume
+    judged against that role. With refresh=True the cache is not read, but
+    the fresh result is stored. When the cache has a near-duplicate index,
+    a nearly identical earlier document's feedback is reused and flagged.
+    """
+    key = feedback_cache_key(text, mode, client, local_analysis, job_description)
+    if cache is not None and not refresh:
+        feedback = cache.get(key)
+        annotate(cache_hit=feedback is not None)
+        if feedback is not None:
+            return feedback
+
+    # Nearly identical documents reuse the feedback already given
+    reused, finish = _near_duplicate_lookup(text, mode, client, key, cache, refresh, local_analysis, job_description)
+    if reused is not None:
+        return reused
+
+    prompts, weights = plan_requests(text, mode, local_analysis, job_description)
+    schema = _schema(mode, local_analysis)
+    if len(prompts) == 1:
+        feedback = request_feedback(client, prompts[0], schema, mode)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(prompts))) as executor:
+            # Chunk requests run on worker threads but belong to the caller's trace
+            request = with_current_trace(lambda prompt: request_feedback(client, prompt, schema, mode))
+            results = list(executor.map(request, prompts))
+        feedback = merge_feedback(results, weights)
+
+    feedback = _add_local_metrics(feedback, mode, local_analysis)
+    return finish(feedback)
+
+
+async def analyze_text_async(text, mode, client, max_concurrency=CHUNK_CONCURRENCY, cache=None, refresh=False,
+                             local_analysis=None, job_description=None):
+    """Awaitable analyze_text for an AsyncOpenAI client
+
+    Concurrent analyses on the same client share its connection pool.
+    """
+    key = feedback_cache_key(text, mode, client, local_analysis, job_description)
+    if cache is not None and not refresh:
+        feedback = cache.get(key)
+        annotate(cache_hit=feedback is not None)
+        if feedback is not None:
+            return feedback
+
+    # Nearly identical documents reuse the feedback already given
+    reused, finish = _near_duplicate_lookup(text, mode, client, key, cache, refresh, local_analysis, job_description)
+    if reused is not None:
+        return reused
+
+    prompts, weights = plan_requests(text, mode, local_analysis, job_description)
+    schema = _schema(mode, local_analysis)
+    if len(prompts) == 1:
+        feedback = await request_feedback_async(client, prompts[0], schema, mode)
+    else:
+        slots = asyncio.Semaphore(max_concurrency)
+
+        async def request(prompt):
+            async with slots:
+                return await request_feedback_async(client, prompt, schema, mode)
+
+        results = await asyncio.gather(*(request(prompt) for prompt in prompts))
+        feedback = merge_feedback(list(results), weights)
+
+    feedback = _add_local_metrics(feedback, mode, local_analysis)
+    return finish(feedback)
+
+
+def stream_analysis(text, mode, client, cache=None, refresh=False, local_analysis=None, job_description=None):
+    """Analyze a document, yielding (key, value) pairs as each field completes
+
+    Single-request documents are streamed from the API; cached and chunked
+    documents yield their fields once the full result is available.
+    """
+    key = feedback_cache_key(text, mode, client, local_analysis, job_description)
+    if cache is not None and not refresh:
+        feedback = cache.get(key)
+        annotate(cache_hit=feedback is not None)
+        if feedback is not None:
+            yield from feedback.items()
+            return
+
+    reused, finish = _near_duplicate_lookup(text, mode, client, key, cache, refresh, local_analysis, job_description)
+    if reused is not None:
+        yield from reused.items()
+        return
+
+    prompts, _ = plan_requests(text, mode, local_analysis, job_description)
+    if len(prompts) > 1:
+        feedback = analyze_text(
+            text, mode, client, cache=cache, refresh=True, local_analysis=local_analysis, job_description=job_description
+        )
+        yield from feedback.items()
+        return
+
+    # Locally computed fields are known before the first token arrives
+    yielded = _local_fields(mode, local_analysis)
+    yield from yielded.items()
+
+    schema = _schema(mode, local_analysis)
+    route = _route(prompts[0], mode)
+    parser = IncrementalJSONParser()
+    params = _completion_params(_messages(prompts[0]), schema, route)
+    started = time.perf_counter()
+    fallback = None
+    with span("llm", model=params["model"], stream=True) as attrs:
+        try:
+            # The final chunk then carries the token usage
+            stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **params)
+            usage = None
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    attrs.setdefault("first_token_ms", round((time.perf_counter() - started) * 1000, 1))
+                    completed, _ = validate_feedback(dict(parser.feed(chunk.choices[0].delta.content)), schema)
+                    for field, value in completed.items():
+                        yielded[field] = value
+                        yield field, value
+        except Exception as e:
+            record_failed_call(params["model"])
+            # Only a stream that timed out before its first token can start over on another model
+            fallback = None if parser.text else ROUTER.fallback(route, params["model"], e)
+            if fallback is None:
+                raise
+            attrs["error"] = True
+        else:
+            tokens = _record_usage(usage, params, parser.text, attrs)
+
+    if fallback is None:
+        ROUTER.observe(params["model"], *tokens, time.perf_counter() - started)
+        reply = parser.text
+    else:
+        route = {**route, "model": fallback, "fallbacks": []}
+        reply = _create(client, _messages(prompts[0]), schema, route)
+
+    # Validate the whole reply, then ask only for the fields it lacked
+    feedback, missing = _parse(reply, schema)
+    if missing:
+        feedback.update(repair_feedback(client, prompts[0], reply, schema, missing, route))
+    feedback = _complete_feedback(feedback, schema)
+    feedback = finish(_add_local_metrics(feedback, mode, local_analysis))
+    for field, value in feedback.items():
+        if yielded.get(field) != value:
+            yield field, value
+
+
+def _section_key(section_text, mode, client):
+    return make_key(mode, _model_tag(client), TEMPERATURE, PROMPT_VERSION + "-section-lists", section_text)
+
+
+def _overall_key(group_text, mode, client):
+    return make_key(mode, _model_tag(client), TEMPERATURE, PROMPT_VERSION + "-revision", group_text)
+
+
+def _document_key(text, mode, client):
+    return make_key(mode, _model_tag(client), TEMPERATURE, PROMPT_VERSION + "-revision-document", text)
+
+
+def _revision_groups(sections, mode):
+    """Pack consecutive sections into requests, one for the whole document whenever it fits"""
+    total = sum(section["tokens"] for section in sections)
+    budget = ROUTER.input_budget(mode) if total <= ROUTER.input_budget(mode) else max(input_token_budget(), MIN_CHUNK_TOKENS)
+    groups, tokens = [], 0
+    for i, section in enumerate(sections):
+        if not groups or tokens + section["tokens"] > budget:
+            groups.append([])
+            tokens = 0
+        groups[-1].append(i)
+        tokens += section["tokens"]
+    return groups
+
+
+def _list_batches(sections, listed):
+    """Split sections that only need list feedback into requests that fit a reply and a chunk"""
+    budget = max(input_token_budget(), MIN_CHUNK_TOKENS)
+    batches, tokens = [], 0
+    for i in listed:
+        if not batches or len(batches[-1]) == MAX_LISTED_SECTIONS or tokens + sections[i]["tokens"] > budget:
+            batches.append([])
+            tokens = 0
+        batches[-1].append(i)
+        tokens += sections[i]["tokens"]
+    return batches
+
+
+def _marked_text(sections, group):
+    return "\n\n".join(f"[Section {i + 1}]\n{sections[i]['text']}" for i in group)
+
+
+def _outline(sections, changed):
+    """One line per section with its opening words, pointing to the changed ones sent in full"""
+    words = max(OUTLINE_WORDS // max(len(sections), 1), 4)
+    lines = []
+    for i, section in enumerate(sections):
+        if i in changed:
+            lines.append(f"Section {i + 1}: (revised, given in full below)")
+        else:
+            opening = section["text"].split()
+            lines.append(f"Section {i + 1}: {' '.join(opening[:words])}{' ...' if len(opening) > words else ''}")
+    return "\n".join(lines)
+
+
+def _lists_scope(mode, listed):
+    fields = ", ".join(list_fields(feedback_schema(mode)))
+    numbers = ", ".join(str(i + 1) for i in listed)
+    return f"list observations ({fields}) only for sections {numbers}, as section_<number>_<field>"
+
+
+def build_revision_prompt(sections, group, mode, listed, overall=True, part=None, total_parts=None):
+    """Fill the mode's template with numbered sections, asking for list feedback on only those listed"""
+    lists = _lists_scope(mode, listed)
+    if overall and listed:
+        scope = f"Score and assess the document as a whole, but its other sections were reviewed before, so {lists}"
+    elif overall:
+        scope = "Score and assess the document as a whole; its sections were all reviewed before, so give no lists"
+    else:
+        scope = f"The document is scored separately, so {lists}"
+    note = REVISION_NOTE.format(scope=scope)
+    return PROMPT_TEMPLATES[mode].format(text=_marked_text(sections, group), part_note=_part_note(part, total_parts) + note)
+
+
+def build_revision_update_prompt(sections, changed, mode, listed, baseline, outline):
+    """Fill the mode's template with an outline and the changed sections, asking to update the previous scores"""
+    schema = feedback_schema(mode)
+    scores = ", ".join(f"{key} {baseline[key]}" for key in schema["properties"] if key.endswith("_score") and key in baseline)
+    note = REVISION_UPDATE_NOTE.format(scores=scores, scope=_lists_scope(mode, listed) if listed else "give no lists")
+    changes = _marked_text(sections, changed) or "None; sections were only removed or moved."
+    return PROMPT_TEMPLATES[mode].format(text=f"OUTLINE:\n{outline}\n\nCHANGED SECTIONS:\n{changes}", part_note=note)
+
+
+def analyze_revision(text, mode, client, previous=None, cache=None, refresh=False, max_concurrency=CHUNK_CONCURRENCY):
+    """Analyze a document so a revision only sends the sections that changed
+
+    List feedback such as suggestions is kept per section and looked up in
+    the previous Revision, then in the response cache. A first version, or
+    one whose edits cover more than MAX_UPDATE_SHARE of it, is read whole
+    (in parts when too long for one request) and scored on all of it. A
+    lighter revision sends only its changed sections, with an outline of
+    the rest and the previous scores for the model to update. An unchanged
+    document makes no request. Returns (feedback, revision); pass the
+    revision as previous when the next version is analyzed.
+    """
+    target = section_target(count_tokens(text), min(SECTION_TOKENS, input_token_budget() // MAX_SECTION_MULTIPLE))
+    # Kept from the previous version unless the document grew or shrank a lot, so its boundaries hold
+    if previous is not None and previous.target_tokens / 2 <= target <= previous.target_tokens * 2:
+        target = previous.target_tokens
+    revision = Revision(text, target)
+    sections = revision.sections
+    keys = [_section_key(section["text"], mode, client) for section in sections]
+    revision.document_key = _document_key(text, mode, client)
+    schema = feedback_schema(mode)
+    lists = list_fields(schema)
+
+    def lookup(key, kept):
+        if refresh:
+            return None
+        feedback = kept.get(key)
+        if feedback is None and cache is not None:
+            feedback = cache.get(key)
+        return feedback
+
+    for key in keys:
+        feedback = lookup(key, previous.feedback if previous is not None else {})
+        if feedback is not None:
+            revision.feedback[key] = feedback
+    changed = [i for i, key in enumerate(keys) if key not in revision.feedback]
+    overall = lookup(revision.document_key, {previous.document_key: previous.overall} if previous is not None else {})
+
+    baseline = previous.overall if previous is not None and not refresh else None
+    changed_tokens = sum(sections[i]["tokens"] for i in changed)
+    outline = _outline(sections, changed) if baseline else ""
+    updatable = (baseline and changed_tokens <= MAX_UPDATE_SHARE * sum(section["tokens"] for section in sections)
+                 and changed_tokens + count_tokens(outline) <= ROUTER.input_budget(mode))
+
+    # Each request is (kind, sections whose text it sends, sections it lists, group key, part)
+    requests = []
+    groups = group_keys = None
+    if overall is not None:
+        requests += [("lists", batch, batch, None, None) for batch in _list_batches(sections, changed)]
+    elif updatable:
+        requests.append(("update", changed, changed[:MAX_LISTED_SECTIONS], None, None))
+        requests += [("lists", batch, batch, None, None) for batch in _list_batches(sections, changed[MAX_LISTED_SECTIONS:])]
+    else:
+        groups = _revision_groups(sections, mode)
+        group_keys = [_overall_key(_marked_text(sections, group), mode, client) for group in groups]
+        for part, (group, group_key) in enumerate(zip(groups, group_keys), 1):
+            feedback = lookup(group_key, previous.groups if previous is not None else {})
+            listed = [i for i in group if i in changed]
+            if feedback is not None:
+                revision.groups[group_key] = feedback
+            else:
+                requests.append(("group", group, listed[:MAX_LISTED_SECTIONS], group_key, part))
+                listed = listed[MAX_LISTED_SECTIONS:]
+            requests += [("lists", batch, batch, None, None) for batch in _list_batches(sections, listed)]
+
+    def ask(item):
+        kind, sent, listed, _, part = item
+        if kind == "update":
+            prompt = build_revision_update_prompt(sections, sent, mode, listed, baseline, outline)
+        else:
+            parts = (part, len(groups)) if kind == "group" and len(groups) > 1 else ()
+            prompt = build_revision_prompt(sections, sent, mode, listed, kind == "group", *parts)
+        return request_feedback(client, prompt, revision_schema(schema, [i + 1 for i in listed], kind != "lists"), mode)
+
+    if requests:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(requests))) as executor:
+            # Requests run on worker threads but belong to the caller's trace
+            results = list(executor.map(with_current_trace(ask), requests))
+        for (kind, sent, listed, group_key, _), result in zip(requests, results):
+            fields = {key: value for key, value in result.items() if key not in lists and not key.startswith("section_")}
+            if kind == "update":
+                overall = fields
+            elif kind == "group":
+                revision.groups[group_key] = fields
+                if cache is not None:
+                    cache.put(group_key, fields)
+            for i in listed:
+                revision.feedback[keys[i]] = {key: result.get(section_field(i + 1, key), []) for key in lists}
+                if cache is not None:
+                    cache.put(keys[i], revision.feedback[keys[i]])
+            revision.reanalyzed.extend(listed)
+            revision.sent_tokens += sum(sections[i]["tokens"] for i in sent)
+            if kind == "update":
+                revision.sent_tokens += count_tokens(outline)
+    revision.requests = len(requests)
+
+    if overall is None:
+        overall = dict(merge_feedback(
+            [revision.groups[key] for key in group_keys], [sum(sections[i]["tokens"] for i in group) for group in groups]
+        ))
+    # Copied, so adding local fields later never alters the stored feedback
+    revision.overall = dict(overall)
+    if cache is not None and requests:
+        cache.put(revision.document_key, revision.overall)
+
+    annotate(revision_sections=len(sections), revision_reanalyzed=len(revision.reanalyzed), revision_requests=len(requests))
+    feedback = dict(overall)
+    for key in lists:
+        feedback[key] = _merge_list([revision.feedback[section_key].get(key, []) for section_key in keys])
+    feedback = {key: feedback[key] for key in schema["properties"] if key in feedback}
+    return feedback, revision
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+DocuSense AI API Service
+Async HTTP API for text extraction, analysis and PDF reports, for
+service-to-service traffic without Streamlit
+
+Usage:
+    python api.py --port 8000
+    python api.py --fake-llm        # answer with the local LLM stand-in
+    python api.py --llm-backend replay
+    uvicorn api:app --workers 4
+
+    curl -X POST --data-binary @essay.pdf "http://localhost:8000/analyze?mode=Student%20Essay" \\
+        -H "Authorization: Bearer $OPENAI_API_KEY"
+"""
+
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from dotenv import load_dotenv
+
+# Load environment variables before the local modules below read their settings
+load_dotenv()
+
+from analysis import PROMPT_TEMPLATES, analyze_text_async
+from chunking import count_tokens
+from config import create_response_cache
+from invoice_checker import check_invoice, fast_feedback
+from llm_backend import BACKENDS, aclose, current_backend, get_async_client, requires_api_key, set_backend
+from metrics import prometheus_text, span, trace_analysis
+from pdf_engine import default_worker_count
+from pipeline import extract_document
+from report import REPORT_FORMATS, render_report
+from uploads import SpooledPdf, UploadRejected, check_size
+
+# Timeouts cover the whole request, including time spent waiting for a worker
+EXTRACT_TIMEOUT_SECONDS = float(os.getenv("DOCUSENSE_API_EXTRACT_TIMEOUT_SECONDS", "60"))
+ANALYZE_TIMEOUT_SECONDS = float(os.getenv("DOCUSENSE_API_TIMEOUT_SECONDS", "120"))
+REPORT_TIMEOUT_SECONDS = float(os.getenv("DOCUSENSE_API_REPORT_TIMEOUT_SECONDS", "30"))
+
+API_WORKERS = int(os.getenv("DOCUSENSE_API_WORKERS", str(default_worker_count())))
+
+TRUE_VALUES = ("1", "true", "yes")
+
+# Requests without their own API key are refused unless this lets them use the server's OPENAI_API_KEY
+USE_SERVER_KEY = os.getenv("DOCUSENSE_API_USE_SERVER_KEY", "").lower() in TRUE_VALUES
+
+# Created once per server process by the lifespan handler
+_state = {}
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # spawn keeps workers independent of the server's event loop and threads
+    _state["pool"] = ProcessPoolExecutor(max_workers=API_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    _state["response_cache"] = create_response_cache()
+    try:
+        yield
+    finally:
+        _state["pool"].shutdown(wait=False, cancel_futures=True)
+        await aclose()
+
+
+@contextlib.asynccontextmanager
+async def read_upload(request):
+    """Receive a streamed PDF request body as a SpooledPdf, deleted when the request ends
+
+    Large bodies go straight to a temporary file, which the worker processes
+    open by path; oversized ones are rejected as soon as they pass the limit.
+    """
+    declared = request.headers.get("content-length")
+    with SpooledPdf() as upload:
+        try:
+            if declared:
+                try:
+                    declared = int(declared)
+                except ValueError:
+                    raise HTTPException(400, "Content-Length must be a whole number of bytes")
+                check_size(declared)
+            async for chunk in request.stream():
+                upload.write(chunk)
+            upload.finish()
+        except UploadRejected as e:
+            raise HTTPException(e.status_code, str(e))
+        yield upload
+
+
+def _flag(request, name, default=False):
+    value = request.query_params.get(name)
+    return default if value is None else value.lower() in TRUE_VALUES
+
+
+def _mode(mode):
+    if mode not in PROMPT_TEMPLATES:
+        raise HTTPException(400, f"mode must be one of: {', '.join(PROMPT_TEMPLATES)}")
+    return mode
+
+
+def _client(request):
+    """Return the LLM client for a request's API key"""
+    if not requires_api_key():
+        return get_async_client()
+
+    api_key = request.headers.get("x-openai-key")
+    authorization = request.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    if not api_key and USE_SERVER_KEY:
+        api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(401, "Pass an OpenAI API key as a Bearer token or X-OpenAI-Key header")
+
+    return get_async_client(api_key)
+
+
+async def _run_in_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_state["pool"], fn, *args)
+
+
+async def _with_timeout(awaitable, seconds, step):
+    try:
+        return await asyncio.wait_for(awaitable, timeout=seconds)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, f"{step} timed out after {seconds:g}s")
+
+
+async def _extract(upload, compress):
+    # Timed here: spans recorded inside the worker processes stay in those processes
+    with span("extract", mb=round(upload.size / (1024 * 1024), 2), spooled=upload.path is not None,
+              compress=compress):
+        try:
+            text, prompt_text = await _with_timeout(
+                _run_in_pool(extract_document, upload.pdf, compress, upload.digest), EXTRACT_TIMEOUT_SECONDS,
+                "Extraction"
+            )
+        except UploadRejected as e:
+            raise HTTPException(e.status_code, str(e))
+    if not text:
+        raise HTTPException(422, "No text could be extracted from the PDF")
+    return text, prompt_text
+
+
+async def health(request):
+    return JSONResponse({"status": "ok", "llm": current_backend()})
+
+
+async def extract(request):
+    """POST a PDF body; returns its text and the compressed prompt text"""
+    async with read_upload(request) as upload:
+        text, prompt_text = await _extract(upload, _flag(request, "compress", True))
+    return JSONResponse({
+        "text": text,
+        "prompt_text": prompt_text,
+        "tokens": count_tokens(text),
+        "prompt_tokens": count_tokens(prompt_text)
+    })
+
+
+async def metrics(request):
+    """Stage latency percentiles, LLM calls, tokens and estimated cost in Prometheus text format"""
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+async def analyze(request):
+    """POST a PDF body with ?mode=...; returns JSON feedback, or a report with format=pdf|html"""
+    mode = _mode(request.query_params.get("mode"))
+    with trace_analysis(mode, source="api"):
+        return await _analyze(request, mode)
+
+
+async def _analyze(request, mode):
+    started = time.perf_counter()
+    fast = _flag(request, "fast")
+    client = None if fast and mode == "Invoice" else _client(request)
+    async with read_upload(request) as upload:
+        text, prompt_text = await _extract(upload, _flag(request, "compress", True))
+
+        local_analysis = None
+        if mode == "Invoice":
+            local_analysis = await _run_in_pool(check_invoice, text, upload.pdf)
+
+    if client is None:
+        feedback = fast_feedback(local_analysis)
+    else:
+        try:
+            feedback = await _with_timeout(
+                analyze_text_async(
+                    prompt_text, mode, client,
+                    cache=_state["response_cache"],
+                    refresh=_flag(request, "refresh"),
+                    local_analysis=local_analysis
+                ),
+                ANALYZE_TIMEOUT_SECONDS - (time.perf_counter() - started),
+                "Analysis"
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(502, f"Analysis failed: {e}")
+
+    fmt = request.query_params.get("format")
+    if fmt in ("pdf", "html"):
+        return await _report_response(feedback, mode, text, fmt)
+
+    return JSONResponse({
+        "mode": mode,
+        "feedback": feedback,
+        "elapsed_s": round(time.perf_counter() - started, 3)
+    })
+
+
+async def _report_response(feedback, mode, text, fmt):
+    # Only PDFs need ReportLab; HTML and JSON render faster inline than a pool round trip
+    if fmt == "pdf":
+        with span("report", format=fmt):
+            rendered = await _with_timeout(
+                _run_in_pool(render_report, feedback, mode, text, fmt), REPORT_TIMEOUT_SECONDS, "Report rendering"
+            )
+    else:
+        rendered = render_report(feedback, mode, text, fmt)
+    return Response(rendered, media_type=REPORT_FORMATS[fmt][0])
+
+
+async def report(request):
+    """POST {"mode", "feedback", "text"} as JSON with ?format=pdf|html|json; returns the report"""
+    fmt = request.query_params.get("format", "pdf")
+    if fmt not in REPORT_FORMATS:
+        raise HTTPException(400, f"format must be one of: {', '.join(REPORT_FORMATS)}")
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Request body must be JSON")
+    if not isinstance(payload, dict) or not isinstance(payload.get("feedback"), dict):
+        raise HTTPException(400, 'Body must be an object with "mode", "feedback" and optional "text"')
+
+    mode = _mode(payload.get("mode"))
+    return await _report_response(payload["feedback"], mode, payload.get("text", ""), fmt)
+
+
+async def http_error(request, exc):
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/extract", extract, methods=["POST"]),
+        Route("/analyze", analyze, methods=["POST"]),
+        Route("/report", report, methods=["POST"])
+    ],
+    exception_handlers={HTTPException: http_error},
+    lifespan=lifespan
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the DocuSense AI API service")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=1, help="Server processes")
+    parser.add_argument("--llm-backend", choices=BACKENDS, help="Where completions come from (default: $DOCUSENSE_LLM_BACKEND)")
+    parser.add_argument("--fake-llm", action="store_true", help="Shorthand for --llm-backend fake")
+    args = parser.parse_args(argv)
+
+    backend = "fake" if args.fake_llm else args.llm_backend or current_backend()
+    # Also exported to the environment, so it reaches uvicorn's worker processes
+    set_backend(backend)
+
+    import uvicorn
+    print(f"🚀 DocuSense AI API on http://{args.host}:{args.port}{'' if backend == 'openai' else f' ({backend} LLM)'}")
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
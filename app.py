@@ -8,45 +8,90 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-import fitz  # PyMuPDF
-import spacy
-import openai
 import os
 from dotenv import load_dotenv
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-import io
-import base64
-import json
-from datetime import datetime
 
-# Load environment variables
+# Load environment variables before the local modules below read their settings
 load_dotenv()
 
-from spacy.util import is_package
-import subprocess
+import base64
+import json
+import uuid
+from datetime import datetime
+from pdf_engine import extract_text
+from analysis import analyze_revision, feedback_cache_key, stream_analysis
+from chunking import count_tokens
+from preanalysis import digest_is_compact, format_digest, preanalyze
+from invoice_checker import check_invoice, fast_feedback
+from compression import compress_pdf, compression_stats
+from config import create_compression_cache, create_extraction_cache, create_response_cache, create_session_store
+from extraction_cache import hash_bytes
+from jobs import DONE, QUEUED, get_job_manager
+from llm_backend import LLM_BACKEND, get_client, requires_api_key
+from metrics import REGISTRY, trace_analysis
+from revisions import REVISION_MODES, diff_paragraphs
+from uploads import MAX_UPLOAD_BYTES, spool, spooled
 
+# spaCy, OpenAI and ReportLab are imported on first use so the first page renders quickly
 
 MODEL_NAME = "en_core_web_sm"
 
-# Download spaCy model if not already installed
-if not is_package(MODEL_NAME):
-    subprocess.run(["python", "-m", "spacy", "download", MODEL_NAME], check=True)
-
-# Cached spaCy model loader for Streamlit
-@st.cache_resource
+# Cached spaCy model loader for Streamlit, called only when an analysis needs it
+@st.cache_resource(show_spinner="Loading language model...")
 def load_spacy_model():
+    import spacy
     try:
         return spacy.load(MODEL_NAME)
     except OSError:
-        st.error(f"spaCy model '{MODEL_NAME}' not found. Please run:\n\npython -m spacy download {MODEL_NAME}")
+        st.warning(f"spaCy model '{MODEL_NAME}' not found, so local pre-analysis is limited. Install it with:\n\npython setup.py")
         return None
 
-# Initialize spaCy
-nlp = load_spacy_model()
+# Shared across sessions so each unique document is parsed once per process
+@st.cache_resource
+def get_extraction_cache():
+    return create_extraction_cache()
+
+# Shared across sessions so each unique document is compressed once per process
+@st.cache_resource
+def get_compression_cache():
+    return create_compression_cache()
+
+# Seconds between UI refreshes while a job is running
+JOB_POLL_SECONDS = 1.0
+
+# Changed passages listed in the "what changed" view
+MAX_SHOWN_CHANGES = 20
+
+# Shared across sessions so repeat analyses skip the OpenAI round trip
+@st.cache_resource
+def get_response_cache():
+    return create_response_cache()
+
+# Shared across sessions so text and feedback are held once, compressed and within one memory cap;
+# evicted entries are rebuilt from the extraction and response caches
+@st.cache_resource
+def get_session_store():
+    return create_session_store({
+        "extraction": get_extraction_cache().get,
+        "response": get_response_cache().get
+    })
+
+def keep(name, value, source=None):
+    """Store a payload in the session store and keep only its handle in the session"""
+    forget(name)
+    if value is not None:
+        session_id = st.session_state.setdefault('session_store_id', uuid.uuid4().hex)
+        st.session_state[name] = get_session_store().put(session_id, value, source)
+
+def recall(name):
+    """Return the payload kept under name, or None if there is none or it expired"""
+    handle = st.session_state.get(name)
+    return get_session_store().get(handle) if handle is not None else None
+
+def forget(name):
+    handle = st.session_state.pop(name, None)
+    if handle is not None:
+        get_session_store().discard(handle)
 
 # Custom CSS for clean UI
 st.markdown("""
@@ -93,6 +138,7 @@ st.markdown("""
     .score-good { background-color: #17a2b8; }
     .score-average { background-color: #ffc107; color: #212529; }
     .score-poor { background-color: #dc3545; }
+    .score-pending { background-color: #adb5bd; }
     
     .metric-card {
         background: #f8f9fa;
@@ -126,132 +172,264 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file"""
+def _extract_with_progress(pdf_bytes):
+    """Run the page engine, reporting per-page progress under the spinner"""
+    progress_bar = st.progress(0.0)
+
+    def report(done, total):
+        progress_bar.progress(done / total, text=f"Extracted page {done} of {total}")
+
+    try:
+        return extract_text(pdf_bytes, progress=report)
+    finally:
+        progress_bar.empty()
+
+def extract_text_from_pdf(pdf_file, digest):
+    """Extract text from uploaded PDF file, reusing cached text for known documents
+
+    getvalue() shares Streamlit's upload buffer rather than copying it, and
+    large documents are opened from a temporary file instead of a second copy.
+    """
     try:
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text.strip()
+        return get_extraction_cache().get_or_extract(pdf_file.getvalue(), spooled(_extract_with_progress), digest=digest)
     except Exception as e:
         st.error(f"Error extracting text from PDF: {str(e)}")
         return None
 
-def get_openai_feedback(text, mode):
-    """Get feedback from OpenAI based on the selected mode"""
-    
-    # Define prompts for different modes
-    prompts = {
-        "Student Essay": f"""
-        Analyze the following student essay and provide comprehensive feedback:
-        
-        ESSAY:
-        {text}
-        
-        Please provide feedback in the following JSON format:
-        {{
-            "overall_score": <score out of 100>,
-            "grammar_score": <score out of 100>,
-            "content_score": <score out of 100>,
-            "structure_score": <score out of 100>,
-            "grammar_issues": [<list of grammar errors with corrections>],
-            "content_feedback": "<detailed feedback on content quality, arguments, and ideas>",
-            "structure_feedback": "<feedback on essay structure, flow, and organization>",
-            "suggestions": [<list of specific improvement suggestions>],
-            "strengths": [<list of essay strengths>],
-            "areas_for_improvement": [<list of areas that need work>]
-        }}
-        """,
-        
-        "Resume": f"""
-        Analyze the following resume and provide professional feedback:
-        
-        RESUME:
-        {text}
-        
-        Please provide feedback in the following JSON format:
-        {{
-            "overall_score": <score out of 100>,
-            "content_score": <score out of 100>,
-            "formatting_score": <score out of 100>,
-            "impact_score": <score out of 100>,
-            "content_feedback": "<detailed feedback on resume content, skills, and experience>",
-            "formatting_feedback": "<feedback on layout, structure, and presentation>",
-            "impact_feedback": "<feedback on how compelling and impactful the resume is>",
-            "suggestions": [<list of specific improvement suggestions>],
-            "strengths": [<list of resume strengths>],
-            "areas_for_improvement": [<list of areas that need work>],
-            "keywords_missing": [<list of relevant keywords that could be added>]
-        }}
-        """,
-        
-        "Invoice": f"""
-        Analyze the following invoice document and provide feedback:
-        
-        INVOICE:
-        {text}
-        
-        Please provide feedback in the following JSON format:
-        {{
-            "overall_score": <score out of 100>,
-            "completeness_score": <score out of 100>,
-            "clarity_score": <score out of 100>,
-            "professionalism_score": <score out of 100>,
-            "completeness_feedback": "<feedback on whether all required invoice elements are present>",
-            "clarity_feedback": "<feedback on clarity and readability of the invoice>",
-            "professionalism_feedback": "<feedback on professional presentation and formatting>",
-            "suggestions": [<list of specific improvement suggestions>],
-            "strengths": [<list of invoice strengths>],
-            "areas_for_improvement": [<list of areas that need work>],
-            "missing_elements": [<list of missing invoice elements>]
-        }}
-        """
+def compress_for_prompt(pdf_file, digest, extracted_text, mode):
+    """Strip repeated headers, footers and page numbers, reporting the token savings"""
+    try:
+        prompt_text = get_compression_cache().get_or_extract(pdf_file.getvalue(), spooled(compress_pdf), digest=digest)
+    except Exception as e:
+        st.warning(f"Prompt compression failed, sending the full text: {str(e)}")
+        return extracted_text
+    if not prompt_text:
+        return extracted_text
+
+    stats = compression_stats(extracted_text, prompt_text, mode)
+    st.caption(
+        f"🗜️ Prompt compression: ~{stats['tokens_before']:,} → ~{stats['tokens_after']:,} tokens "
+        f"({stats['saved_percent']}% saved, {mode} budget {stats['budget']:,})"
+    )
+    if not stats['within_budget']:
+        st.warning(
+            f"⚠️ This document is over the {stats['budget']:,} token budget for {mode} documents, "
+            "so the analysis will take longer and cost more."
+        )
+    return prompt_text
+
+def get_analysis_settings(mode):
+    """Capture what an analysis needs from the session, so it can run off the script thread"""
+    fast_invoice = mode == "Invoice" and st.session_state.get('invoice_fast_mode', False)
+    compact_essay = mode == "Student Essay" and st.session_state.get('compact_essay_prompt', True)
+    revision_aware = mode in REVISION_MODES and st.session_state.get('revision_aware', False)
+    return {
+        "api_key": st.session_state.get('openai_api_key'),
+        "fast_invoice": fast_invoice,
+        "revision_aware": revision_aware,
+        "previous_revision": recall(f"revision:{mode}") if revision_aware else None,
+        "refresh": st.session_state.get('bypass_response_cache', False),
+        "nlp": load_spacy_model() if mode == "Invoice" or compact_essay else None,
+        "response_cache": get_response_cache()
     }
+
+def get_openai_feedback(text, mode, settings, on_field=None, on_note=None, pdf_bytes=None, on_revision=None,
+                        on_cached=None):
+    """Get feedback from OpenAI based on the selected mode
+
+    Runs on a job worker, so errors are raised rather than shown. on_field,
+    if given, is called with the partial feedback each time a streamed field
+    completes, on_note with messages for the user, on_revision with the
+    analyzed revision and what changed in revision-aware mode, and on_cached
+    with the response cache key the final feedback is stored under.
+    """
+    # Invoice completeness and line-item arithmetic are checked locally; fast mode stops there
+    local_analysis = None
+    if mode == "Invoice":
+        with spool(pdf_bytes or b"") as pdf:
+            local_analysis = check_invoice(text, pdf, settings["nlp"])
+        if settings["fast_invoice"]:
+            return fast_feedback(local_analysis)
     
-    try:
-        # Get API key from session state (user input)
-        api_key = st.session_state.get('openai_api_key')
-        if not api_key:
-            st.error("OpenAI API key not found. Please enter your API key in the sidebar.")
-            return None
-            
-        # Create OpenAI client with user's API key
-        client = openai.OpenAI(api_key=api_key)
+    if requires_api_key() and not settings["api_key"]:
+        raise ValueError("OpenAI API key not found. Please enter your API key in the sidebar.")
         
-        # Use the latest API syntax
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert document analyzer providing detailed, constructive feedback."},
-                {"role": "user", "content": prompts[mode]}
-            ],
-            temperature=0.3,
-            max_tokens=2000
+    # Pooled OpenAI client for the user's API key, or the configured offline backend
+    client = get_client(settings["api_key"])
+    
+    if settings["revision_aware"]:
+        return get_revision_feedback(text, mode, settings, client, on_note, on_revision)
+    
+    # Essays can be summarized locally so the prompt carries a digest, not the full text
+    if mode == "Student Essay" and settings["nlp"] is not None:
+        digest = preanalyze(settings["nlp"], text)
+        if digest_is_compact(digest, text):
+            local_analysis = digest
+            if on_note:
+                on_note(
+                    f"⚡ Local pre-analysis: sending ~{count_tokens(format_digest(digest))} prompt tokens "
+                    f"instead of ~{count_tokens(text)}"
+                )
+        elif on_note:
+            on_note("📝 This essay is short enough that its digest would barely save tokens, so the full text is sent")
+    
+    # Fields stream in as they complete; long documents are chunked instead
+    feedback = {}
+    for key, value in stream_analysis(
+        text,
+        mode,
+        client,
+        cache=settings["response_cache"],
+        refresh=settings["refresh"],
+        local_analysis=local_analysis
+    ):
+        feedback[key] = value
+        if on_field:
+            on_field(feedback)
+    if on_cached and settings["response_cache"] is not None:
+        on_cached(feedback_cache_key(text, mode, client, local_analysis))
+    return feedback
+
+def get_revision_feedback(text, mode, settings, client, on_note=None, on_revision=None):
+    """Analyze a document in sections, sending only those changed since the previous revision"""
+    previous = settings["previous_revision"]
+    if on_note:
+        on_note("🔁 Revision-aware analysis: sending only the changed sections with the previous scores" if previous else
+                "🔁 Revision-aware analysis: first version, reading the whole document")
+    feedback, revision = analyze_revision(
+        text,
+        mode,
+        client,
+        previous=previous,
+        cache=settings["response_cache"],
+        refresh=settings["refresh"]
+    )
+    # Writing statistics are computed locally, so they never cost tokens
+    if mode == "Student Essay" and settings["nlp"] is not None:
+        feedback["writing_statistics"] = preanalyze(settings["nlp"], text)["statistics"]
+    if on_revision:
+        changes = diff_paragraphs(previous, revision) if previous is not None else None
+        on_revision(revision, {**revision.stats(), "diff": changes})
+    return feedback
+
+def analysis_job(job, text, mode, settings, pdf_bytes=None):
+    """Job body for an analysis, publishing streamed fields as partial results"""
+    def keep_revision(revision, changes):
+        job.meta.update(revision=revision, revision_changes=changes)
+    
+    with trace_analysis(mode, source="app", job_id=job.id):
+        return get_openai_feedback(
+            text,
+            mode,
+            settings,
+            on_field=lambda partial: job.update(partial=partial),
+            on_note=lambda note: job.update(note=note),
+            pdf_bytes=pdf_bytes,
+            on_revision=keep_revision,
+            on_cached=lambda key: job.meta.update(feedback_key=key)
         )
-        
-        feedback_text = response.choices[0].message.content
-        # Try to parse JSON response
-        try:
-            feedback_json = json.loads(feedback_text)
-            return feedback_json
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return structured text
-            return {
-                "overall_score": 75,
-                "feedback": feedback_text,
-                "suggestions": ["Review the document for improvements"],
-                "strengths": ["Document submitted for review"],
-                "areas_for_improvement": ["See detailed feedback above"]
-            }
-            
-    except Exception as e:
-        st.error(f"Error getting OpenAI feedback: {str(e)}")
-        return None
+
+def report_job(job, feedback, mode, original_text):
+    """Job body for a PDF report"""
+    from report import render_report
+    return render_report(feedback, mode, original_text, "pdf")
+
+def analysis_job_key(text, mode, settings):
+    """Identify an analysis so reruns don't queue the same work twice"""
+    options = (
+        settings["fast_invoice"], settings["refresh"], settings["nlp"] is not None, settings["api_key"],
+        settings["revision_aware"]
+    )
+    return hash_bytes(json.dumps([mode, text, options]).encode("utf-8"))
+
+def render_debug_metrics():
+    """Stage timings, tokens and cost of the latest analysis, and latency percentiles so far"""
+    traces = REGISTRY.recent_traces()
+    if traces:
+        last = traces[-1]
+        st.caption(
+            f"Last analysis: {last['total_ms']:.0f} ms, {last['calls']} LLM calls, "
+            f"{last['prompt_tokens']} + {last['completion_tokens']} tokens, ~${last['cost_usd']:.4f}"
+            + (" (cached)" if last.get('cache_hit') else "")
+        )
+        if last.get('routed_model'):
+            st.caption(
+                f"Routed to {last['routed_model']} ({last['route_reason']}, ~{last['route_estimated_s']} s estimated)"
+                + (f", fell back from {last['fallback_from']} after a timeout" if last.get('fallback_from') else "")
+            )
+        st.table([{"stage": stage, "ms": ms} for stage, ms in last['stage_ms'].items()])
+    else:
+        st.caption("No analyses yet")
+    stages = REGISTRY.stage_summary()
+    if stages:
+        st.caption("Latency percentiles (ms)")
+        st.table([{"stage": stage, **summary} for stage, summary in stages.items()])
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_analysis_job():
+    """Show a running analysis without blocking the page, rerunning the app once it finishes"""
+    job = get_job_manager().get(st.session_state.get('analysis_job_id'))
+    if job is None:
+        # Unknown or pruned, e.g. after a server restart
+        st.session_state.pop('analysis_job_id', None)
+        st.query_params.pop('job', None)
+        st.rerun(scope="app")
+        return
+
+    for note in job.notes:
+        st.caption(note)
+
+    if job.in_flight:
+        status = "⏳ Waiting for a free worker" if job.state == QUEUED else "🤖 Analyzing document with AI"
+        st.info(f"{status}... ({job.elapsed:.0f}s)")
+        if job.partial:
+            render_quick_stats(job.partial, job.meta['mode'], pending=True)
+            render_detailed_feedback(job.partial, job.meta['mode'])
+        return
+
+    del st.session_state['analysis_job_id']
+    st.query_params.pop('job', None)
+    if job.state == DONE:
+        # Handed over rather than left on the finished job, which would hold them until pruned
+        feedback = job.take()
+        if feedback is None:
+            # Already collected, e.g. by another tab polling the same job
+            st.rerun(scope="app")
+            return
+        # Fast-mode and revision-aware feedback isn't cached whole, so it can't be rebuilt after eviction
+        feedback_key = job.meta.get('feedback_key')
+        keep('feedback', feedback, source=("response", feedback_key) if feedback_key else None)
+        text = job.meta.pop('extracted_text', None) or get_extraction_cache().get(job.meta['digest'])
+        keep('extracted_text', text, source=("extraction", job.meta['digest']))
+        st.session_state.mode = job.meta['mode']
+        keep('revision_changes', job.meta.pop('revision_changes', None))
+        revision = job.meta.pop('revision', None)
+        if revision is not None:
+            keep(f"revision:{job.meta['mode']}", revision)
+        st.session_state.analysis_notice = f"✅ Analysis complete in {job.elapsed:.1f}s!"
+    else:
+        st.session_state.analysis_notice = f"❌ Error getting OpenAI feedback: {job.error}"
+    st.rerun(scope="app")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_report_job():
+    """Wait for a PDF report without blocking the page"""
+    job = get_job_manager().get(st.session_state.get('report_job_id'))
+    if job is not None and job.in_flight:
+        st.info("📊 Generating PDF report...")
+        return
+
+    st.session_state.pop('report_job_id', None)
+    if job is not None and job.state == DONE:
+        keep('report_pdf', job.take())
+    elif job is not None:
+        st.session_state.analysis_notice = f"❌ Error generating PDF report: {job.error}"
+    st.rerun(scope="app")
 
 def get_score_class(score):
     """Get CSS class for score display"""
+    if not isinstance(score, (int, float)):
+        return "score-pending"
     if score >= 90:
         return "score-excellent"
     elif score >= 80:
@@ -261,98 +439,208 @@ def get_score_class(score):
     else:
         return "score-poor"
 
-def create_pdf_report(feedback, mode, original_text):
-    """Create a PDF report of the feedback"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
+def render_quick_stats(feedback, mode, pending=False):
+    """Render the score cards, showing a placeholder for scores still streaming in"""
+    placeholder = "…" if pending else None
     
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    story.append(Paragraph("DocuSense AI - Document Analysis Report", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Report details
-    story.append(Paragraph(f"<b>Document Type:</b> {mode}", styles['Normal']))
-    story.append(Paragraph(f"<b>Analysis Date:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    story.append(Spacer(1, 20))
-    
-    # Overall score
-    overall_score = feedback.get('overall_score', 0)
-    story.append(Paragraph(f"<b>Overall Score:</b> {overall_score}/100", styles['Heading2']))
-    story.append(Spacer(1, 15))
-    
-    # Detailed scores
-    if 'grammar_score' in feedback:
-        story.append(Paragraph("<b>Detailed Scores:</b>", styles['Heading3']))
-        scores_data = [
-            ['Category', 'Score'],
-            ['Grammar', f"{feedback.get('grammar_score', 0)}/100"],
-            ['Content', f"{feedback.get('content_score', 0)}/100"],
-            ['Structure', f"{feedback.get('structure_score', 0)}/100"]
+    overall_score = feedback.get('overall_score', placeholder)
+
+    # Create horizontal layout for stats
+    if mode == "Student Essay":
+        scores = [
+            ("Overall", overall_score),
+            ("Grammar", feedback.get('grammar_score', placeholder)),
+            ("Content", feedback.get('content_score', placeholder)),
+            ("Structure", feedback.get('structure_score', placeholder))
         ]
-    elif 'content_score' in feedback:
-        story.append(Paragraph("<b>Detailed Scores:</b>", styles['Heading3']))
-        scores_data = [
-            ['Category', 'Score'],
-            ['Content', f"{feedback.get('content_score', 0)}/100"],
-            ['Formatting', f"{feedback.get('formatting_score', 0)}/100"],
-            ['Impact', f"{feedback.get('impact_score', 0)}/100"]
+    elif mode == "Resume":
+        scores = [
+            ("Overall", overall_score),
+            ("Content", feedback.get('content_score', placeholder)),
+            ("Formatting", feedback.get('formatting_score', placeholder)),
+            ("Impact", feedback.get('impact_score', placeholder))
         ]
-    else:
-        scores_data = [['Category', 'Score'], ['Overall', f"{overall_score}/100"]]
-    
-    scores_table = Table(scores_data)
-    scores_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(scores_table)
-    story.append(Spacer(1, 20))
-    
-    # Feedback sections
-    feedback_sections = [
-        ('Content Feedback', 'content_feedback'),
-        ('Grammar Feedback', 'grammar_feedback'),
-        ('Structure Feedback', 'structure_feedback'),
-        ('Formatting Feedback', 'formatting_feedback'),
-        ('Impact Feedback', 'impact_feedback'),
-        ('Completeness Feedback', 'completeness_feedback'),
-        ('Clarity Feedback', 'clarity_feedback'),
-        ('Professionalism Feedback', 'professionalism_feedback')
-    ]
-    
-    for section_title, key in feedback_sections:
-        if key in feedback and feedback[key]:
-            story.append(Paragraph(f"<b>{section_title}:</b>", styles['Heading3']))
-            story.append(Paragraph(feedback[key], styles['Normal']))
-            story.append(Spacer(1, 15))
-    
-    # Lists
-    for list_title, key in [('Strengths', 'strengths'), ('Areas for Improvement', 'areas_for_improvement'), ('Suggestions', 'suggestions')]:
-        if key in feedback and feedback[key]:
-            story.append(Paragraph(f"<b>{list_title}:</b>", styles['Heading3']))
-            for item in feedback[key]:
-                story.append(Paragraph(f"• {item}", styles['Normal']))
-            story.append(Spacer(1, 15))
+    else:  # Invoice
+        scores = [
+            ("Overall", overall_score),
+            ("Completeness", feedback.get('completeness_score', placeholder)),
+            ("Clarity", feedback.get('clarity_score', placeholder)),
+            ("Professionalism", feedback.get('professionalism_score', placeholder))
+        ]
+
+    # Scores a mode doesn't produce (e.g. clarity in fast invoice mode) are left out
+    scores = [(score_name, score_value) for score_name, score_value in scores if score_value is not None]
+
+    # Create columns for horizontal layout
+    cols = st.columns(len(scores))
+
+    for i, (score_name, score_value) in enumerate(scores):
+        with cols[i]:
+            st.markdown(f"""
+            <div class="metric-card">
+                <h4>{score_name}</h4>
+                <div class="score-badge {get_score_class(score_value)}">
+                    {score_value}/100
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+def render_revision_changes(changes):
+    """Show which paragraphs changed since the previous revision and what re-analysis cost"""
+    st.caption(
+        f"Asked about {changes['reanalyzed']} of {changes['sections']} sections in {changes['requests']} request(s), "
+        f"sending ~{changes['sent_tokens']:,} tokens for a ~{changes['tokens']:,}-token document"
+    )
+    diff = changes['diff']
+    if diff is None:
+        st.info("First analyzed version of this document: later revisions will only send the sections that change.")
+        return
+    if not diff['changes']:
+        st.info("No changes since the previous version.")
+        return
     
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    counts = {kind: sum(1 for change in diff['changes'] if change['type'] == kind) for kind in ("changed", "added", "removed")}
+    st.markdown(
+        f"**{counts['changed']}** changed, **{counts['added']}** added and **{counts['removed']}** removed "
+        f"passages; {diff['unchanged']} paragraphs unchanged"
+    )
+    labels = {"changed": "✏️ Changed", "added": "➕ Added", "removed": "➖ Removed"}
+    for change in diff['changes'][:MAX_SHOWN_CHANGES]:
+        st.markdown(f"**{labels[change['type']]}**")
+        if change['before']:
+            st.markdown("\n".join(f"> ~~{paragraph}~~" for paragraph in change['before']))
+        if change['after']:
+            st.markdown("\n".join(f"> {paragraph}" for paragraph in change['after']))
+    if len(diff['changes']) > MAX_SHOWN_CHANGES:
+        st.caption(f"…and {len(diff['changes']) - MAX_SHOWN_CHANGES} more changes")
+
+def render_detailed_feedback(feedback, mode):
+    """Render the feedback tabs for whichever fields are available"""
+    near_duplicate = feedback.get('near_duplicate')
+    if feedback.get('plagiarism_warning'):
+        st.warning(f"⚠️ {feedback['plagiarism_warning']}")
+    elif near_duplicate and near_duplicate['reused_feedback']:
+        st.info(
+            f"♻️ Feedback reused from a {round(near_duplicate['similarity'] * 100)}% similar document "
+            f"analyzed on {near_duplicate['analyzed_on']}"
+        )
+
+    # Create tabs for different feedback sections
+    tab1, tab2, tab3, tab4 = st.tabs(["📝 Feedback", "✅ Strengths", "🔧 Improvements", "💡 Suggestions"])
+
+    with tab1:
+        st.markdown('<h3>Detailed Analysis</h3>', unsafe_allow_html=True)
+
+        # Display feedback based on mode
+        if mode == "Student Essay":
+            if 'content_feedback' in feedback:
+                st.markdown("**Content Feedback:**")
+                st.write(feedback['content_feedback'])
+
+            if 'grammar_feedback' in feedback:
+                st.markdown("**Grammar Feedback:**")
+                st.write(feedback['grammar_feedback'])
+
+            if 'structure_feedback' in feedback:
+                st.markdown("**Structure Feedback:**")
+                st.write(feedback['structure_feedback'])
+
+            if 'writing_statistics' in feedback:
+                stats = feedback['writing_statistics']
+                st.markdown("**Writing Statistics:**")
+                stat_cols = st.columns(4)
+                stat_cols[0].metric("Sentences", stats['sentence_count'])
+                stat_cols[1].metric("Avg. Sentence Length", stats['avg_sentence_length'])
+                stat_cols[2].metric("Reading Ease", stats['flesch_reading_ease'])
+                stat_cols[3].metric("Passive Sentences", stats['passive_sentence_count'])
+                if stats['repeated_phrases']:
+                    st.markdown("Repeated phrases: " + ", ".join(stats['repeated_phrases']))
+
+        elif mode == "Resume":
+            if 'content_feedback' in feedback:
+                st.markdown("**Content Feedback:**")
+                st.write(feedback['content_feedback'])
+
+            if 'formatting_feedback' in feedback:
+                st.markdown("**Formatting Feedback:**")
+                st.write(feedback['formatting_feedback'])
+
+            if 'impact_feedback' in feedback:
+                st.markdown("**Impact Feedback:**")
+                st.write(feedback['impact_feedback'])
+
+        else:  # Invoice
+            if 'completeness_feedback' in feedback:
+                st.markdown("**Completeness Feedback:**")
+                st.write(feedback['completeness_feedback'])
+
+            if 'clarity_feedback' in feedback:
+                st.markdown("**Clarity Feedback:**")
+                st.write(feedback['clarity_feedback'])
+
+            if 'professionalism_feedback' in feedback:
+                st.markdown("**Professionalism Feedback:**")
+                st.write(feedback['professionalism_feedback'])
+
+            if feedback.get('detected_fields'):
+                st.markdown("**Detected Invoice Fields:**")
+                st.table([
+                    {"Field": field.replace('_', ' ').title(), "Value": value}
+                    for field, value in feedback['detected_fields'].items()
+                ])
+
+            table_check = feedback.get('table_check')
+            if table_check:
+                st.markdown("**Line-Item Check:**")
+                st.write(
+                    f"{table_check['line_items']} line items read from the tables; "
+                    f"{table_check['line_error_count']} don't match quantity × unit price."
+                )
+                if table_check['totals']:
+                    st.table([
+                        {
+                            "Total": check['name'],
+                            "Stated": f"{check['stated']:,.2f}",
+                            "Computed": f"{check['computed']:,.2f}",
+                            "": "✅" if check['ok'] else "❌"
+                        }
+                        for check in table_check['totals']
+                    ])
+                if table_check['line_errors']:
+                    st.table([
+                        {
+                            "Row": error['row'],
+                            "Description": error['description'],
+                            "Qty × Price": f"{error['quantity']:g} × {error['unit_price']:,.2f}",
+                            "Expected": f"{error['expected']:,.2f}",
+                            "Shown": f"{error['amount']:,.2f}"
+                        }
+                        for error in table_check['line_errors']
+                    ])
+
+    with tab2:
+        st.markdown('<h3>Document Strengths</h3>', unsafe_allow_html=True)
+        if 'strengths' in feedback and feedback['strengths']:
+            for i, strength in enumerate(feedback['strengths'], 1):
+                st.markdown(f"**{i}.** {strength}")
+        else:
+            st.info("No specific strengths identified in this analysis.")
+
+    with tab3:
+        st.markdown('<h3>Areas for Improvement</h3>', unsafe_allow_html=True)
+        if 'areas_for_improvement' in feedback and feedback['areas_for_improvement']:
+            for i, area in enumerate(feedback['areas_for_improvement'], 1):
+                st.markdown(f"**{i}.** {area}")
+        else:
+            st.info("No specific areas for improvement identified.")
+
+    with tab4:
+        st.markdown('<h3>Suggestions</h3>', unsafe_allow_html=True)
+        if 'suggestions' in feedback and feedback['suggestions']:
+            for i, suggestion in enumerate(feedback['suggestions'], 1):
+                st.markdown(f"**{i}.** {suggestion}")
+        else:
+            st.info("No specific suggestions provided in this analysis.")
 
 def main():
     # Header
@@ -400,6 +688,29 @@ def main():
         st.markdown("---")
         st.markdown("### ⚙️ Settings")
         
+        if mode == "Invoice":
+            st.checkbox(
+                "⚡ Fast mode (local checks only)",
+                key="invoice_fast_mode",
+                help="Check invoice completeness and line-item arithmetic locally and skip the AI review of clarity and professionalism"
+            )
+        
+        if mode in REVISION_MODES:
+            st.checkbox(
+                "🔁 Re-analyze only what changed",
+                key="revision_aware",
+                help="Analyze the document in sections and, when you upload a revised version, send only the sections that changed since the last analysis"
+            )
+        
+        if mode == "Student Essay":
+            st.checkbox(
+                "⚡ Compact essay prompt",
+                value=True,
+                key="compact_essay_prompt",
+                disabled=st.session_state.get('revision_aware', False),
+                help="Pre-analyze the essay locally and send the AI a digest with flagged sentences instead of the full text"
+            )
+        
         # OpenAI API Key input
         api_key = st.text_input(
             "🔐 OpenAI API Key",
@@ -411,6 +722,38 @@ def main():
             st.success("✅ API key saved!")
         elif 'openai_api_key' in st.session_state:
             st.info("🔑 API key already saved")
+        if LLM_BACKEND != "openai":
+            st.info(f"🧪 LLM backend: {LLM_BACKEND}")
+        
+        st.checkbox(
+            "♻️ Bypass response cache",
+            key="bypass_response_cache",
+            help="Always request a fresh analysis instead of reusing a cached one for the same document"
+        )
+        st.checkbox(
+            "🗜️ Strip repeated headers & footers",
+            value=True,
+            key="compress_prompt",
+            help="Remove letterhead, headers, footers and page numbers repeated on every page before sending the text to the AI"
+        )
+        cache_stats = get_response_cache().stats()
+        st.caption(
+            f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['entries']} cached)"
+        )
+        near_duplicates = get_response_cache().near_duplicates
+        if near_duplicates is not None:
+            index_stats = near_duplicates.stats()
+            st.caption(
+                f"Near-duplicate index: {index_stats['documents']} documents, {index_stats['matches']} matches"
+            )
+        store_stats = get_session_store().stats()
+        st.caption(
+            f"Session store: {store_stats['bytes'] / (1024 * 1024):.1f} of {store_stats['max_bytes'] / (1024 * 1024):.0f} MB "
+            f"({store_stats['entries']} entries, {store_stats['sessions']} sessions, {store_stats['codec']})"
+        )
+        if st.checkbox("🐞 Show debug metrics", key="show_debug_metrics"):
+            render_debug_metrics()
         
         st.markdown("---")
         st.markdown("### 🔑 Get Your API Key")
@@ -445,153 +788,83 @@ def main():
         help="Upload a PDF document for analysis"
     )
     
+    if uploaded_file is not None and uploaded_file.size > MAX_UPLOAD_BYTES:
+        st.error(f"❌ {uploaded_file.name} is {uploaded_file.size / (1024 * 1024):.0f} MB; uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        uploaded_file = None
+    
     if uploaded_file is not None:
         st.success(f"✅ File uploaded: {uploaded_file.name}")
         
+        # Hashed once; the digest keys the extraction and compression caches and rebuilds evicted text
+        digest = hash_bytes(uploaded_file.getvalue())
+        
         # Extract text
         with st.spinner("Extracting text from PDF..."):
-            extracted_text = extract_text_from_pdf(uploaded_file)
+            extracted_text = extract_text_from_pdf(uploaded_file, digest)
         
         if extracted_text:
             st.markdown('<h3 class="sub-header">📝 Extracted Text Preview</h3>', unsafe_allow_html=True)
             with st.expander("View extracted text", expanded=False):
                 st.text_area("Extracted Text", extracted_text, height=200, disabled=True)
             
-            # Analysis button
-            if st.button("🔍 Analyze Document", type="primary", use_container_width=True):
-                if not st.session_state.get('openai_api_key'):
+            prompt_text = extracted_text
+            if st.session_state.get('compress_prompt', True):
+                prompt_text = compress_for_prompt(uploaded_file, digest, extracted_text, mode)
+            
+            # Analysis button; the work runs as a background job polled below
+            analysis_running = 'analysis_job_id' in st.session_state
+            if st.button("🔍 Analyze Document", type="primary", use_container_width=True, disabled=analysis_running):
+                fast_invoice = mode == "Invoice" and st.session_state.get('invoice_fast_mode', False)
+                if not fast_invoice and requires_api_key() and not st.session_state.get('openai_api_key'):
                     st.error("❌ Please enter your OpenAI API key in the sidebar to proceed with analysis.")
                 else:
-                    with st.spinner("🤖 Analyzing document with AI..."):
-                        feedback = get_openai_feedback(extracted_text, mode)
-                    
-                    if feedback:
-                        # Store feedback in session state
-                        st.session_state.feedback = feedback
-                        st.session_state.extracted_text = extracted_text
-                        st.session_state.mode = mode
-                        st.success("✅ Analysis complete!")
-                        st.rerun()
+                    settings = get_analysis_settings(mode)
+                    job_id = get_job_manager().submit(
+                        analysis_job,
+                        prompt_text,
+                        mode,
+                        settings,
+                        pdf_bytes=uploaded_file.getvalue(),
+                        key=analysis_job_key(prompt_text, mode, settings),
+                        meta={"mode": mode, "extracted_text": extracted_text, "digest": digest}
+                    )
+                    st.session_state.analysis_job_id = job_id
+                    st.query_params['job'] = job_id
+                    forget('report_pdf')
+                    st.rerun()
+    
+    # A reloaded page picks its in-flight analysis back up from the URL
+    if 'analysis_job_id' not in st.session_state and st.query_params.get('job'):
+        st.session_state.analysis_job_id = st.query_params['job']
+    
+    if 'analysis_job_id' in st.session_state:
+        poll_analysis_job()
+    
+    notice = st.session_state.pop('analysis_notice', None)
+    if notice:
+        (st.success if notice.startswith("✅") else st.error)(notice)
+    
+    # Results live in the shared session store; the session only holds handles to them
+    feedback = recall('feedback')
+    if feedback is None and 'feedback' in st.session_state:
+        for key in ['feedback', 'extracted_text', 'revision_changes', 'report_pdf']:
+            forget(key)
+        st.info("⌛ The results of this session have expired. Please analyze the document again.")
     
     # Quick Stats Section - Display after analysis
-    if 'feedback' in st.session_state:
+    if feedback is not None:
         st.markdown('<h2 class="sub-header">📊 Quick Stats</h2>', unsafe_allow_html=True)
-        
-        feedback = st.session_state.feedback
-        overall_score = feedback.get('overall_score', 0)
-        
-        # Create horizontal layout for stats
-        if mode == "Student Essay":
-            scores = [
-                ("Overall", overall_score),
-                ("Grammar", feedback.get('grammar_score', 0)),
-                ("Content", feedback.get('content_score', 0)),
-                ("Structure", feedback.get('structure_score', 0))
-            ]
-        elif mode == "Resume":
-            scores = [
-                ("Overall", overall_score),
-                ("Content", feedback.get('content_score', 0)),
-                ("Formatting", feedback.get('formatting_score', 0)),
-                ("Impact", feedback.get('impact_score', 0))
-            ]
-        else:  # Invoice
-            scores = [
-                ("Overall", overall_score),
-                ("Completeness", feedback.get('completeness_score', 0)),
-                ("Clarity", feedback.get('clarity_score', 0)),
-                ("Professionalism", feedback.get('professionalism_score', 0))
-            ]
-        
-        # Create columns for horizontal layout
-        cols = st.columns(len(scores))
-        
-        for i, (score_name, score_value) in enumerate(scores):
-            with cols[i]:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <h4>{score_name}</h4>
-                    <div class="score-badge {get_score_class(score_value)}">
-                        {score_value}/100
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+        render_quick_stats(feedback, mode)
+    
+    revision_changes = recall('revision_changes')
+    if revision_changes:
+        with st.expander("🔄 What changed since the last version", expanded=True):
+            render_revision_changes(revision_changes)
     
     # Display detailed feedback
-    if 'feedback' in st.session_state:
+    if feedback is not None:
         st.markdown('<h2 class="sub-header">📋 Detailed Feedback</h2>', unsafe_allow_html=True)
-        
-        feedback = st.session_state.feedback
-        
-        # Create tabs for different feedback sections
-        tab1, tab2, tab3, tab4 = st.tabs(["📝 Feedback", "✅ Strengths", "🔧 Improvements", "💡 Suggestions"])
-        
-        with tab1:
-            st.markdown('<h3>Detailed Analysis</h3>', unsafe_allow_html=True)
-            
-            # Display feedback based on mode
-            if mode == "Student Essay":
-                if 'content_feedback' in feedback:
-                    st.markdown("**Content Feedback:**")
-                    st.write(feedback['content_feedback'])
-                
-                if 'grammar_feedback' in feedback:
-                    st.markdown("**Grammar Feedback:**")
-                    st.write(feedback['grammar_feedback'])
-                
-                if 'structure_feedback' in feedback:
-                    st.markdown("**Structure Feedback:**")
-                    st.write(feedback['structure_feedback'])
-                    
-            elif mode == "Resume":
-                if 'content_feedback' in feedback:
-                    st.markdown("**Content Feedback:**")
-                    st.write(feedback['content_feedback'])
-                
-                if 'formatting_feedback' in feedback:
-                    st.markdown("**Formatting Feedback:**")
-                    st.write(feedback['formatting_feedback'])
-                
-                if 'impact_feedback' in feedback:
-                    st.markdown("**Impact Feedback:**")
-                    st.write(feedback['impact_feedback'])
-                    
-            else:  # Invoice
-                if 'completeness_feedback' in feedback:
-                    st.markdown("**Completeness Feedback:**")
-                    st.write(feedback['completeness_feedback'])
-                
-                if 'clarity_feedback' in feedback:
-                    st.markdown("**Clarity Feedback:**")
-                    st.write(feedback['clarity_feedback'])
-                
-                if 'professionalism_feedback' in feedback:
-                    st.markdown("**Professionalism Feedback:**")
-                    st.write(feedback['professionalism_feedback'])
-        
-        with tab2:
-            st.markdown('<h3>Document Strengths</h3>', unsafe_allow_html=True)
-            if 'strengths' in feedback and feedback['strengths']:
-                for i, strength in enumerate(feedback['strengths'], 1):
-                    st.markdown(f"**{i}.** {strength}")
-            else:
-                st.info("No specific strengths identified in this analysis.")
-        
-        with tab3:
-            st.markdown('<h3>Areas for Improvement</h3>', unsafe_allow_html=True)
-            if 'areas_for_improvement' in feedback and feedback['areas_for_improvement']:
-                for i, area in enumerate(feedback['areas_for_improvement'], 1):
-                    st.markdown(f"**{i}.** {area}")
-            else:
-                st.info("No specific areas for improvement identified.")
-        
-        with tab4:
-            st.markdown('<h3>Suggestions</h3>', unsafe_allow_html=True)
-            if 'suggestions' in feedback and feedback['suggestions']:
-                for i, suggestion in enumerate(feedback['suggestions'], 1):
-                    st.markdown(f"**{i}.** {suggestion}")
-            else:
-                st.info("No specific suggestions provided in this analysis.")
+        render_detailed_feedback(feedback, mode)
         
         # Export section
         st.markdown("---")
@@ -600,30 +873,50 @@ def main():
         col_export1, col_export2 = st.columns(2)
         
         with col_export1:
-            if st.button("📊 Export PDF Report", use_container_width=True):
-                if 'feedback' in st.session_state:
-                    with st.spinner("Generating PDF report..."):
-                        pdf_buffer = create_pdf_report(
-                            st.session_state.feedback,
-                            st.session_state.mode,
-                            st.session_state.extracted_text
-                        )
-                    
+            export_format = st.radio("Format", ["PDF", "HTML", "JSON"], horizontal=True, key="export_format")
+            
+            if export_format == "PDF":
+                # Rendered reports are cached, so repeat exports of the same feedback are instant
+                if st.button("📊 Export PDF Report", use_container_width=True, disabled='report_job_id' in st.session_state):
+                    forget('report_pdf')
+                    st.session_state.report_job_id = get_job_manager().submit(
+                        report_job,
+                        feedback,
+                        st.session_state.mode,
+                        recall('extracted_text')
+                    )
+                
+                report_pdf = recall('report_pdf')
+                if 'report_job_id' in st.session_state:
+                    poll_report_job()
+                elif report_pdf is not None:
                     # Create download button
                     st.download_button(
                         label="📥 Download PDF Report",
-                        data=pdf_buffer.getvalue(),
+                        data=report_pdf,
                         file_name=f"DocuSense_AI_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
                         mime="application/pdf",
                         use_container_width=True
                     )
+            else:
+                # HTML and JSON skip ReportLab and render instantly
+                from report import REPORT_FORMATS, render_report
+                fmt = export_format.lower()
+                mime, extension = REPORT_FORMATS[fmt]
+                st.download_button(
+                    label=f"📥 Download {export_format} Report",
+                    data=render_report(feedback, st.session_state.mode, recall('extracted_text'), fmt),
+                    file_name=f"DocuSense_AI_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}",
+                    mime=mime,
+                    use_container_width=True
+                )
         
         with col_export2:
             if st.button("🔄 New Analysis", use_container_width=True):
-                # Clear session state
-                for key in ['feedback', 'extracted_text', 'mode']:
-                    if key in st.session_state:
-                        del st.session_state[key]
+                # Clear session state and the stored payloads it points to
+                for key in ['feedback', 'extracted_text', 'report_pdf', 'revision_changes']:
+                    forget(key)
+                st.session_state.pop('mode', None)
                 st.rerun()
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+DocuSense AI Pipeline Benchmark
+Times text extraction, prompt assembly, JSON parsing and PDF report rendering
+on a seeded synthetic corpus, reports throughput and peak memory, and compares
+the results against a saved baseline to catch regressions
+
+Usage:
+    python benchmark_pipeline.py --pages 1 10 100 --save-baseline
+    python benchmark_pipeline.py --pages 1 10 100 1000 --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from analysis import plan_requests
+from compression import compress_pdf
+from create_sample_pdfs import CORPUS_KINDS, generate_corpus
+from fake_llm import fake_feedback
+from json_stream import IncrementalJSONParser
+from pdf_engine import extract_text
+from report import RENDERERS
+from schemas import feedback_schema, parse_feedback
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CORPUS_DIR = os.path.join(APP_DIR, "benchmark_corpus")
+DEFAULT_BASELINE = os.path.join(APP_DIR, "benchmark_baseline.json")
+
+KIND_MODES = {"essay": "Student Essay", "resume": "Resume", "invoice": "Invoice"}
+
+STAGES = ["extract", "prompt", "parse", "report"]
+
+# Timings shorter than this are too noisy to flag as regressions
+MIN_COMPARABLE_SECONDS = 0.005
+
+
+def _extract(doc):
+    doc["text"] = extract_text(doc["pdf_bytes"], max_workers=doc["workers"])
+
+
+def _prompt(doc):
+    prompt_text = compress_pdf(doc["pdf_bytes"]) or doc["text"]
+    doc["prompts"], _ = plan_requests(prompt_text, doc["mode"])
+
+
+def _parse(doc):
+    schema = feedback_schema(doc["mode"])
+    for prompt in doc["prompts"]:
+        params = {"messages": [{"role": "user", "content": prompt}]}
+        reply = json.dumps(fake_feedback(params))
+        # Once as a streamed reply, once as a complete one
+        parser = IncrementalJSONParser()
+        for start in range(0, len(reply), 16):
+            parser.feed(reply[start:start + 16])
+        parse_feedback(reply, schema)
+
+
+def _report(doc):
+    # Straight to the renderer, so the report cache doesn't hide the cost
+    feedback = fake_feedback({"messages": [{"role": "user", "content": doc["prompts"][0]}]})
+    RENDERERS["pdf"](feedback, doc["mode"], "2024-01-01 00:00:00")
+
+
+STAGE_FUNCTIONS = {"extract": _extract, "prompt": _prompt, "parse": _parse, "report": _report}
+
+
+def time_stage(fn, doc, repeat):
+    """Return the best wall time of several runs"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(doc)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(fn, doc):
+    """Return the peak Python heap allocated by one run, in MB
+
+    Measured in a separate run because tracing slows allocation-heavy code.
+    Native allocations (MuPDF) and worker processes are not included.
+    """
+    tracemalloc.start()
+    try:
+        fn(doc)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def benchmark(corpus, repeat, workers):
+    """Time every stage on every document, returning {"kind/pages": {stage: result}}"""
+    results = {}
+    for (kind, pages), path in sorted(corpus.items()):
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        doc = {"pdf_bytes": pdf_bytes, "mode": KIND_MODES[kind], "workers": workers}
+        size_mb = len(pdf_bytes) / (1024 * 1024)
+
+        entry = {}
+        for stage in STAGES:
+            fn = STAGE_FUNCTIONS[stage]
+            seconds = time_stage(fn, doc, repeat)
+            entry[stage] = {
+                "seconds": round(seconds, 5),
+                "pages_per_s": round(pages / seconds, 1) if seconds else None,
+                "mb_per_s": round(size_mb / seconds, 2) if seconds else None,
+                "peak_mb": round(peak_memory(fn, doc), 2)
+            }
+        results[f"{kind}/{pages}"] = entry
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return (name, stage, metric, baseline, current) for every result worse than the baseline allows"""
+    regressions = []
+    for name, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(name, {}).get(stage)
+            if not previous:
+                continue
+            if (current["seconds"] > previous["seconds"] * (1 + tolerance)
+                    and current["seconds"] >= MIN_COMPARABLE_SECONDS):
+                regressions.append((name, stage, "seconds", previous["seconds"], current["seconds"]))
+            if current["peak_mb"] > previous["peak_mb"] * (1 + tolerance) + 0.5:
+                regressions.append((name, stage, "peak_mb", previous["peak_mb"], current["peak_mb"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DocuSense AI document pipeline")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100], help="Document sizes to benchmark")
+    parser.add_argument("--kinds", nargs="+", choices=CORPUS_KINDS, default=CORPUS_KINDS, help="Document kinds")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Where generated PDFs are kept")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is kept")
+    parser.add_argument("--workers", type=int, help="Extraction processes (default: the engine's choice)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before failing, e.g. 0.2 = 20%%")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.corpus_dir, args.pages, args.kinds, args.seed)
+    results = benchmark(corpus, args.repeat, args.workers)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"⏱️  Pipeline benchmark (best of {args.repeat}, seed {args.seed})")
+        print(f"   {'document':<14}{'stage':<9}{'seconds':>10}{'pages/s':>11}{'MB/s':>9}{'peak MB':>10}")
+        for name, stages in results.items():
+            for stage, r in stages.items():
+                print(f"   {name:<14}{stage:<9}{r['seconds']:>10.4f}{r['pages_per_s'] or 0:>11.1f}"
+                      f"{r['mb_per_s'] or 0:>9.2f}{r['peak_mb']:>10.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"💾 Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️  No baseline to compare against; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, stage, metric, previous, current in regressions:
+        print(f"❌ {name} {stage}: {metric} {previous} -> {current}")
+    if not regressions:
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+DocuSense AI Startup Benchmark
+Measures cold-start import time and time to first render of the Streamlit app,
+each in a fresh interpreter so nothing is warm from a previous run
+
+Usage:
+    python benchmark_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules app.py imports at startup
+APP_MODULES = ["pdf_engine", "analysis", "chunking", "preanalysis", "invoice_checker", "config"]
+
+# Libraries that should only be imported once a feature needs them
+DEFERRED_MODULES = ["spacy", "openai", "fitz", "reportlab.platypus", "tiktoken"]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import streamlit
+streamlit_s = time.perf_counter() - started
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+app_s = time.perf_counter() - started
+loaded = [name for name in {deferred!r} if name.split(".")[0] in sys.modules]
+print(json.dumps({{"streamlit_s": streamlit_s, "app_modules_s": app_s, "eagerly_loaded": loaded}}))
+"""
+
+RENDER_SNIPPET = """
+import json, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({path!r}, default_timeout=120).run()
+print(json.dumps({{"first_render_s": time.perf_counter() - started, "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+MODULE_SNIPPET = """
+import json, time
+started = time.perf_counter()
+try:
+    __import__({name!r})
+    print(json.dumps(time.perf_counter() - started))
+except ImportError:
+    print(json.dumps(None))
+"""
+
+
+def run_snippet(code):
+    """Run code in a fresh interpreter and return the JSON it prints last"""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_of(runs, key):
+    return statistics.median(run[key] for run in runs)
+
+
+def benchmark(runs):
+    """Return median startup timings over several cold starts"""
+    imports = [
+        run_snippet(IMPORT_SNIPPET.format(modules=APP_MODULES, deferred=DEFERRED_MODULES))
+        for _ in range(runs)
+    ]
+    renders = [
+        run_snippet(RENDER_SNIPPET.format(path=os.path.join(APP_DIR, "app.py")))
+        for _ in range(runs)
+    ]
+    deferred = {name: run_snippet(MODULE_SNIPPET.format(name=name)) for name in DEFERRED_MODULES}
+
+    return {
+        "runs": runs,
+        "streamlit_import_s": round(median_of(imports, "streamlit_s"), 3),
+        "app_import_s": round(median_of(imports, "app_modules_s"), 3),
+        "first_render_s": round(median_of(renders, "first_render_s"), 3),
+        "eagerly_loaded": sorted({name for run in imports for name in run["eagerly_loaded"]}),
+        "render_errors": sorted({error for run in renders for error in run["errors"]}),
+        "deferred_import_s": {name: round(s, 3) for name, s in deferred.items() if s is not None}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure DocuSense AI cold-start time")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to take the median of")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"⏱️  Startup benchmark (median of {results['runs']} cold starts)")
+        print(f"   Streamlit import:   {results['streamlit_import_s']:.3f}s")
+        print(f"   App module imports: {results['app_import_s']:.3f}s")
+        print(f"   First render:       {results['first_render_s']:.3f}s")
+        saved = sum(results["deferred_import_s"].values())
+        print(f"💤 Deferred until first use: {saved:.3f}s ({', '.join(results['deferred_import_s'])})")
+        if results["eagerly_loaded"]:
+            print(f"⚠️  Loaded at startup but should be deferred: {', '.join(results['eagerly_loaded'])}")
+        for error in results["render_errors"]:
+            print(f"❌ First render raised: {error}")
+
+    return 1 if results["eagerly_loaded"] or results["render_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
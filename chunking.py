@@ -0,0 +1,81 @@
+"""
+Token-aware Chunking for DocuSense AI
+Splits long documents on paragraph and page boundaries so every chunk fits
+inside the model's context window
+"""
+
+import re
+
+# Rough average for English prose when tiktoken isn't installed
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+
+
+def _get_encoding(model):
+    if model not in _encodings:
+        # Imported on first use so startup doesn't pay for it
+        try:
+            import tiktoken
+        except ImportError:  # Fall back to a character-based estimate
+            _encodings[model] = None
+            return None
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """Count (or estimate) the number of tokens in text for a model"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_paragraphs(text):
+    """Split text on blank lines, which also separate extracted pages"""
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def _split_oversized(paragraph, max_tokens, model):
+    """Break a paragraph that alone exceeds the budget into smaller pieces"""
+    pieces = [line for line in paragraph.splitlines() if line.strip()]
+    if len(pieces) <= 1:
+        pieces = re.split(r"(?<=[.!?])\s+", paragraph)
+
+    for piece in pieces:
+        if count_tokens(piece, model) <= max_tokens:
+            yield piece
+        else:
+            # Last resort for run-on text: cut on character count
+            step = max_tokens * CHARS_PER_TOKEN
+            for start in range(0, len(piece), step):
+                yield piece[start:start + step]
+
+
+def chunk_text(text, max_tokens, model="gpt-3.5-turbo"):
+    """Greedily pack paragraphs into chunks of at most max_tokens tokens"""
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for paragraph in split_paragraphs(text):
+        tokens = count_tokens(paragraph, model)
+        pieces = [(paragraph, tokens)] if tokens <= max_tokens else [
+            (piece, count_tokens(piece, model)) for piece in _split_oversized(paragraph, max_tokens, model)
+        ]
+
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
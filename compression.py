@@ -0,0 +1,131 @@
+"""
+Prompt Compression for DocuSense AI
+Strips headers, footers, letterhead and page numbers that PDFs repeat on every
+page, and collapses whitespace, so prompts carry only the document's content
+"""
+
+import re
+from collections import Counter
+
+from chunking import count_tokens
+from metrics import span
+from pdf_engine import open_document
+
+# Bump whenever compressed output changes so cached text is invalidated
+COMPRESSOR_VERSION = "1"
+
+# Prompt tokens a typical document of each mode should fit in after compression
+PROMPT_TOKEN_BUDGETS = {
+    "Student Essay": 6000,
+    "Resume": 2500,
+    "Invoice": 2000
+}
+
+# Blocks in the top or bottom band of a page are treated as header or footer
+MARGIN_FRACTION = 0.12
+
+# A block is boilerplate when it sits at the same height on this share of pages;
+# header and footer blocks match with their numbers masked ("Page 3 of 9")
+REPEAT_FRACTION = 0.5
+MIN_REPEAT_PAGES = 2
+POSITION_BUCKETS = 40
+
+PAGE_NUMBER_PATTERN = re.compile(
+    r"^(?:page\s*)?[-–—(\[]?\s*(?:\d{1,4}|[ivxlc]{1,7})\s*[-–—)\]]?(?:\s*(?:of|/)\s*\d{1,4})?$",
+    re.IGNORECASE
+)
+
+
+def read_page_blocks(pdf):
+    """Return each page's text blocks as (relative y0, relative y1, text) tuples"""
+    pages = []
+    doc = open_document(pdf)
+    try:
+        for page in doc:
+            height = page.rect.height or 1
+            pages.append([
+                (y0 / height, y1 / height, text)
+                for x0, y0, x1, y1, text, block_no, block_type in page.get_text("blocks")
+                if block_type == 0 and text.strip()
+            ])
+    finally:
+        doc.close()
+    return pages
+
+
+def collapse_whitespace(text):
+    """Trim lines, squeeze runs of spaces and drop empty lines"""
+    lines = (re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _in_margin(y0, y1):
+    return y1 <= MARGIN_FRACTION or y0 >= 1 - MARGIN_FRACTION
+
+
+def _signature(text, y0, y1):
+    """Identify a block by its text and its height on the page"""
+    text = collapse_whitespace(text).lower()
+    if _in_margin(y0, y1):
+        text = re.sub(r"\d+", "#", text)
+    return text, round((y0 + y1) / 2 * POSITION_BUCKETS)
+
+
+def compress_pages(pages):
+    """Drop repeated blocks and page numbers from page blocks and return text and counts
+
+    The first occurrence of a repeated block is kept, so a letterhead still
+    names the sender once.
+    """
+    counts = Counter()
+    for blocks in pages:
+        counts.update({_signature(text, y0, y1) for y0, y1, text in blocks})
+    min_pages = max(MIN_REPEAT_PAGES, REPEAT_FRACTION * len(pages))
+    repeated = {signature for signature, n in counts.items() if n >= min_pages}
+
+    emitted = set()
+    removed_repeats = 0
+    removed_page_numbers = 0
+    page_texts = []
+    for blocks in pages:
+        kept = []
+        for y0, y1, text in blocks:
+            cleaned = collapse_whitespace(text)
+            if _in_margin(y0, y1) and PAGE_NUMBER_PATTERN.match(cleaned):
+                removed_page_numbers += 1
+                continue
+            signature = _signature(text, y0, y1)
+            if signature in repeated:
+                if signature in emitted:
+                    removed_repeats += 1
+                    continue
+                emitted.add(signature)
+            kept.append(cleaned)
+        if kept:
+            page_texts.append("\n".join(kept))
+
+    return {
+        "text": "\n\n".join(page_texts),
+        "removed_repeats": removed_repeats,
+        "removed_page_numbers": removed_page_numbers
+    }
+
+
+def compress_pdf(pdf):
+    """Return the compressed text of a PDF path or buffer, suitable for an ExtractionCache"""
+    with span("compress"):
+        return compress_pages(read_page_blocks(pdf))["text"]
+
+
+def compression_stats(original_text, compressed_text, mode):
+    """Compare prompt tokens before and after compression against the mode's budget"""
+    before = count_tokens(original_text)
+    after = count_tokens(compressed_text)
+    budget = PROMPT_TOKEN_BUDGETS.get(mode)
+    return {
+        "tokens_before": before,
+        "tokens_after": after,
+        "saved_percent": round(100 * (before - after) / before) if before else 0,
+        "budget": budget,
+        "within_budget": budget is None or after <= budget
+    }
@@ -0,0 +1,78 @@
+"""
+Configuration for DocuSense AI
+Environment-driven settings and cache factories shared by the Streamlit app
+and the command-line tools
+"""
+
+import os
+
+from compression import COMPRESSOR_VERSION
+from extraction_cache import ExtractionCache
+from near_duplicates import NearDuplicateIndex
+from pdf_engine import EXTRACTOR_VERSION
+from response_cache import ResponseCache
+from session_store import SessionStore
+
+# Set DOCUSENSE_CACHE_DIR to an empty string to keep caches in memory only
+CACHE_DIR = os.getenv("DOCUSENSE_CACHE_DIR", ".docusense_cache")
+EXTRACTION_CACHE_MB = int(os.getenv("DOCUSENSE_EXTRACTION_CACHE_MB", "64"))
+
+RESPONSE_CACHE_TTL_HOURS = float(os.getenv("DOCUSENSE_RESPONSE_CACHE_TTL_HOURS", "168"))
+RESPONSE_CACHE_MB = int(os.getenv("DOCUSENSE_RESPONSE_CACHE_MB", "256"))
+
+# Set DOCUSENSE_NEAR_DUPLICATE_THRESHOLD to an empty string to analyze near-duplicates afresh
+NEAR_DUPLICATE_THRESHOLD = os.getenv("DOCUSENSE_NEAR_DUPLICATE_THRESHOLD", "0.9")
+
+# Compressed text and feedback of all sessions together; the least recently used are dropped beyond this
+SESSION_STORE_MB = int(os.getenv("DOCUSENSE_SESSION_STORE_MB", "128"))
+SESSION_IDLE_MINUTES = float(os.getenv("DOCUSENSE_SESSION_IDLE_MINUTES", "30"))
+
+
+def create_extraction_cache(max_memory_mb=EXTRACTION_CACHE_MB):
+    """Build the extracted-text cache from environment settings"""
+    disk_dir = os.path.join(CACHE_DIR, "extraction") if CACHE_DIR else None
+    return ExtractionCache(
+        EXTRACTOR_VERSION,
+        max_memory_bytes=max_memory_mb * 1024 * 1024,
+        disk_dir=disk_dir
+    )
+
+
+def create_compression_cache(max_memory_mb=EXTRACTION_CACHE_MB):
+    """Build the cache of boilerplate-stripped prompt text"""
+    disk_dir = os.path.join(CACHE_DIR, "compressed") if CACHE_DIR else None
+    return ExtractionCache(
+        COMPRESSOR_VERSION,
+        max_memory_bytes=max_memory_mb * 1024 * 1024,
+        disk_dir=disk_dir
+    )
+
+
+def create_response_cache():
+    """Build the LLM response cache from environment settings"""
+    if CACHE_DIR:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, "responses.sqlite3") if CACHE_DIR else ":memory:"
+    return ResponseCache(
+        path,
+        ttl_seconds=RESPONSE_CACHE_TTL_HOURS * 3600,
+        max_bytes=RESPONSE_CACHE_MB * 1024 * 1024,
+        near_duplicates=create_near_duplicate_index()
+    )
+
+
+def create_near_duplicate_index():
+    """Build the near-duplicate index that lets similar documents share cached feedback"""
+    if not NEAR_DUPLICATE_THRESHOLD:
+        return None
+    path = os.path.join(CACHE_DIR, "near_duplicates.sqlite3") if CACHE_DIR else ":memory:"
+    return NearDuplicateIndex(path, threshold=float(NEAR_DUPLICATE_THRESHOLD))
+
+
+def create_session_store(sources=None):
+    """Build the bounded store of per-session payloads; sources rebuild evicted ones"""
+    return SessionStore(
+        max_bytes=SESSION_STORE_MB * 1024 * 1024,
+        idle_seconds=SESSION_IDLE_MINUTES * 60,
+        sources=sources
+    )
@@ -1,14 +1,51 @@
 #!/usr/bin/env python3
 """
 Sample PDF Creator for DocuSense AI
-Converts sample text files to PDF format for testing the application
+Converts sample text files to PDF format for testing the application, and
+generates seeded synthetic essays, resumes and invoices of any length for
+benchmarks
+
+Usage:
+    python create_sample_pdfs.py
+    python create_sample_pdfs.py --corpus corpus/ --pages 1 10 100 1000 --seed 42
 """
 
+from reportlab import rl_config
+from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+import argparse
 import os
+import random
+
+# Same seed, same bytes: no timestamps or random document IDs in the output
+rl_config.invariant = 1
+
+CORPUS_KINDS = ["essay", "resume", "invoice"]
+
+WORDS = (
+    "analysis argument evidence research student policy education economy climate history society "
+    "technology community development language culture system approach result impact change growth "
+    "strategy process quality value market region network example theory practice study model data "
+    "clearly significant important however therefore moreover although because while during across"
+).split()
+VERBS = "shows suggests demonstrates improves reduces supports explains reveals affects requires".split()
+COMPANIES = ["Acme Widgets Ltd", "Globex Corporation", "Initech LLC", "Umbrella Supplies Inc", "Stark Industries plc"]
+PEOPLE = ["Alex Morgan", "Jordan Lee", "Sam Patel", "Taylor Kim", "Casey Nguyen", "Riley Chen"]
+ITEMS = ["Consulting hours", "Widget A", "Widget B", "Support plan", "Installation", "Training session",
+         "Cloud hosting", "License renewal", "Hardware kit", "Design review"]
+
+# Names given to the last line items of each invoice, so the line-item check has
+# to tell them from the real subtotal, tax and total rows below
+TOTAL_LIKE_ITEMS = ["Tax preparation services", "Shipping boxes (x10)"]
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('FONTSIZE', (0, 0), (-1, -1), 9)
+])
 
 def create_pdf_from_text(text_file, pdf_file):
     """Convert a text file to PDF format"""
@@ -45,8 +82,151 @@ def create_pdf_from_text(text_file, pdf_file):
         print(f"❌ Error creating {pdf_file}: {e}")
         return False
 
-def main():
+def _sentence(rng, min_words=8, max_words=22):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    words.insert(rng.randint(1, len(words) - 1), rng.choice(VERBS))
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng, sentences=5):
+    return " ".join(_sentence(rng) for _ in range(rng.randint(sentences - 2, sentences + 2)))
+
+
+def _essay_page(rng, number, styles):
+    story = []
+    if number == 1:
+        story.append(Paragraph(f"The {rng.choice(WORDS).title()} of {rng.choice(WORDS).title()}", styles['Title']))
+    story.append(Paragraph(f"Section {number}: {rng.choice(WORDS).title()}", styles['Heading2']))
+    for _ in range(4):
+        story.append(Paragraph(_paragraph(rng), styles['Normal']))
+        story.append(Spacer(1, 10))
+    return story
+
+
+def _resume_page(rng, number, styles):
+    story = []
+    if number == 1:
+        story.append(Paragraph(rng.choice(PEOPLE), styles['Title']))
+        story.append(Paragraph("Summary", styles['Heading2']))
+        story.append(Paragraph(_paragraph(rng, 3), styles['Normal']))
+    story.append(Paragraph("Experience", styles['Heading2']))
+    for _ in range(3):
+        start = rng.randint(2005, 2022)
+        story.append(Paragraph(f"<b>{rng.choice(WORDS).title()} Lead</b>, {rng.choice(COMPANIES)} ({start} - {start + rng.randint(1, 4)})", styles['Normal']))
+        for _ in range(3):
+            story.append(Paragraph(f"• {_sentence(rng, 6, 14)}", styles['Normal']))
+        story.append(Spacer(1, 8))
+    skills = [["Skill", "Level", "Years"]] + [
+        [rng.choice(WORDS).title(), rng.choice(["Expert", "Advanced", "Intermediate"]), str(rng.randint(1, 15))]
+        for _ in range(5)
+    ]
+    story.append(Paragraph("Skills", styles['Heading2']))
+    story.append(Table(skills, style=TABLE_STYLE))
+    return story
+
+
+def _invoice_page(rng, number, pages, styles, state):
+    story = []
+    if number == 1:
+        story.append(Paragraph(f"Invoice Number: INV-{rng.randint(1000, 9999)}", styles['Heading2']))
+        story.append(Paragraph(f"Invoice Date: March {rng.randint(1, 28)}, 2024", styles['Normal']))
+        story.append(Paragraph(f"Due Date: April {rng.randint(1, 28)}, 2024", styles['Normal']))
+        story.append(Paragraph(f"Bill To: {rng.choice(COMPANIES)}", styles['Normal']))
+        story.append(Spacer(1, 10))
+
+    rows = [["Description", "Qty", "Unit Price", "Amount"]]
+    for _ in range(25):
+        quantity = rng.randint(1, 20)
+        price = rng.randint(500, 50000) / 100
+        state["subtotal"] += quantity * price
+        rows.append([rng.choice(ITEMS), str(quantity), f"${price:,.2f}", f"${quantity * price:,.2f}"])
+    if number == pages:
+        for row, description in zip(rows[-len(TOTAL_LIKE_ITEMS):], TOTAL_LIKE_ITEMS):
+            row[0] = description
+    story.append(Table(rows, style=TABLE_STYLE))
+
+    if number == pages:
+        subtotal = state["subtotal"]
+        story.append(Spacer(1, 10))
+        story.append(Table([
+            ["Subtotal", f"${subtotal:,.2f}"],
+            ["Tax (10%)", f"${subtotal * 0.1:,.2f}"],
+            ["Total Due", f"${subtotal * 1.1:,.2f}"]
+        ], style=TABLE_STYLE))
+        story.append(Paragraph("Payment Terms: Net 30. Pay by bank transfer to IBAN GB00 0000 0000 0000.", styles['Normal']))
+    return story
+
+
+def _letterhead(canvas, doc, company):
+    """Draw the header and footer repeated on every page"""
+    canvas.saveState()
+    canvas.setFont("Helvetica-Bold", 10)
+    canvas.drawString(inch, letter[1] - 0.6 * inch, company)
+    canvas.setFont("Helvetica", 8)
+    canvas.drawRightString(letter[0] - inch, letter[1] - 0.6 * inch, "Confidential - generated sample")
+    canvas.drawCentredString(letter[0] / 2, 0.5 * inch, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def create_synthetic_pdf(kind, pages, pdf_file, seed=0):
+    """Write a seeded synthetic essay, resume or invoice with exactly this many pages"""
+    rng = random.Random(f"{kind}-{pages}-{seed}")
+    styles = getSampleStyleSheet()
+    company = rng.choice(COMPANIES)
+    state = {"subtotal": 0.0}
+
+    story = []
+    for number in range(1, pages + 1):
+        if kind == "essay":
+            story += _essay_page(rng, number, styles)
+        elif kind == "resume":
+            story += _resume_page(rng, number, styles)
+        else:
+            story += _invoice_page(rng, number, pages, styles, state)
+        if number < pages:
+            story.append(PageBreak())
+
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter, topMargin=inch, bottomMargin=inch)
+    doc.build(
+        story,
+        onFirstPage=lambda canvas, d: _letterhead(canvas, d, company),
+        onLaterPages=lambda canvas, d: _letterhead(canvas, d, company)
+    )
+    return pdf_file
+
+
+def generate_corpus(output_dir, page_counts, kinds=CORPUS_KINDS, seed=0):
+    """Create one synthetic PDF per kind and page count, reusing files that already exist
+
+    Returns {(kind, pages): path}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    corpus = {}
+    for kind in kinds:
+        for pages in page_counts:
+            path = os.path.join(output_dir, f"{kind}_{pages}p_seed{seed}.pdf")
+            if not os.path.exists(path):
+                create_synthetic_pdf(kind, pages, path, seed)
+                print(f"✅ Created {path}")
+            corpus[(kind, pages)] = path
+    return corpus
+
+
+def main(argv=None):
     """Main function to create sample PDFs"""
+    parser = argparse.ArgumentParser(description="Create sample PDFs for DocuSense AI")
+    parser.add_argument("--corpus", help="Generate a synthetic corpus into this directory instead")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100], help="Page counts to generate")
+    parser.add_argument("--kinds", nargs="+", choices=CORPUS_KINDS, default=CORPUS_KINDS, help="Document kinds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for reproducible content")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        print(f"📄 Generating synthetic corpus in {args.corpus}...")
+        corpus = generate_corpus(args.corpus, args.pages, args.kinds, args.seed)
+        print(f"🎉 Corpus ready: {len(corpus)} PDFs")
+        return
+
     print("📄 Creating sample PDFs for DocuSense AI testing...")
     print("=" * 50)
     
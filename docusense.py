@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+DocuSense AI Command Line
+Headless batch analysis of PDF directories without Streamlit
+
+Usage:
+    python docusense.py batch essays/ --mode "Student Essay" --output results.jsonl
+    python docusense.py report results.jsonl --reports-dir reports/ --format html
+    python docusense.py shortlist resumes/ --job job_description.pdf --top-k 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables before the local modules below read their settings
+load_dotenv()
+
+from analysis import PROMPT_TEMPLATES, analyze_text_async
+from invoice_checker import check_invoice
+from config import create_response_cache
+from pdf_engine import default_worker_count
+from pipeline import extract_document
+from report import REPORT_FORMATS, render_report as render_report_bytes, render_reports
+from llm_backend import BACKENDS, LLM_BACKEND, aclose, get_async_client, requires_api_key
+from metrics import span, trace_analysis
+from shortlist import shortlist
+from uploads import check_size
+
+
+def extract_file(path, compress=True):
+    """Extract text from a PDF on disk, returning the full and the prompt text
+
+    The file is opened by path, so its bytes are never held in memory whole.
+    """
+    check_size(os.path.getsize(path))
+    return extract_document(path, compress)
+
+
+def write_report(report_path, report):
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "wb") as f:
+        f.write(report)
+    return report_path
+
+
+def render_report(feedback, mode, text, report_path, fmt="pdf"):
+    """Write a report for one analyzed document"""
+    return write_report(report_path, render_report_bytes(feedback, mode, text, fmt))
+
+
+def report_path_for(reports_dir, rel_path, fmt):
+    return os.path.join(reports_dir, Path(rel_path).with_suffix(".report" + REPORT_FORMATS[fmt][1]))
+
+
+def find_pdfs(input_dir):
+    """Return all PDFs under a directory, sorted for a stable processing order"""
+    return sorted(path for path in Path(input_dir).rglob("*") if path.suffix.lower() == ".pdf")
+
+
+def load_completed(output_path):
+    """Return the files already analyzed successfully in an existing output file"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if "error" not in record:
+                completed.add(record["file"])
+    return completed
+
+
+async def process_file(path, rel_path, args, client, response_cache, process_pool, limits):
+    """Extract, analyze and optionally report on one PDF, returning its output record"""
+    async with limits["in_flight"]:
+        return await _process_file(path, rel_path, args, client, response_cache, process_pool, limits)
+
+
+async def _process_file(path, rel_path, args, client, response_cache, process_pool, limits):
+    with trace_analysis(args.mode, source="cli", file=rel_path) as trace:
+        record = await _analyze_file(path, rel_path, args, client, response_cache, process_pool, limits)
+        if "error" in record:
+            trace.fail(record["error"])
+        return record
+
+
+async def _analyze_file(path, rel_path, args, client, response_cache, process_pool, limits):
+    loop = asyncio.get_running_loop()
+    record = {"file": rel_path, "mode": args.mode}
+    started = time.perf_counter()
+
+    try:
+        with span("extract", compress=not args.no_compress):
+            text, prompt_text = await loop.run_in_executor(process_pool, extract_file, str(path), not args.no_compress)
+        if not text:
+            raise ValueError("No text could be extracted from the PDF")
+
+        local_analysis = None
+        if args.mode == "Invoice":
+            # Opened by path in a worker, so line-item tables are rebuilt without blocking the event loop
+            with span("invoice_check"):
+                local_analysis = await loop.run_in_executor(process_pool, check_invoice, text, str(path))
+        async with limits["llm"]:
+            feedback = await analyze_text_async(
+                prompt_text, args.mode, client, cache=response_cache, refresh=args.refresh,
+                local_analysis=local_analysis
+            )
+        record["feedback"] = feedback
+
+        if args.reports_dir:
+            report_path = report_path_for(args.reports_dir, rel_path, args.report_format)
+            with span("report", format=args.report_format):
+                record["report"] = await loop.run_in_executor(
+                    process_pool, render_report, feedback, args.mode, text, report_path, args.report_format
+                )
+    except Exception as e:
+        record["error"] = str(e)
+
+    record["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+async def run_batch(args):
+    """Analyze every pending PDF, appending results to the output as they finish"""
+    pdfs = find_pdfs(args.input_dir)
+    completed = load_completed(args.output)
+    pending = [(path, path.relative_to(args.input_dir).as_posix()) for path in pdfs]
+    pending = [(path, rel) for path, rel in pending if rel not in completed]
+
+    print(f"📄 Found {len(pdfs)} PDFs, {len(completed)} already done, {len(pending)} to analyze")
+    if not pending:
+        return 0
+
+    if args.reports_dir:
+        os.makedirs(args.reports_dir, exist_ok=True)
+
+    client = get_async_client(args.api_key, args.llm_backend)
+    response_cache = None if args.no_cache else create_response_cache()
+    limits = {
+        "llm": asyncio.Semaphore(args.concurrency),
+        # Bounds how many extracted texts are held in memory awaiting the LLM
+        "in_flight": asyncio.Semaphore(args.concurrency + 2 * args.workers)
+    }
+    failures = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as process_pool, \
+            open(args.output, "a", encoding="utf-8") as out:
+        tasks = [
+            process_file(path, rel, args, client, response_cache, process_pool, limits)
+            for path, rel in pending
+        ]
+        for done, next_result in enumerate(asyncio.as_completed(tasks), 1):
+            record = await next_result
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+            if "error" in record:
+                failures += 1
+                print(f"❌ [{done}/{len(pending)}] {record['file']}: {record['error']}")
+            else:
+                print(f"✅ [{done}/{len(pending)}] {record['file']} ({record['elapsed_s']}s)")
+
+    await aclose(args.llm_backend)
+
+    print(f"🎉 Batch finished: {len(pending) - failures} analyzed, {failures} failed")
+    return 1 if failures else 0
+
+
+def read_job_description(path, compress=True):
+    """Return the text of a job description given as a PDF or a plain text file"""
+    if path.lower().endswith(".pdf"):
+        text, prompt_text = extract_file(path, compress)
+        return prompt_text or text
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+async def extract_all(pdfs, input_dir, args, process_pool):
+    """Extract every PDF in the pool, returning (relative path, text, prompt text, error) tuples"""
+    loop = asyncio.get_running_loop()
+
+    async def extract(path):
+        rel_path = path.relative_to(input_dir).as_posix()
+        try:
+            text, prompt_text = await loop.run_in_executor(process_pool, extract_file, str(path), not args.no_compress)
+        except Exception as e:
+            return rel_path, None, None, str(e)
+        if not text:
+            return rel_path, None, None, "No text could be extracted from the PDF"
+        return rel_path, text, prompt_text, None
+
+    return await asyncio.gather(*(extract(path) for path in pdfs))
+
+
+async def analyze_shortlisted(entry, prompt_text, job_description, args, client, response_cache, limit):
+    """Run the full Resume analysis on one shortlisted resume, against the job description"""
+    async with limit:
+        with trace_analysis("Resume", source="cli", file=entry["file"], rank=entry["rank"]) as trace:
+            try:
+                entry["feedback"] = await analyze_text_async(
+                    prompt_text, "Resume", client, cache=response_cache, refresh=args.refresh,
+                    job_description=job_description
+                )
+            except Exception as e:
+                entry["error"] = str(e)
+                trace.fail(e)
+    return entry
+
+
+async def run_shortlist(args):
+    """Rank every resume against a job description and analyze only the top k"""
+    pdfs = find_pdfs(args.input_dir)
+    print(f"📄 Found {len(pdfs)} resumes")
+    if not pdfs:
+        return 0
+
+    job_description = read_job_description(args.job, not args.no_compress)
+    if not job_description.strip():
+        print(f"❌ No text found in the job description {args.job}")
+        return 2
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as process_pool:
+        with span("extract", documents=len(pdfs)):
+            extracted = await extract_all(pdfs, args.input_dir, args, process_pool)
+    print(f"📝 Extracted {len(pdfs)} resumes in {time.perf_counter() - started:.1f}s")
+
+    resumes = [(rel_path, text) for rel_path, text, _, error in extracted if error is None]
+    prompt_texts = {rel_path: prompt_text or text for rel_path, text, prompt_text, error in extracted if error is None}
+    failed = [{"file": rel_path, "mode": "Resume", "error": error} for rel_path, _, _, error in extracted if error]
+
+    started = time.perf_counter()
+    with span("shortlist", documents=len(resumes)):
+        ranked = shortlist(job_description, resumes, args.top_k)
+    print(f"⚡ Ranked {len(resumes)} resumes against the job description in {time.perf_counter() - started:.2f}s")
+
+    top = ranked[:args.top_k]
+    if top:
+        print(f"🤖 Analyzing the top {len(top)} with the LLM")
+        client = get_async_client(args.api_key, args.llm_backend)
+        response_cache = None if args.no_cache else create_response_cache()
+        limit = asyncio.Semaphore(args.concurrency)
+        await asyncio.gather(*(
+            analyze_shortlisted(entry, prompt_texts[entry["file"]], job_description, args, client, response_cache, limit)
+            for entry in top
+        ))
+        await aclose(args.llm_backend)
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        for entry in ranked + failed:
+            out.write(json.dumps({"mode": "Resume", **entry}) + "\n")
+
+    for entry in top:
+        if "error" in entry:
+            print(f"❌ {entry['rank']:>3}. {entry['file']} (match {entry['score']:.3f}): {entry['error']}")
+        else:
+            print(f"🏆 {entry['rank']:>3}. {entry['file']} (match {entry['score']:.3f}, "
+                  f"overall {entry['feedback'].get('overall_score', '-')})")
+    for entry in failed:
+        print(f"❌ {entry['file']}: {entry['error']}")
+
+    analyzed = sum(1 for entry in top if "feedback" in entry)
+    errors = len(failed) + len(top) - analyzed
+    print(f"🎉 Shortlist written to {args.output}: {len(ranked)} ranked, {analyzed} analyzed, {errors} failed")
+    return 1 if errors else 0
+
+
+def run_reports(args):
+    """Render reports for every successful record in a batch output file"""
+    records = []
+    with open(args.results, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "feedback" in record:
+                records.append(record)
+
+    # A file retried after a failure appears more than once; the last record wins
+    records = list({record["file"]: record for record in records}.values())
+    print(f"📄 Rendering {len(records)} {args.format.upper()} reports with {args.workers} workers")
+    started = time.perf_counter()
+
+    reports = render_reports(
+        [(record["feedback"], record["mode"]) for record in records],
+        fmt=args.format,
+        max_workers=args.workers
+    )
+    for record, report in zip(records, reports):
+        write_report(report_path_for(args.reports_dir, record["file"], args.format), report)
+
+    print(f"🎉 Wrote {len(reports)} reports to {args.reports_dir} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="docusense", description="DocuSense AI command line tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Analyze every PDF in a directory")
+    batch.add_argument("input_dir", help="Directory searched recursively for PDF files")
+    batch.add_argument("--mode", required=True, choices=list(PROMPT_TEMPLATES), help="Document type")
+    batch.add_argument("--output", default="docusense_results.jsonl", help="JSONL file results are appended to")
+    batch.add_argument("--concurrency", type=int, default=8, help="Maximum simultaneous OpenAI analyses")
+    batch.add_argument("--workers", type=int, default=default_worker_count(), help="Extraction worker processes")
+    batch.add_argument("--reports-dir", help="Also write a report per document into this directory")
+    batch.add_argument("--report-format", choices=list(REPORT_FORMATS), default="pdf", help="Format of --reports-dir reports")
+    batch.add_argument("--api-key", default=os.getenv("OPENAI_API_KEY"), help="OpenAI API key (default: $OPENAI_API_KEY)")
+    batch.add_argument("--llm-backend", choices=BACKENDS, default=LLM_BACKEND, help="Where completions come from (default: $DOCUSENSE_LLM_BACKEND)")
+    batch.add_argument("--no-cache", action="store_true", help="Don't read or write the response cache")
+    batch.add_argument("--no-compress", action="store_true", help="Send the full text, keeping repeated headers and footers")
+    batch.add_argument("--refresh", action="store_true", help="Ignore cached responses but store fresh ones")
+
+    ranking = subparsers.add_parser("shortlist", help="Rank resumes against a job description and analyze the best")
+    ranking.add_argument("input_dir", help="Directory searched recursively for resume PDFs")
+    ranking.add_argument("--job", required=True, help="Job description as a PDF or text file")
+    ranking.add_argument("--top-k", type=int, default=10, help="Best matches sent for a full LLM analysis (0 = rank only)")
+    ranking.add_argument("--output", default="docusense_shortlist.jsonl", help="JSONL file of every resume in rank order")
+    ranking.add_argument("--concurrency", type=int, default=8, help="Maximum simultaneous OpenAI analyses")
+    ranking.add_argument("--workers", type=int, default=default_worker_count(), help="Extraction worker processes")
+    ranking.add_argument("--api-key", default=os.getenv("OPENAI_API_KEY"), help="OpenAI API key (default: $OPENAI_API_KEY)")
+    ranking.add_argument("--llm-backend", choices=BACKENDS, default=LLM_BACKEND, help="Where completions come from (default: $DOCUSENSE_LLM_BACKEND)")
+    ranking.add_argument("--no-cache", action="store_true", help="Don't read or write the response cache")
+    ranking.add_argument("--no-compress", action="store_true", help="Send the full text, keeping repeated headers and footers")
+    ranking.add_argument("--refresh", action="store_true", help="Ignore cached responses but store fresh ones")
+
+    reports = subparsers.add_parser("report", help="Render reports from a batch results file")
+    reports.add_argument("results", help="JSONL file written by the batch command")
+    reports.add_argument("--reports-dir", required=True, help="Directory reports are written into")
+    reports.add_argument("--format", choices=list(REPORT_FORMATS), default="pdf", help="Report format")
+    reports.add_argument("--workers", type=int, default=default_worker_count(), help="Rendering worker processes")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "batch":
+        if requires_api_key(args.llm_backend) and not args.api_key:
+            print("❌ OpenAI API key not found. Pass --api-key or set OPENAI_API_KEY.")
+            return 2
+        return asyncio.run(run_batch(args))
+    if args.command == "shortlist":
+        if args.top_k > 0 and requires_api_key(args.llm_backend) and not args.api_key:
+            print("❌ OpenAI API key not found. Pass --api-key or set OPENAI_API_KEY.")
+            return 2
+        return asyncio.run(run_shortlist(args))
+    if args.command == "report":
+        return run_reports(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
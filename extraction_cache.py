@@ -0,0 +1,129 @@
+"""
+Extraction Cache for DocuSense AI
+Content-addressed cache for extracted PDF text, keyed by the hash of the PDF
+bytes, with an in-memory LRU tier and an optional on-disk tier
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def hash_bytes(data):
+    """Return the SHA-256 hex digest of a PDF's bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_pdf(pdf):
+    """Return the digest of a PDF given as bytes or a file path, reading files in chunks"""
+    if not isinstance(pdf, (str, os.PathLike)):
+        return hash_bytes(pdf)
+    digest = hashlib.sha256()
+    with open(pdf, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Two-tier cache of extracted text
+
+    Entries are keyed by the document digest and stamped with the extractor
+    version, so bumping the version makes every older entry unreachable.
+    """
+
+    def __init__(self, version, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES, disk_dir=None):
+        self.version = str(version)
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = None
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        if disk_dir:
+            self.disk_dir = os.path.join(disk_dir, f"v{self.version}")
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._prune_stale_versions(disk_dir)
+
+    def _prune_stale_versions(self, root):
+        """Remove on-disk entries written by other extractor versions"""
+        current = os.path.basename(self.disk_dir)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name != current and name.startswith("v") and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _disk_path(self, digest):
+        return os.path.join(self.disk_dir, digest[:2], f"{digest}.txt")
+
+    def get(self, digest):
+        """Return cached text for a digest, or None on a miss"""
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return self._memory[digest][0]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(digest), "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                return None
+            self._remember(digest, text)
+            return text
+
+        return None
+
+    def put(self, digest, text):
+        """Store extracted text in both tiers"""
+        self._remember(digest, text)
+        if self.disk_dir:
+            self._write_disk(digest, text)
+
+    def _remember(self, digest, text):
+        size = len(text.encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            if digest in self._memory:
+                self._memory_bytes -= self._memory.pop(digest)[1]
+            self._memory[digest] = (text, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _write_disk(self, digest, text):
+        path = self._disk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so concurrent readers never see partial text
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get_or_extract(self, data, extract, digest=None):
+        """Return cached text for a PDF (bytes or path), calling extract(data) on a miss
+
+        Pass digest when it is already known, e.g. hashed while the upload streamed in.
+        """
+        digest = digest or hash_pdf(data)
+        text = self.get(digest)
+        if text is None:
+            text = extract(data)
+            if text is not None:
+                self.put(digest, text)
+        return text
@@ -0,0 +1,266 @@
+"""
+Local LLM Stand-in for DocuSense AI
+Drop-in replacements for the OpenAI and AsyncOpenAI clients that answer
+chat completions locally with deterministic, schema-valid feedback, for tests
+and load testing without network access or API costs
+
+Latency, error rate and token rate are configurable, so load tests can
+exercise timeouts, retries and tail latency:
+    DOCUSENSE_FAKE_LATENCY=lognormal:0.8,0.5   # median seconds, sigma
+    DOCUSENSE_FAKE_ERROR_RATE=0.02
+    DOCUSENSE_FAKE_TOKENS_PER_SECOND=60
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from chunking import count_tokens
+
+# Field names in the prompt's JSON template, e.g. "overall_score": <score out of 100>
+TEMPLATE_FIELD_PATTERN = re.compile(r'"([a-z_]+)":\s*["<\[]')
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "exponential")
+
+# Simulated failures, split like the rate limits and outages seen in practice
+ERROR_STATUSES = ((429, "Rate limit reached (simulated)"), (500, "Internal server error (simulated)"),
+                  (503, "Service overloaded (simulated)"))
+
+
+class FakeLLMError(RuntimeError):
+    """A simulated API failure"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class FakeLLMTimeout(TimeoutError):
+    """A simulated request timeout, raised when a reply would take longer than the request's timeout"""
+
+
+def parse_latency(spec):
+    """Parse a latency spec into (distribution, parameters)
+
+    Accepts seconds ("0.2") or "fixed:0.2", "uniform:<low>,<high>",
+    "lognormal:<median>,<sigma>" and "exponential:<mean>".
+    """
+    spec = str(spec).strip()
+    kind, _, params = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    if kind not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution {kind!r}; expected one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+    values = tuple(float(value) for value in params.split(",") if value.strip())
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}[kind]
+    if len(values) != expected:
+        raise ValueError(f"{kind} latency takes {expected} parameter(s), got {spec!r}")
+    return kind, values
+
+
+class FakeBehavior:
+    """How a stand-in responds: latency before the first token, error rate and generation speed"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, tokens_per_second=0.0, seed=None):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        seed = os.getenv("DOCUSENSE_FAKE_SEED")
+        return cls(
+            latency=os.getenv("DOCUSENSE_FAKE_LATENCY", "0"),
+            error_rate=float(os.getenv("DOCUSENSE_FAKE_ERROR_RATE", "0")),
+            tokens_per_second=float(os.getenv("DOCUSENSE_FAKE_TOKENS_PER_SECOND", "0")),
+            seed=int(seed) if seed else None
+        )
+
+    def sample_latency(self):
+        """Seconds until the first token of a reply"""
+        kind, params = self.latency
+        with self._lock:
+            if kind == "uniform":
+                return self._rng.uniform(*params)
+            if kind == "lognormal":
+                return self._rng.lognormvariate(math.log(params[0]), params[1])
+            if kind == "exponential":
+                return self._rng.expovariate(1 / params[0]) if params[0] else 0.0
+            return params[0]
+
+    def sample_error(self):
+        """Return a FakeLLMError to raise for this request, or None"""
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return FakeLLMError(*self._rng.choice(ERROR_STATUSES))
+        return None
+
+    def generation_seconds(self, tokens):
+        """Seconds spent producing a reply of this many tokens"""
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+def _requested_fields(params):
+    """Return the field names a completion request asks for"""
+    response_format = params.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return list(response_format["json_schema"]["schema"]["properties"])
+
+    prompt = params["messages"][-1]["content"]
+    # Repair requests end with the JSON schema of the missing fields
+    schema_start = prompt.find('{"type": "object"')
+    if schema_start != -1:
+        return list(json.loads(prompt[schema_start:])["properties"])
+    return TEMPLATE_FIELD_PATTERN.findall(prompt)
+
+
+def fake_feedback(params):
+    """Build deterministic feedback for a request, seeded by its prompt"""
+    prompt = params["messages"][-1]["content"]
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    feedback = {}
+    for i, field in enumerate(_requested_fields(params)):
+        if field.endswith("_score"):
+            feedback[field] = 60 + (seed >> (i * 5)) % 36
+        elif field.endswith("_feedback"):
+            feedback[field] = f"Stand-in {field.replace('_', ' ')} for a {len(prompt)}-character prompt."
+        else:
+            feedback[field] = [f"Stand-in {field.replace('_', ' ')} {n}" for n in (1, 2)]
+    return feedback
+
+
+def fake_reply(params):
+    """Return (content, usage) for a completion request"""
+    content = json.dumps(fake_feedback(params))
+    prompt_tokens = sum(count_tokens(message["content"]) for message in params["messages"])
+    completion_tokens = count_tokens(content)
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+             "total_tokens": prompt_tokens + completion_tokens}
+    return content, usage
+
+
+def completion(content, model, usage=None):
+    """Build a chat completion object shaped like the OpenAI SDK's"""
+    usage = usage or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content),
+                                 finish_reason="stop")],
+        usage=SimpleNamespace(**usage)
+    )
+
+
+def split_chunks(content, size):
+    """Split a reply into the pieces a stream delivers"""
+    return [content[start:start + size] for start in range(0, len(content), size)]
+
+
+def stream_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=text))], usage=None)
+
+
+def usage_chunk(usage):
+    """The last chunk of a stream asked for with stream_options={"include_usage": True}"""
+    return SimpleNamespace(choices=[], usage=SimpleNamespace(**usage))
+
+
+def includes_usage(params):
+    return bool((params.get("stream_options") or {}).get("include_usage"))
+
+
+def _chunks(pieces, delay, usage=None):
+    for piece in pieces:
+        time.sleep(delay)
+        yield stream_chunk(piece)
+    if usage:
+        yield usage_chunk(usage)
+
+
+async def _async_chunks(pieces, delay, usage=None):
+    for piece in pieces:
+        await asyncio.sleep(delay)
+        yield stream_chunk(piece)
+    if usage:
+        yield usage_chunk(usage)
+
+
+def _times_out(latency, generation, stream, timeout):
+    # A stream only has to start within the timeout, like the SDK's read timeout
+    return timeout is not None and latency + (0 if stream else generation) > timeout
+
+
+class _Completions:
+    def __init__(self, behavior, chunk_chars):
+        self.behavior = behavior
+        self.chunk_chars = chunk_chars
+
+    def _respond(self, params):
+        """Return (delay before the reply, error or None, content, usage, pieces, per-chunk delay)"""
+        content, usage = fake_reply(params)
+        pieces = split_chunks(content, self.chunk_chars)
+        generation = self.behavior.generation_seconds(usage["completion_tokens"])
+        return self.behavior.sample_latency(), self.behavior.sample_error(), content, usage, pieces, generation
+
+    def create(self, stream=False, timeout=None, **params):
+        latency, error, content, usage, pieces, generation = self._respond(params)
+        if _times_out(latency, generation, stream, timeout):
+            time.sleep(timeout)
+            raise FakeLLMTimeout("Request timed out (simulated)")
+        time.sleep(latency)
+        if error:
+            raise error
+        if stream:
+            return _chunks(pieces, generation / max(len(pieces), 1), usage if includes_usage(params) else None)
+        time.sleep(generation)
+        return completion(content, params.get("model"), usage)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, stream=False, timeout=None, **params):
+        latency, error, content, usage, pieces, generation = self._respond(params)
+        if _times_out(latency, generation, stream, timeout):
+            await asyncio.sleep(timeout)
+            raise FakeLLMTimeout("Request timed out (simulated)")
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        if stream:
+            return _async_chunks(pieces, generation / max(len(pieces), 1), usage if includes_usage(params) else None)
+        await asyncio.sleep(generation)
+        return completion(content, params.get("model"), usage)
+
+
+def _behavior(latency, behavior):
+    return behavior or FakeBehavior(latency=latency)
+
+
+class FakeOpenAI:
+    """Synchronous stand-in for openai.OpenAI"""
+
+    backend = "fake"
+
+    def __init__(self, latency=0.0, chunk_chars=16, behavior=None):
+        self.chat = SimpleNamespace(completions=_Completions(_behavior(latency, behavior), chunk_chars))
+
+    def close(self):
+        pass
+
+
+class FakeAsyncOpenAI:
+    """Async stand-in for openai.AsyncOpenAI"""
+
+    backend = "fake"
+
+    def __init__(self, latency=0.0, chunk_chars=16, behavior=None):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(_behavior(latency, behavior), chunk_chars))
+
+    async def close(self):
+        pass
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+DocuSense AI Fake LLM Server
+An OpenAI-compatible chat completions server backed by fake_llm, with
+configurable latency, error rate and token rate, for load testing the app,
+the CLI and the API service offline through their real HTTP clients
+
+Usage:
+    python fake_server.py --port 8765 --latency lognormal:0.8,0.5 --error-rate 0.02 --tokens-per-second 60
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python docusense.py batch ...
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from fake_llm import FakeBehavior, fake_reply, includes_usage, split_chunks
+
+
+def create_app(behavior, chunk_chars=16):
+    """Build the server app; /stats reports request counts and peak concurrency"""
+    stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def _chunk(completion_id, model, delta, finish_reason=None):
+        chunk = {
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    def _usage_chunk(completion_id, model, usage):
+        chunk = {
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [], "usage": usage
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def _stream(completion_id, model, pieces, delay, usage=None):
+        try:
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for piece in pieces:
+                await asyncio.sleep(delay)
+                yield _chunk(completion_id, model, {"content": piece})
+            yield _chunk(completion_id, model, {}, "stop")
+            # Sent only when asked for with stream_options, like the real API
+            if usage:
+                yield _usage_chunk(completion_id, model, usage)
+            yield "data: [DONE]\n\n"
+        finally:
+            stats["in_flight"] -= 1
+
+    async def chat_completions(request):
+        params = await request.json()
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        streaming = False
+        try:
+            await asyncio.sleep(behavior.sample_latency())
+            error = behavior.sample_error()
+            if error:
+                stats["errors"] += 1
+                return JSONResponse(
+                    {"error": {"message": error.message, "type": "simulated_error", "code": error.status_code}},
+                    status_code=error.status_code
+                )
+
+            content, usage = fake_reply(params)
+            generation = behavior.generation_seconds(usage["completion_tokens"])
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            model = params.get("model", "fake")
+
+            if params.get("stream"):
+                pieces = split_chunks(content, chunk_chars)
+                streaming = True
+                return StreamingResponse(
+                    _stream(completion_id, model, pieces, generation / max(len(pieces), 1),
+                            usage if includes_usage(params) else None),
+                    media_type="text/event-stream"
+                )
+
+            await asyncio.sleep(generation)
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+        finally:
+            # Streams count as in flight until their last chunk is sent
+            if not streaming:
+                stats["in_flight"] -= 1
+
+    async def models(request):
+        return JSONResponse({"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "docusense"}]})
+
+    async def get_stats(request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/models", models, methods=["GET"]),
+        Route("/stats", get_stats, methods=["GET"])
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible fake LLM server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--latency", default="0", help='Time to first token, e.g. "0.5", "uniform:0.2,1.5", "lognormal:0.8,0.5"')
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500/503")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="Characters per streamed chunk")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latencies and errors")
+    args = parser.parse_args(argv)
+
+    behavior = FakeBehavior(args.latency, args.error_rate, args.tokens_per_second, args.seed)
+
+    import uvicorn
+    print(f"🧪 Fake LLM server on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency}, error rate {args.error_rate:.0%}, {args.tokens_per_second or '∞'} tokens/s)")
+    uvicorn.run(create_app(behavior, args.chunk_chars), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Local Invoice Checker for DocuSense AI
+Rule-based completeness checks for invoices using PyMuPDF layout blocks,
+regular expressions and spaCy entities, so the objective part of an invoice
+review needs no LLM round trip
+"""
+
+import re
+
+from invoice_tables import arithmetic_issues, check_tables, format_table_summary
+from pdf_engine import open_document
+
+# (element name, detected field, label pattern)
+REQUIRED_ELEMENTS = [
+    ("Invoice number", "invoice_number", r"\binvoice\s*(?:no\.?|number|num|#)|\binv\s*#|\binvoice\s+id\b"),
+    ("Invoice date", "invoice_date", r"\b(?:invoice|issue|issued|billing)\s+date\b|\bdate\s+(?:of\s+)?issue\b|^\s*date\b"),
+    ("Due date", "due_date", r"\bdue\s+date\b|\bpayment\s+due\b|\bdue\s+by\b"),
+    ("Seller details", "seller", r"\bfrom\b|\bseller\b|\bvendor\b|\bsupplier\b|\bremit\s+to\b"),
+    ("Customer details", "customer", r"\bbill(?:ed)?\s+to\b|\binvoice\s+to\b|\bcustomer\b|\bclient\b|\bsold\s+to\b"),
+    ("Line item descriptions", "line_items", r"\bdescription\b|\bitem\b|\bservices?\b|\bproducts?\b"),
+    ("Quantities and unit prices", "unit_prices", r"\bqty\b|\bquantity\b|\bunit\s+price\b|\brate\b|\bhours\b"),
+    ("Subtotal", "subtotal", r"\bsub\s*-?\s*total\b"),
+    ("Tax", "tax", r"\b(?:tax|vat|gst|hst|sales\s+tax)\b"),
+    ("Total amount", "total", r"\b(?:grand\s+total|total\s+(?:due|amount)|amount\s+due|balance\s+due|total)\b"),
+    ("Payment terms", "payment_terms", r"\bpayment\s+terms\b|\bterms\b|\bnet\s*\d+\b|\bdue\s+(?:on|upon)\s+receipt\b"),
+    ("Payment methods", "payment_methods", r"\bbank\b|\biban\b|\bswift\b|\baccount\s+(?:number|no)\b|\brouting\b|\bpaypal\b|\bcheck\b|\bcheque\b|\bwire\b")
+]
+
+MONEY_PATTERN = re.compile(r"(?:[$€£¥]\s?\d[\d,]*(?:\.\d{2})?|\d[\d,]*\.\d{2}\s?(?:USD|EUR|GBP)?)")
+DATE_PATTERN = re.compile(
+    r"\b(?:\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{4}-\d{2}-\d{2}|"
+    r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2},?\s+\d{4}|"
+    r"\d{1,2}\s+(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+\d{4})\b",
+    re.IGNORECASE
+)
+INVOICE_NUMBER_PATTERN = re.compile(r"(?:#|no\.?|number|num|id)\s*[:#]?\s*([A-Z0-9][A-Z0-9-/]{2,})", re.IGNORECASE)
+
+# Fields whose value is a date or an amount must have one next to their label
+DATE_FIELDS = {"invoice_date", "due_date"}
+MONEY_FIELDS = {"subtotal", "tax", "total"}
+
+# Letterheads usually open with the seller's legal name
+COMPANY_PATTERN = re.compile(r"\b(?:ltd|limited|inc|llc|llp|gmbh|corp|corporation|company|plc)\b\.?", re.IGNORECASE)
+LETTERHEAD_LINES = 5
+
+# spaCy labels that can stand in for missing regex matches
+ENTITY_FALLBACKS = {"seller": "ORG", "invoice_date": "DATE", "total": "MONEY"}
+
+
+def extract_lines(pdf):
+    """Rebuild visual lines from PyMuPDF layout, joining text that shares a baseline
+
+    Invoices often place a label and its value in separate blocks (for
+    example "Invoice Date" on the left and the date in a right-hand column),
+    which plain text extraction splits onto different lines.
+    """
+    lines = []
+    doc = open_document(pdf)
+    try:
+        for page in doc:
+            fragments = []
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if text:
+                        x0, y0, x1, y1 = line["bbox"]
+                        fragments.append(((y0 + y1) / 2, x0, y1 - y0, text))
+
+            rows = []
+            for y_center, x0, height, text in sorted(fragments):
+                if rows and abs(y_center - rows[-1][0]) <= max(height, rows[-1][2]) / 2:
+                    rows[-1][1].append((x0, text))
+                else:
+                    rows.append((y_center, [(x0, text)], height))
+            lines.extend("  ".join(text for _, text in sorted(parts)) for _, parts, _ in rows)
+    finally:
+        doc.close()
+    return lines
+
+
+def _find_value(field, line):
+    """Return the value found next to a label on the same line, if any"""
+    if field in DATE_FIELDS:
+        match = DATE_PATTERN.search(line)
+        return match.group(0) if match else None
+    if field in MONEY_FIELDS:
+        amounts = MONEY_PATTERN.findall(line)
+        return amounts[-1].strip() if amounts else None
+    if field == "invoice_number":
+        match = INVOICE_NUMBER_PATTERN.search(line)
+        return match.group(1) if match else None
+    if field == "payment_terms":
+        match = re.search(r"net\s*\d+|due\s+(?:on|upon)\s+receipt|\d+\s+days", line, re.IGNORECASE)
+        return match.group(0) if match else line.strip()
+    return line.strip()
+
+
+def check_invoice(text, pdf=None, nlp=None):
+    """Check an invoice for required elements and return the detected fields
+
+    pdf, a file path or the PDF bytes, lets labels and values laid out in
+    separate columns be joined back into lines, and lets the line-item
+    tables be rebuilt and their arithmetic verified (see invoice_tables).
+    """
+    lines = extract_lines(pdf) if pdf else text.splitlines()
+    table_check, prompt_text = check_tables(pdf) if pdf else (None, None)
+
+    detected = {}
+    for _, field, pattern in REQUIRED_ELEMENTS:
+        label = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+        for i, line in enumerate(lines):
+            if not label.search(line):
+                continue
+            # Values sometimes sit on the line below their label
+            value = _find_value(field, line)
+            if value is None and i + 1 < len(lines):
+                value = _find_value(field, lines[i + 1])
+            if value:
+                detected[field] = value
+                break
+
+    if "seller" not in detected:
+        for line in lines[:LETTERHEAD_LINES]:
+            if COMPANY_PATTERN.search(line) and not re.search(REQUIRED_ELEMENTS[4][2], line, re.IGNORECASE):
+                detected["seller"] = line.strip()
+                break
+
+    entities = {}
+    if nlp is not None:
+        doc = nlp(text[:100000])
+        for ent in doc.ents:
+            entities.setdefault(ent.label_, []).append(ent.text.strip())
+        for field, label in ENTITY_FALLBACKS.items():
+            if field not in detected and entities.get(label):
+                detected[field] = entities[label][0] if label != "MONEY" else entities[label][-1]
+
+    missing = [name for name, field, _ in REQUIRED_ELEMENTS if field not in detected]
+    present = [name for name, field, _ in REQUIRED_ELEMENTS if field in detected]
+    score = round(100 * len(present) / len(REQUIRED_ELEMENTS))
+
+    if missing:
+        completeness_feedback = (
+            f"{len(present)} of {len(REQUIRED_ELEMENTS)} standard invoice elements were found. "
+            f"Missing: {', '.join(missing)}."
+        )
+    else:
+        completeness_feedback = "All standard invoice elements are present."
+
+    return {
+        "completeness_score": score,
+        "completeness_feedback": completeness_feedback,
+        "missing_elements": missing,
+        "present_elements": present,
+        "detected_fields": detected,
+        "entities": {label: names[:10] for label, names in entities.items() if label in ("MONEY", "DATE", "ORG")},
+        "table_check": table_check,
+        # The invoice without its line-item rows, which the table summary replaces in the prompt
+        "prompt_text": prompt_text
+    }
+
+
+def format_check_summary(check):
+    """Summarize a check for the prompt so the model doesn't repeat the work"""
+    lines = [f"Completeness score (computed locally): {check['completeness_score']}/100"]
+    lines += [f"- Found {name}" for name in check["present_elements"]]
+    lines += [f"- Missing {name}" for name in check["missing_elements"]]
+    if check.get("table_check"):
+        lines.append(format_table_summary(check["table_check"]))
+    return "\n".join(lines)
+
+
+def _arithmetic_issues(check):
+    return arithmetic_issues(check["table_check"]) if check.get("table_check") else []
+
+
+def fast_feedback(check):
+    """Build complete Invoice-mode feedback from the local check alone"""
+    issues = _arithmetic_issues(check)
+    strengths = [f"Includes the {name.lower()}" for name in check["present_elements"]]
+    if check.get("table_check") and check["table_check"]["ok"]:
+        strengths.append(f"All {check['table_check']['line_items']} line items and the totals add up")
+    return {
+        "overall_score": check["completeness_score"],
+        "completeness_score": check["completeness_score"],
+        "completeness_feedback": check["completeness_feedback"],
+        "missing_elements": check["missing_elements"],
+        "suggestions": [f"Add the {name.lower()}" for name in check["missing_elements"]]
+                       + (["Correct the line items and totals flagged by the arithmetic check"] if issues else []),
+        "strengths": strengths,
+        "areas_for_improvement": [f"{name} is missing" for name in check["missing_elements"]] + issues,
+        "detected_fields": check["detected_fields"],
+        "table_check": check.get("table_check")
+    }
+
+
+def merge_invoice_feedback(check, feedback):
+    """Combine the local completeness check with the model's subjective review"""
+    merged = dict(feedback)
+    # Feedback reused from a similar invoice carries that invoice's arithmetic findings
+    stale = set(_arithmetic_issues(merged))
+    if stale:
+        merged["areas_for_improvement"] = [area for area in merged.get("areas_for_improvement") or [] if area not in stale]
+    merged["completeness_score"] = check["completeness_score"]
+    merged["completeness_feedback"] = check["completeness_feedback"]
+    merged["missing_elements"] = check["missing_elements"]
+    merged["detected_fields"] = check["detected_fields"]
+    merged["table_check"] = check.get("table_check")
+    # The model only sees a summary of the tables, so the exact findings come from the local check
+    issues = _arithmetic_issues(check)
+    if issues:
+        merged["areas_for_improvement"] = issues + list(merged.get("areas_for_improvement") or [])
+
+    scores = [merged.get(key) for key in ("completeness_score", "clarity_score", "professionalism_score")]
+    scores = [score for score in scores if isinstance(score, (int, float))]
+    merged["overall_score"] = round(sum(scores) / len(scores))
+    return merged
@@ -0,0 +1,367 @@
+"""
+Invoice Tables for DocuSense AI
+Rebuilds line-item tables from PyMuPDF word positions (or its table finder)
+into pandas DataFrames and verifies quantities, unit prices, subtotal, tax
+and total with vectorized arithmetic, so the model gets a short summary
+instead of hundreds of rows
+"""
+
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+from compression import compress_pages
+from pdf_engine import open_document
+
+# pandas and NumPy are imported on first use so app startup doesn't pay for them
+
+# Header labels that identify a line-item column, checked in this order
+COLUMN_PATTERNS = [
+    ("quantity", re.compile(r"^(?:qty|quantity|hours|hrs|units?)\b", re.IGNORECASE)),
+    ("unit_price", re.compile(r"\b(?:unit\s*(?:price|cost)|price|rate)\b", re.IGNORECASE)),
+    ("amount", re.compile(r"\b(?:amount|line\s*total|total|ext(?:ended)?\.?\s*price)\b", re.IGNORECASE)),
+    ("description", re.compile(r"\b(?:description|item|service|product|details|particulars)\b", re.IGNORECASE))
+]
+
+# Labels of the stated totals, checked in this order so "Subtotal" isn't read as "Total";
+# a label only counts at the start of a row or of a cell outside the description column
+TOTAL_PATTERNS = [
+    ("subtotal", re.compile(r"\bsub\s*-?\s*total\b", re.IGNORECASE)),
+    ("discount", re.compile(r"\bdiscount\b", re.IGNORECASE)),
+    ("shipping", re.compile(r"\b(?:shipping|freight|delivery)\b", re.IGNORECASE)),
+    ("tax", re.compile(r"\b(?:sales\s+)?(?:tax|vat|gst|hst)\b", re.IGNORECASE)),
+    ("total", re.compile(r"\b(?:grand\s+total|total\s+(?:due|amount)|amount\s+due|balance\s+due|total)\b", re.IGNORECASE))
+]
+
+QUANTITY_LABEL = re.compile(r"\b(?:qty|quantity|hours)\b", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"\(?-?[$€£¥]?\s?\d[\d,]*(?:\.\d+)?\)?")
+RATE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+
+# Words closer than this many points share a header label ("Unit Price")
+LABEL_GAP = 6.0
+
+# Amounts within a cent are treated as equal
+TOLERANCE = 0.01
+
+# Line-item mismatches listed individually; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+SAMPLE_ROWS = 5
+
+
+def _group_rows(words):
+    """Group PyMuPDF words into visual rows, each a left-to-right list of (x0, x1, text)"""
+    rows = []
+    for x0, y0, x1, y1, text, *_ in sorted(words, key=lambda word: ((word[1] + word[3]) / 2, word[0])):
+        middle = (y0 + y1) / 2
+        if rows and abs(middle - rows[-1]["middle"]) <= (y1 - y0) / 2:
+            rows[-1]["words"].append((x0, x1, text))
+        else:
+            rows.append({"middle": middle, "y0": y0, "y1": y1, "words": [(x0, x1, text)]})
+        rows[-1]["y1"] = max(rows[-1]["y1"], y1)
+    for row in rows:
+        row["words"].sort()
+        row["text"] = " ".join(text for _, _, text in row["words"])
+    return rows
+
+
+def _header_columns(row):
+    """Return [(role, x0, x1)] when a row looks like a line-item table header"""
+    labels = []
+    for x0, x1, text in row["words"]:
+        if labels and x0 - labels[-1][1] <= LABEL_GAP:
+            labels[-1] = (labels[-1][0], x1, labels[-1][2] + " " + text)
+        else:
+            labels.append((x0, x1, text))
+
+    columns, used = [], set()
+    for x0, x1, label in labels:
+        role = next((role for role, pattern in COLUMN_PATTERNS if role not in used and pattern.search(label)), None)
+        if role:
+            used.add(role)
+            columns.append((role, x0, x1))
+    if "amount" not in used or len(used & {"quantity", "unit_price"}) == 0:
+        return None
+    return columns
+
+
+def _assign(row, columns):
+    """Split a row's words into the header's columns, cutting halfway across each gap"""
+    cuts = [(left[2] + right[1]) / 2 for left, right in zip(columns, columns[1:])]
+    cells = {role: [] for role, _, _ in columns}
+    for x0, x1, text in row["words"]:
+        index = sum(1 for cut in cuts if (x0 + x1) / 2 > cut)
+        # A long description runs past the cut; its words still start left of the next header
+        if index and columns[index - 1][0] == "description" and x0 < columns[index][1] and parse_number(text) is None:
+            index -= 1
+        cells[columns[index][0]].append(text)
+    return {role: " ".join(words) for role, words in cells.items()}
+
+
+def _stated_total(text, cells=None):
+    """Return (name, value, rate) when a row states a subtotal, tax, total or adjustment
+
+    cells is the row split into line-item columns when it lies in a table. A
+    row with both a quantity and a unit price is a line item, however it is
+    labelled, so "Tax preparation services" or "Shipping boxes" stay items.
+    """
+    labels = [text]
+    if cells is not None:
+        quantity = parse_number(RATE_PATTERN.sub("", cells.get("quantity", "")))
+        if quantity is not None and parse_number(cells.get("unit_price", "")) is not None:
+            return None
+        labels += [value for role, value in cells.items() if role != "description"]
+    for name, pattern in TOTAL_PATTERNS:
+        if any(pattern.match(label.strip()) for label in labels):
+            # The amount is the last number once a rate such as "(10%)" is taken out
+            values = [parse_number(number) for number in NUMBER_PATTERN.findall(RATE_PATTERN.sub("", text))]
+            values = [value for value in values if value is not None]
+            if not values:
+                return None
+            rate = RATE_PATTERN.search(text)
+            return name, values[-1], float(rate.group(1)) if rate else None
+    return None
+
+
+def parse_number(text):
+    """Parse "$1,234.50" or "(12.00)" to a float, or None"""
+    cleaned = re.sub(r"[^\d.\-]", "", text or "")
+    if not re.search(r"\d", cleaned):
+        return None
+    try:
+        value = float(cleaned)
+    except ValueError:
+        return None
+    return -abs(value) if text.strip().startswith("(") else value
+
+
+def _page_items(rows):
+    """Find line-item rows below a header on one page; returns (items, indexes of table rows)"""
+    items, table_rows = [], set()
+    columns, last_y = None, None
+    for i, row in enumerate(rows):
+        if columns is None:
+            columns = _header_columns(row)
+            if columns:
+                table_rows.add(i)
+                last_y = row["y1"]
+            continue
+
+        height = row["y1"] - row["y0"]
+        cells = _assign(row, columns)
+        if _stated_total(row["text"], cells) or row["y0"] - last_y > 3 * height:
+            # The table ended; a later header may start another
+            columns = _header_columns(row)
+            if columns:
+                table_rows.add(i)
+                last_y = row["y1"]
+            continue
+
+        numeric = [cells.get(role) for role in ("quantity", "unit_price", "amount") if cells.get(role)]
+        if numeric:
+            items.append(cells)
+        elif items and cells.get("description"):
+            # A description wrapped onto a second line
+            items[-1]["description"] = (items[-1].get("description", "") + " " + cells["description"]).strip()
+        else:
+            continue
+        table_rows.add(i)
+        last_y = row["y1"]
+    return items, table_rows
+
+
+def _found_table_items(page):
+    """Fall back on PyMuPDF's table finder for layouts the word rows miss"""
+    items, boxes = [], []
+    for table in page.find_tables().tables:
+        names = [str(name or "") for name in table.header.names]
+        roles = {}
+        for index, name in enumerate(names):
+            role = next((role for role, pattern in COLUMN_PATTERNS if role not in roles.values() and pattern.search(name)), None)
+            if role:
+                roles[index] = role
+        if "amount" not in roles.values():
+            continue
+        boxes.append(table.bbox)
+        for cells in table.extract()[1:]:
+            item = {role: str(cells[index] or "") for index, role in roles.items()}
+            if not _stated_total(" ".join(str(cell or "") for cell in cells), item):
+                items.append(item)
+    return items, boxes
+
+
+def read_invoice_tables(pdf):
+    """Read line items, stated totals and the text outside the tables from an invoice PDF
+
+    Returns (items, stated, text): items is a DataFrame with description,
+    quantity, unit_price and amount columns as strings, stated maps
+    subtotal, tax, total, discount and shipping to the amounts printed on
+    the invoice (plus tax_rate), and text is the rest of the invoice with
+    repeated headers and footers stripped.
+    """
+    import pandas as pd
+
+    items, stated, pages = [], {}, []
+    doc = open_document(pdf)
+    try:
+        for page in doc:
+            rows = _group_rows(page.get_text("words"))
+            page_items, table_rows = _page_items(rows)
+            if not page_items and any(QUANTITY_LABEL.search(row["text"]) for row in rows):
+                # A quantity column without a readable header row; the table finder is slower but sees ruled cells
+                page_items, boxes = _found_table_items(page)
+                table_rows = {
+                    i for i, row in enumerate(rows)
+                    if any(y0 <= row["middle"] <= y1 for _, y0, _, y1 in boxes)
+                }
+            items.extend(page_items)
+
+            height = page.rect.height or 1
+            blocks = []
+            for i, row in enumerate(rows):
+                if i in table_rows:
+                    continue
+                total = _stated_total(row["text"])
+                if total:
+                    name, value, rate = total
+                    stated[name] = value
+                    if name == "tax" and rate is not None:
+                        stated["tax_rate"] = rate
+                blocks.append((row["y0"] / height, row["y1"] / height, row["text"]))
+            pages.append(blocks)
+    finally:
+        doc.close()
+
+    frame = pd.DataFrame(items, columns=["description", "quantity", "unit_price", "amount"]).fillna("")
+    return frame, stated, compress_pages(pages)["text"]
+
+
+def to_numbers(column):
+    """Vectorized parse of a column of money or quantity strings to floats (NaN when blank)"""
+    import pandas as pd
+
+    text = column.astype(str).str.strip()
+    negative = text.str.startswith("(")
+    values = pd.to_numeric(text.str.replace(r"[^\d.\-]", "", regex=True), errors="coerce")
+    return values.where(~negative, -values.abs())
+
+
+def verify_line_items(items, stated):
+    """Check every line item and the totals with vectorized arithmetic
+
+    quantity × unit price must equal each amount, the amounts must add up
+    to the stated subtotal, tax must match the stated rate, and subtotal
+    minus discount plus shipping and tax must equal the stated total.
+    Returns a JSON-friendly summary.
+    """
+    import numpy as np
+
+    quantity = to_numbers(items["quantity"])
+    unit_price = to_numbers(items["unit_price"])
+    amount = to_numbers(items["amount"])
+
+    expected = (quantity * unit_price).round(2)
+    checkable = expected.notna() & amount.notna()
+    wrong = checkable & ~np.isclose(expected.fillna(0), amount.fillna(0), atol=TOLERANCE)
+    line_errors = [
+        {
+            "row": int(row) + 1,
+            "description": items["description"].iat[row],
+            "quantity": float(quantity.iat[row]),
+            "unit_price": float(unit_price.iat[row]),
+            "amount": float(amount.iat[row]),
+            "expected": float(expected.iat[row])
+        }
+        for row in np.flatnonzero(wrong.to_numpy())[:MAX_REPORTED_ERRORS]
+    ]
+
+    computed_subtotal = _cents(float(amount.fillna(expected).sum()))
+    checks = []
+    subtotal = _decimal(stated.get("subtotal", computed_subtotal))
+    if "subtotal" in stated:
+        checks.append(_check("Subtotal", stated["subtotal"], computed_subtotal))
+    if "tax" in stated and "tax_rate" in stated:
+        computed_tax = _cents(subtotal * _decimal(stated["tax_rate"]) / 100)
+        checks.append(_check(f"Tax ({stated['tax_rate']:g}%)", stated["tax"], computed_tax))
+    if "total" in stated:
+        computed_total = (subtotal - abs(_decimal(stated.get("discount", 0))) + _decimal(stated.get("shipping", 0))
+                          + _decimal(stated.get("tax", 0)))
+        checks.append(_check("Total", stated["total"], _cents(computed_total)))
+
+    return {
+        "line_items": len(items),
+        "checked_line_items": int(checkable.sum()),
+        "line_error_count": int(wrong.sum()),
+        "line_errors": line_errors,
+        "computed_subtotal": computed_subtotal,
+        "stated": stated,
+        "totals": checks,
+        "ok": not wrong.any() and all(check["ok"] for check in checks),
+        "sample": items.head(SAMPLE_ROWS).to_dict("records")
+    }
+
+
+def _decimal(value):
+    # Through str, so 211481.25 stays exact instead of carrying float error into the rounding
+    return Decimal(str(value))
+
+
+def _cents(value):
+    """Round to whole cents half up, the way invoices round tax"""
+    return float(_decimal(value).quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def _check(name, stated, computed):
+    # Compared as exact decimals, so a difference of exactly one cent passes despite float error
+    difference = abs(_decimal(stated) - _decimal(computed))
+    return {"name": name, "stated": stated, "computed": computed, "ok": difference <= _decimal(TOLERANCE)}
+
+
+def check_tables(pdf):
+    """Read and verify an invoice's line items; returns (summary, text outside the tables)
+
+    The summary is None when no line-item table was found.
+    """
+    items, stated, text = read_invoice_tables(pdf)
+    if items.empty:
+        return None, None
+    return verify_line_items(items, stated), text
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def arithmetic_issues(summary):
+    """Describe each arithmetic problem a verification found, for feedback lists"""
+    issues = [
+        f"Line {error['row']} ({error['description'] or 'no description'}): {error['quantity']:g} × "
+        f"{_money(error['unit_price'])} = {_money(error['expected'])}, but the amount shows {_money(error['amount'])}"
+        for error in summary["line_errors"]
+    ]
+    hidden = summary["line_error_count"] - len(summary["line_errors"])
+    if hidden > 0:
+        issues.append(f"{hidden} more line items don't match quantity × unit price")
+    issues += [
+        f"{check['name']} shows {_money(check['stated'])}, but the line items give {_money(check['computed'])}"
+        for check in summary["totals"] if not check["ok"]
+    ]
+    return issues
+
+
+def format_table_summary(summary):
+    """Summarize a verification in a few lines for the prompt, in place of the table itself"""
+    lines = [
+        f"Line items (verified locally): {summary['line_items']} rows, "
+        f"{summary['checked_line_items']} with quantity × unit price checked, {summary['line_error_count']} wrong"
+    ]
+    lines += [
+        f"- {check['name']}: stated {_money(check['stated'])}, computed {_money(check['computed'])}, "
+        + ("correct" if check["ok"] else "WRONG")
+        for check in summary["totals"]
+    ]
+    lines += [f"- {issue}" for issue in arithmetic_issues(summary) if not issue.startswith(("Subtotal", "Tax", "Total"))]
+    lines.append("First rows:")
+    lines += [
+        "- " + " | ".join(str(row[column]) for column in ("description", "quantity", "unit_price", "amount"))
+        for row in summary["sample"]
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,145 @@
+"""
+Background Jobs for DocuSense AI
+A small in-process job queue so slow analyses run on worker threads instead of
+the Streamlit script thread, and survive reruns of the page
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Analyses mostly wait on the network, so threads scale well past the core count
+JOB_WORKERS = int(os.getenv("DOCUSENSE_JOB_WORKERS", "8"))
+
+# Finished jobs are kept for late polls, oldest dropped first
+MAX_FINISHED_JOBS = int(os.getenv("DOCUSENSE_MAX_FINISHED_JOBS", "256"))
+
+
+class Job:
+    """One background task and its progress, shared between a worker and the UI"""
+
+    def __init__(self, job_id, key=None, meta=None):
+        self.id = job_id
+        self.key = key
+        self.meta = meta or {}
+        self.state = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.partial = {}
+        self.notes = []
+
+    @property
+    def in_flight(self):
+        return self.state in (QUEUED, RUNNING)
+
+    @property
+    def elapsed(self):
+        """Seconds since the job was queued, up to when it finished"""
+        return (self.finished or time.time()) - self.created
+
+    def update(self, partial=None, note=None):
+        """Publish progress from the worker: partial results or a message for the user"""
+        if partial is not None:
+            self.partial = dict(partial)
+        if note is not None:
+            self.notes.append(note)
+
+    def take(self):
+        """Hand the result over to whoever collects it, so the finished job no longer holds it"""
+        result, self.result, self.partial = self.result, None, {}
+        return result
+
+
+class JobManager:
+    """Runs jobs on a thread pool and tracks them by ID
+
+    Jobs submitted with a key are deduplicated while in flight, so a rerun
+    that submits the same work again gets the existing job back.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="docusense-job")
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, key=None, meta=None, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return its job ID
+
+        meta is stored on the job for whoever polls it, e.g. to render the
+        result after the page that submitted it has been reloaded.
+        """
+        with self._lock:
+            if key is not None and key in self._in_flight:
+                return self._in_flight[key]
+
+            job = Job(uuid.uuid4().hex[:12], key, meta)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._in_flight[key] = job.id
+            self._prune()
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        job.state = RUNNING
+        job.started = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.state = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.state = FAILED
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if job.key is not None and self._in_flight.get(job.key) == job.id:
+                    del self._in_flight[job.key]
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.in_flight]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return a job by ID, or None if it is unknown or was pruned"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Return the number of tracked jobs in each state"""
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+# Process-wide manager, so jobs outlive the Streamlit script run that submitted them
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -0,0 +1,71 @@
+"""
+Incremental JSON Parsing for DocuSense AI
+Extracts top-level fields from a JSON object while it is still streaming in,
+so each field can be shown as soon as its value is complete
+"""
+
+import json
+
+
+class IncrementalJSONParser:
+    """Parse a streamed JSON object one completed top-level field at a time
+
+    Text before the opening brace (such as a Markdown code fence) is ignored,
+    and members that fail to parse are skipped rather than aborting the stream.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+
+    def feed(self, fragment):
+        """Consume more text and return the (key, value) pairs it completed"""
+        self.text += fragment
+        completed = []
+
+        while self._pos < len(self.text) and not self.complete:
+            char = self.text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = self._pos + 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._close_member(self._pos))
+                    self.complete = True
+            elif char == "," and self._depth == 1:
+                completed.extend(self._close_member(self._pos))
+                self._member_start = self._pos + 1
+
+            self._pos += 1
+
+        return completed
+
+    def _close_member(self, end):
+        member = self.text[self._member_start:end].strip()
+        if not member:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            return []
+        self.fields.update(parsed)
+        return list(parsed.items())
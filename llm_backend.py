@@ -0,0 +1,305 @@
+"""
+LLM Backends for DocuSense AI
+Chooses where completions come from: OpenAI, a record/replay store on disk,
+or the local stand-in. Every backend returns clients with the OpenAI SDK's
+chat.completions.create interface, so the analysis code doesn't change.
+
+    DOCUSENSE_LLM_BACKEND=openai   # default; honours OPENAI_BASE_URL, e.g. a fake_server.py
+    DOCUSENSE_LLM_BACKEND=record   # call OpenAI and save every request/response pair
+    DOCUSENSE_LLM_BACKEND=replay   # answer from the saved pairs with their recorded timing
+    DOCUSENSE_LLM_BACKEND=fake     # answer in-process with fake_llm
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from fake_llm import completion, includes_usage, split_chunks, stream_chunk, usage_chunk
+
+BACKENDS = ("openai", "record", "replay", "fake")
+
+# DOCUSENSE_FAKE_LLM=1 predates the backend setting and still selects the stand-in
+LLM_BACKEND = os.getenv("DOCUSENSE_LLM_BACKEND") or ("fake" if os.getenv("DOCUSENSE_FAKE_LLM") == "1" else "openai")
+
+RECORDINGS_DIR = os.getenv("DOCUSENSE_LLM_RECORDINGS", "llm_recordings")
+
+# Multiplies recorded latencies on replay: 1 replays in real time, 0 as fast as possible
+REPLAY_SPEED = float(os.getenv("DOCUSENSE_REPLAY_SPEED", "1"))
+
+REPLAY_CHUNK_CHARS = 16
+
+
+def set_backend(backend):
+    """Switch the process's backend, and that of any worker processes it starts"""
+    global LLM_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    LLM_BACKEND = backend
+    os.environ["DOCUSENSE_LLM_BACKEND"] = backend
+
+
+def current_backend():
+    return LLM_BACKEND
+
+
+def client_backend(client):
+    """Name the backend a client answers from; recording clients pass real OpenAI replies through"""
+    return getattr(client, "backend", "openai")
+
+
+def requires_api_key(backend=None):
+    """Whether a backend calls OpenAI and so needs an API key"""
+    return (backend or LLM_BACKEND) in ("openai", "record")
+
+
+def request_key(params):
+    """Hash a completion request, ignoring whether it was streamed and its timeout"""
+    params = {key: value for key, value in params.items() if key not in ("stream", "stream_options", "timeout")}
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordingStore:
+    """Request/response pairs saved as one JSON file per request"""
+
+    def __init__(self, directory=RECORDINGS_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, params, content, usage, first_token_s, total_s):
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            "request": params,
+            "content": content,
+            "usage": usage,
+            "first_token_s": round(first_token_s, 4),
+            "total_s": round(total_s, 4)
+        }
+        # Write then rename, so concurrent recorders never leave a torn file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, default=str)
+        os.replace(tmp_path, self._path(key))
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {name: getattr(usage, name, 0) for name in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+class _RecordingCompletions:
+    def __init__(self, completions, store):
+        self._completions = completions
+        self._store = store
+
+    def _save(self, params, content, usage, started, first_token):
+        finished = time.perf_counter()
+        self._store.save(request_key(params), params, content, usage,
+                         (first_token or finished) - started, finished - started)
+
+    def create(self, stream=False, **params):
+        started = time.perf_counter()
+        response = self._completions.create(stream=stream, **params)
+        if not stream:
+            self._save(params, response.choices[0].message.content, _usage_dict(response.usage), started, None)
+            return response
+        return self._record_stream(response, params, started)
+
+    def _record_stream(self, chunks, params, started):
+        pieces, first_token, usage = [], None, None
+        for chunk in chunks:
+            if first_token is None:
+                first_token = time.perf_counter()
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            # Only present on the last chunk, and only when the request set stream_options
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        self._save(params, "".join(pieces), _usage_dict(usage), started, first_token)
+
+
+class _AsyncRecordingCompletions(_RecordingCompletions):
+    async def create(self, stream=False, **params):
+        started = time.perf_counter()
+        response = await self._completions.create(stream=stream, **params)
+        if not stream:
+            self._save(params, response.choices[0].message.content, _usage_dict(response.usage), started, None)
+            return response
+        return self._record_stream(response, params, started)
+
+    async def _record_stream(self, chunks, params, started):
+        pieces, first_token, usage = [], None, None
+        async for chunk in chunks:
+            if first_token is None:
+                first_token = time.perf_counter()
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        self._save(params, "".join(pieces), _usage_dict(usage), started, first_token)
+
+
+class RecordingClient:
+    """Wraps an OpenAI client, saving every completion it returns"""
+
+    def __init__(self, client, store):
+        self.chat = _Chat(_RecordingCompletions(client.chat.completions, store))
+
+
+class AsyncRecordingClient:
+    """Wraps an AsyncOpenAI client, saving every completion it returns"""
+
+    def __init__(self, client, store):
+        self.chat = _Chat(_AsyncRecordingCompletions(client.chat.completions, store))
+
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class _ReplayCompletions:
+    def __init__(self, store, speed):
+        self._store = store
+        self.speed = speed
+
+    def _lookup(self, params):
+        record = self._store.load(request_key(params))
+        if record is None:
+            raise LookupError(
+                f"No recorded response for this request in {self._store.directory}; "
+                "record it first with DOCUSENSE_LLM_BACKEND=record"
+            )
+        pieces = split_chunks(record["content"], REPLAY_CHUNK_CHARS)
+        first_token = record["first_token_s"] * self.speed
+        chunk_delay = max(record["total_s"] - record["first_token_s"], 0) * self.speed / max(len(pieces), 1)
+        return record, pieces, first_token, chunk_delay
+
+    def create(self, stream=False, **params):
+        record, pieces, first_token, chunk_delay = self._lookup(params)
+        time.sleep(first_token)
+        if stream:
+            return self._replay_stream(pieces, chunk_delay, record.get("usage") if includes_usage(params) else None)
+        time.sleep(chunk_delay * len(pieces))
+        return completion(record["content"], params.get("model"), record.get("usage"))
+
+    def _replay_stream(self, pieces, delay, usage=None):
+        for piece in pieces:
+            time.sleep(delay)
+            yield stream_chunk(piece)
+        if usage:
+            yield usage_chunk(usage)
+
+
+class _AsyncReplayCompletions(_ReplayCompletions):
+    async def create(self, stream=False, **params):
+        record, pieces, first_token, chunk_delay = self._lookup(params)
+        await asyncio.sleep(first_token)
+        if stream:
+            return self._replay_stream(pieces, chunk_delay, record.get("usage") if includes_usage(params) else None)
+        await asyncio.sleep(chunk_delay * len(pieces))
+        return completion(record["content"], params.get("model"), record.get("usage"))
+
+    async def _replay_stream(self, pieces, delay, usage=None):
+        for piece in pieces:
+            await asyncio.sleep(delay)
+            yield stream_chunk(piece)
+        if usage:
+            yield usage_chunk(usage)
+
+
+class ReplayClient:
+    """Answers completions from a RecordingStore, reproducing the recorded timing"""
+
+    backend = "replay"
+
+    def __init__(self, store, speed=REPLAY_SPEED):
+        self.chat = _Chat(_ReplayCompletions(store, speed))
+
+    def close(self):
+        pass
+
+
+class AsyncReplayClient:
+    """Async version of ReplayClient"""
+
+    backend = "replay"
+
+    def __init__(self, store, speed=REPLAY_SPEED):
+        self.chat = _Chat(_AsyncReplayCompletions(store, speed))
+
+    async def close(self):
+        pass
+
+
+# Replay and fake clients hold no connections, so one of each serves the whole process;
+# the lock is reentrant because the replay client is built around the shared store
+_shared = {}
+_shared_lock = threading.RLock()
+
+
+def _shared_client(name, factory):
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if requires_api_key(backend):
+        from llm_client import get_client_manager
+        return get_client_manager()
+    return None
+
+
+def get_client(api_key=None, backend=None):
+    """Return a synchronous client for the configured backend"""
+    backend = backend or LLM_BACKEND
+    manager = _check_backend(backend)
+    if backend == "openai":
+        return manager.get_client(api_key)
+    if backend == "record":
+        return RecordingClient(manager.get_client(api_key), _shared_client("store", RecordingStore))
+    if backend == "replay":
+        return _shared_client("replay", lambda: ReplayClient(_shared_client("store", RecordingStore)))
+
+    from fake_llm import FakeBehavior, FakeOpenAI
+    return _shared_client("fake", lambda: FakeOpenAI(behavior=FakeBehavior.from_env()))
+
+
+def get_async_client(api_key=None, backend=None):
+    """Return an async client for the configured backend, for the running event loop"""
+    backend = backend or LLM_BACKEND
+    manager = _check_backend(backend)
+    if backend == "openai":
+        return manager.get_async_client(api_key)
+    if backend == "record":
+        return AsyncRecordingClient(manager.get_async_client(api_key), _shared_client("store", RecordingStore))
+    if backend == "replay":
+        return _shared_client("async_replay", lambda: AsyncReplayClient(_shared_client("store", RecordingStore)))
+
+    from fake_llm import FakeAsyncOpenAI, FakeBehavior
+    return _shared_client("async_fake", lambda: FakeAsyncOpenAI(behavior=FakeBehavior.from_env()))
+
+
+async def aclose(backend=None):
+    """Close the running loop's pooled OpenAI clients, if the backend uses any"""
+    if requires_api_key(backend or LLM_BACKEND):
+        from llm_client import get_client_manager
+        await get_client_manager().aclose()
@@ -0,0 +1,109 @@
+"""
+OpenAI Client Pool for DocuSense AI
+Keeps long-lived sync and async OpenAI clients per API key so analyses reuse
+warm keep-alive connections instead of paying a new TLS handshake each time
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import httpx
+import openai
+
+MAX_CONNECTIONS = int(os.getenv("DOCUSENSE_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("DOCUSENSE_HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY_SECONDS = 90.0
+REQUEST_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# Each distinct API key gets its own clients; the least recently used are dropped
+MAX_CLIENTS = int(os.getenv("DOCUSENSE_MAX_API_CLIENTS", "64"))
+
+
+class ClientManager:
+    """Pool of OpenAI clients keyed by API key
+
+    Async clients are also keyed by event loop, because an httpx connection
+    pool can't be shared between loops.
+    """
+
+    def __init__(self, max_clients=MAX_CLIENTS, max_connections=MAX_CONNECTIONS,
+                 max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS):
+        self.max_clients = max_clients
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+        )
+        self._clients = OrderedDict()
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get_client(self, api_key):
+        """Return the shared synchronous client for an API key"""
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = openai.OpenAI(
+                    api_key=api_key,
+                    http_client=httpx.Client(limits=self.limits, timeout=REQUEST_TIMEOUT)
+                )
+                self._clients[api_key] = client
+                if len(self._clients) > self.max_clients:
+                    # Other jobs may still be streaming through it; drop the reference and let the
+                    # pool be collected once they finish, rather than closing it under them
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(api_key)
+            return client
+
+    def get_async_client(self, api_key):
+        """Return the shared async client for an API key on the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, OrderedDict())
+            client = clients.get(api_key)
+            if client is None:
+                client = openai.AsyncOpenAI(
+                    api_key=api_key,
+                    http_client=httpx.AsyncClient(limits=self.limits, timeout=REQUEST_TIMEOUT)
+                )
+                clients[api_key] = client
+                if len(clients) > self.max_clients:
+                    # Closing is a coroutine; drop the reference and let the pool be collected
+                    clients.popitem(last=False)
+            else:
+                clients.move_to_end(api_key)
+            return client
+
+    async def aclose(self):
+        """Close the async clients that belong to the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.pop(loop, {})
+        for client in clients.values():
+            await client.close()
+
+    def close(self):
+        """Close all synchronous clients"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+# Process-wide manager shared by the app, the CLI and any other entry point
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager():
+    """Return the process-wide client manager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ClientManager()
+        return _manager
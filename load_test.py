@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+DocuSense AI Load Test
+Runs many concurrent analyses through the configured LLM backend and reports
+throughput, errors and tail latency. With the fake, replay or fake-server
+backends it runs entirely offline and costs nothing.
+
+Usage:
+    python load_test.py --backend fake --requests 500 --concurrency 50
+    DOCUSENSE_FAKE_LATENCY=lognormal:0.8,0.5 DOCUSENSE_FAKE_ERROR_RATE=0.02 python load_test.py --backend fake
+    python load_test.py --backend replay --requests 200 essays/*.pdf
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+
+from analysis import PROMPT_TEMPLATES, analyze_text_async
+from create_sample_pdfs import generate_corpus
+from llm_backend import BACKENDS, LLM_BACKEND, aclose, get_async_client, requires_api_key
+from pipeline import extract_document
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODE_KINDS = {"Student Essay": "essay", "Resume": "resume", "Invoice": "invoice"}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def load_documents(paths, mode, pages):
+    """Return the prompt texts to analyze, generating a synthetic corpus if no PDFs are given"""
+    if not paths:
+        corpus = generate_corpus(os.path.join(APP_DIR, "benchmark_corpus"), pages, [MODE_KINDS[mode]])
+        paths = list(corpus.values())
+    texts = []
+    for path in paths:
+        with open(path, "rb") as f:
+            _, prompt_text = extract_document(f.read())
+        if prompt_text:
+            texts.append(prompt_text)
+    return texts
+
+
+async def run_load(texts, mode, client, requests, concurrency):
+    """Analyze texts round-robin, at most concurrency at a time; returns (latencies, errors, wall time)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], Counter()
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await analyze_text_async(texts[i % len(texts)], mode, client)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors[type(e).__name__ + ": " + str(e)[:80]] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def main_async(args):
+    texts = load_documents(args.pdfs, args.mode, args.pages)
+    if not texts:
+        print("❌ No text could be extracted from the given PDFs")
+        return 2
+
+    client = get_async_client(args.api_key, args.backend)
+    try:
+        latencies, errors, wall = await run_load(texts, args.mode, client, args.requests, args.concurrency)
+    finally:
+        await aclose(args.backend)
+
+    results = {
+        "backend": args.backend,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "succeeded": len(latencies),
+        "failed": sum(errors.values()),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "latency_s": {
+            name: round(percentile(latencies, q), 3) if latencies else None
+            for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "errors": dict(errors.most_common())
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        latency = {name: "-" if s is None else f"{s}s" for name, s in results["latency_s"].items()}
+        print(f"🔥 {results['requests']} analyses on the {args.backend} backend, concurrency {args.concurrency}")
+        print(f"   Succeeded:  {results['succeeded']}  Failed: {results['failed']}")
+        print(f"   Throughput: {results['throughput_per_s']} analyses/s over {results['wall_s']}s")
+        print(f"   Latency:    p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+        for error, count in errors.most_common(5):
+            print(f"❌ {count} x {error}")
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test DocuSense AI analyses")
+    parser.add_argument("pdfs", nargs="*", help="PDFs to analyze (default: a synthetic corpus for the mode)")
+    parser.add_argument("--mode", choices=list(PROMPT_TEMPLATES), default="Student Essay", help="Document type")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10], help="Synthetic document sizes")
+    parser.add_argument("--requests", type=int, default=100, help="Analyses to run")
+    parser.add_argument("--concurrency", type=int, default=16, help="Analyses in flight at once")
+    parser.add_argument("--backend", choices=BACKENDS, default=LLM_BACKEND, help="LLM backend (default: $DOCUSENSE_LLM_BACKEND)")
+    parser.add_argument("--api-key", default=os.getenv("OPENAI_API_KEY"), help="OpenAI API key for the openai and record backends")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    if requires_api_key(args.backend) and not args.api_key:
+        print("❌ OpenAI API key not found. Pass --api-key or set OPENAI_API_KEY.")
+        return 2
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Metrics for DocuSense AI
+Timing spans around each pipeline stage, LLM token usage and estimated cost,
+rolling latency percentiles in Prometheus text format, and one structured
+JSON log line per analysis
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+# Latency percentiles are computed over this many recent observations per stage
+METRICS_WINDOW = int(os.getenv("DOCUSENSE_METRICS_WINDOW", "2048"))
+
+# Where the per-analysis JSON lines go: "stderr", a file path, or empty to disable
+ANALYSIS_LOG = os.getenv("DOCUSENSE_ANALYSIS_LOG", "stderr")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Estimated USD per million (input, output) tokens, matched by the longest model prefix
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40)
+}
+
+RECENT_TRACES = 50
+
+logger = logging.getLogger("docusense.analysis")
+logger.propagate = False
+
+_current_trace = contextvars.ContextVar("docusense_trace", default=None)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of a call, or None for a model without a known price"""
+    matches = [name for name in MODEL_PRICES if (model or "").startswith(name)]
+    if not matches:
+        return None
+    input_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class LatencyWindow:
+    """Count and sum of every observation, and percentiles over the most recent ones"""
+
+    def __init__(self, size=METRICS_WINDOW):
+        self.recent = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {q: None for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Registry:
+    """Process-wide stage latencies and counters"""
+
+    def __init__(self):
+        self._stages = {}
+        self._counters = {}
+        self._traces = deque(maxlen=RECENT_TRACES)
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._stages.setdefault(stage, LatencyWindow()).observe(seconds)
+
+    def inc(self, name, labels, value=1):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def add_trace(self, summary):
+        with self._lock:
+            self._traces.append(summary)
+
+    def recent_traces(self):
+        """Summaries of the latest analyses, newest last"""
+        with self._lock:
+            return list(self._traces)
+
+    def stage_summary(self):
+        """Return {stage: {"count", "p50", "p95", "p99"}} with latencies in milliseconds"""
+        with self._lock:
+            stages = {stage: (window.count, window.quantiles()) for stage, window in self._stages.items()}
+        return {
+            stage: {"count": count, **{f"p{int(q * 100)}": _ms(value) for q, value in quantiles.items()}}
+            for stage, (count, quantiles) in sorted(stages.items())
+        }
+
+    def counter_totals(self, name):
+        """Return a counter's values keyed by label tuples"""
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def prometheus_text(self):
+        """Render everything in the Prometheus text exposition format"""
+        lines = [
+            "# HELP docusense_stage_seconds Duration of each pipeline stage",
+            "# TYPE docusense_stage_seconds summary"
+        ]
+        with self._lock:
+            for stage, window in sorted(self._stages.items()):
+                for q, value in window.quantiles().items():
+                    if value is not None:
+                        lines.append(f'docusense_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'docusense_stage_seconds_sum{{stage="{stage}"}} {window.total:.6f}')
+                lines.append(f'docusense_stage_seconds_count{{stage="{stage}"}} {window.count}')
+
+            for name, help_text in COUNTERS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(self._counters.get(name, {}).items()):
+                    label_text = ",".join(f'{key}="{_escape_label(str(val))}"' for key, val in labels)
+                    lines.append(f"{name}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+COUNTERS = {
+    "docusense_llm_calls_total": "LLM calls by model and outcome",
+    "docusense_llm_tokens_total": "LLM tokens by model and type",
+    "docusense_llm_cost_usd_total": "Estimated LLM spend in USD by model",
+    "docusense_analyses_total": "Analyses by mode and outcome",
+    "docusense_route_decisions_total": "Model routing decisions by mode, model and reason",
+    "docusense_route_fallbacks_total": "Timed-out calls retried on a fallback model",
+    "docusense_session_store_events_total": "Session store hits, misses, rebuilds, evictions and idle expiries"
+}
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+REGISTRY = Registry()
+
+
+class Trace:
+    """The spans, token usage and cost of one analysis"""
+
+    def __init__(self, mode, attrs=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.attrs = dict(attrs or {})
+        self.started = time.perf_counter()
+        self.spans = []
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        self.failed = False
+        self._lock = threading.Lock()
+
+    def fail(self, error):
+        """Mark the analysis as failed when the error was handled rather than raised"""
+        self.failed = True
+        self.attrs["error"] = str(error)
+
+    def add_span(self, stage, seconds, attrs):
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "start_ms": _ms(time.perf_counter() - seconds - self.started),
+                "ms": _ms(seconds),
+                **attrs
+            })
+
+    def add_usage(self, prompt_tokens, completion_tokens, cost):
+        with self._lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+            self.usage["cost_usd"] += cost or 0.0
+
+    def summary(self, outcome):
+        with self._lock:
+            stage_ms = {}
+            for span in self.spans:
+                stage_ms[span["stage"]] = round(stage_ms.get(span["stage"], 0) + span["ms"], 1)
+            return {
+                "event": "analysis",
+                "trace_id": self.id,
+                "mode": self.mode,
+                "outcome": outcome,
+                "total_ms": _ms(time.perf_counter() - self.started),
+                "stage_ms": stage_ms,
+                **self.usage,
+                "cost_usd": round(self.usage["cost_usd"], 6),
+                **self.attrs,
+                "spans": list(self.spans)
+            }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def annotate(**attrs):
+    """Attach attributes, e.g. cache_hit=True, to the current analysis's log line"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def with_current_trace(fn):
+    """Wrap fn so a worker thread running it records into the caller's trace"""
+    trace = _current_trace.get()
+
+    def run(*args, **kwargs):
+        token = _current_trace.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+    return run
+
+
+@contextlib.contextmanager
+def span(stage, **attrs):
+    """Time a pipeline stage; yields a dict for attributes learned along the way"""
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException:
+        attrs["error"] = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        REGISTRY.observe(stage, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, seconds, attrs)
+
+
+def record_usage(model, prompt_tokens, completion_tokens, outcome="ok"):
+    """Count one LLM call's tokens and estimated cost"""
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    model = model or "unknown"
+    REGISTRY.inc("docusense_llm_calls_total", {"model": model, "outcome": outcome})
+    REGISTRY.inc("docusense_llm_tokens_total", {"model": model, "type": "prompt"}, prompt_tokens)
+    REGISTRY.inc("docusense_llm_tokens_total", {"model": model, "type": "completion"}, completion_tokens)
+    if cost is not None:
+        REGISTRY.inc("docusense_llm_cost_usd_total", {"model": model}, cost)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_usage(prompt_tokens, completion_tokens, cost)
+
+
+def record_failed_call(model):
+    REGISTRY.inc("docusense_llm_calls_total", {"model": model or "unknown", "outcome": "error"})
+
+
+_log_configured = False
+_log_lock = threading.Lock()
+
+
+def _log_analysis(summary):
+    global _log_configured
+    if not ANALYSIS_LOG:
+        return
+    with _log_lock:
+        if not _log_configured:
+            handler = logging.StreamHandler(sys.stderr) if ANALYSIS_LOG == "stderr" else logging.FileHandler(ANALYSIS_LOG)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            _log_configured = True
+    logger.info(json.dumps(summary, default=str))
+
+
+@contextlib.contextmanager
+def trace_analysis(mode, **attrs):
+    """Collect the spans of one analysis, then log it as a JSON line and count it"""
+    trace = Trace(mode, attrs)
+    token = _current_trace.set(trace)
+    outcome = "error"
+    try:
+        yield trace
+        outcome = "error" if trace.failed else "ok"
+    finally:
+        _current_trace.reset(token)
+        summary = trace.summary(outcome)
+        REGISTRY.observe("analysis", summary["total_ms"] / 1000)
+        REGISTRY.inc("docusense_analyses_total", {"mode": mode, "outcome": outcome})
+        REGISTRY.add_trace(summary)
+        _log_analysis(summary)
+
+
+def prometheus_text():
+    return REGISTRY.prometheus_text()
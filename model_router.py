@@ -0,0 +1,214 @@
+"""
+Model Routing for DocuSense AI
+Picks the model and output budget of each request from its mode, prompt size
+and the mode's latency or cost target, falls back to another model when a
+call times out, and records every decision
+"""
+
+import json
+import os
+import threading
+
+from metrics import REGISTRY, annotate, estimate_cost
+
+# Set OPENAI_MODEL to send every request to one model; routing then only picks its fallback
+PINNED_MODEL = os.getenv("OPENAI_MODEL") or None
+TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.3"))
+
+# Upper bound on any route's output budget
+MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "2000"))
+
+# Models routes choose from, most capable first
+ROUTER_MODELS = [
+    model.strip() for model in os.getenv("DOCUSENSE_ROUTER_MODELS", "gpt-4.1-mini,gpt-4o-mini,gpt-4.1-nano").split(",")
+    if model.strip()
+]
+
+# A call is abandoned for the fallback model after this multiple of its latency target
+TIMEOUT_MULTIPLE = float(os.getenv("DOCUSENSE_ROUTER_TIMEOUT_MULTIPLE", "2"))
+
+# System prompt and message framing around the document
+PROMPT_OVERHEAD_TOKENS = 500
+
+# Prompt tokens processed per second before the first output token
+PREFILL_TOKENS_PER_SECOND = 5000
+
+# Context window, longest reply, seconds to first token and output tokens per second;
+# latency figures are starting points that observed calls correct
+MODEL_PROFILES = {
+    "gpt-3.5-turbo": {"context": 16385, "max_output": 4096, "first_token_s": 0.5, "tokens_per_second": 80},
+    "gpt-4": {"context": 8192, "max_output": 8192, "first_token_s": 0.8, "tokens_per_second": 25},
+    "gpt-4-turbo": {"context": 128000, "max_output": 4096, "first_token_s": 0.8, "tokens_per_second": 35},
+    "gpt-4o": {"context": 128000, "max_output": 16384, "first_token_s": 0.6, "tokens_per_second": 60},
+    "gpt-4o-mini": {"context": 128000, "max_output": 16384, "first_token_s": 0.5, "tokens_per_second": 85},
+    "gpt-4.1": {"context": 1047576, "max_output": 32768, "first_token_s": 0.7, "tokens_per_second": 55},
+    "gpt-4.1-mini": {"context": 1047576, "max_output": 32768, "first_token_s": 0.5, "tokens_per_second": 75},
+    "gpt-4.1-nano": {"context": 1047576, "max_output": 32768, "first_token_s": 0.3, "tokens_per_second": 120}
+}
+DEFAULT_PROFILE = MODEL_PROFILES["gpt-3.5-turbo"]
+
+# Per mode: what to optimize ("latency", "cost" or "quality", the order of
+# ROUTER_MODELS) among the models meeting latency_slo_s and max_cost_usd,
+# and the output budget. DOCUSENSE_MODEL_ROUTES overrides any of these as
+# JSON, e.g. {"Invoice": {"latency_slo_s": 5}, "Resume": {"max_cost_usd": 0.002}}
+ROUTES = {
+    "Student Essay": {"objective": "quality", "latency_slo_s": 60, "max_cost_usd": None, "max_tokens": 2000},
+    "Resume": {"objective": "quality", "latency_slo_s": 30, "max_cost_usd": None, "max_tokens": 1500},
+    "Invoice": {"objective": "latency", "latency_slo_s": 10, "max_cost_usd": None, "max_tokens": 800}
+}
+DEFAULT_ROUTE = {"objective": "cost", "latency_slo_s": 30, "max_cost_usd": None, "max_tokens": MAX_TOKENS}
+
+for _mode, _overrides in json.loads(os.getenv("DOCUSENSE_MODEL_ROUTES") or "{}").items():
+    ROUTES[_mode] = {**ROUTES.get(_mode, DEFAULT_ROUTE), **_overrides}
+
+# Weight of the newest call in each model's observed-to-estimated latency ratio
+LATENCY_SMOOTHING = 0.2
+
+
+def profile(model):
+    return MODEL_PROFILES.get(model, DEFAULT_PROFILE)
+
+
+def is_timeout(error):
+    """Whether a failed call timed out, as opposed to being rejected"""
+    if isinstance(error, TimeoutError):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, openai.APITimeoutError)
+
+
+class ModelRouter:
+    """Routes requests to models and learns how much slower or faster each runs than estimated"""
+
+    def __init__(self, models=ROUTER_MODELS, pinned=PINNED_MODEL, routes=ROUTES):
+        self.models = list(models)
+        self.pinned = pinned
+        self.routes = routes
+        self._slowdown = {}
+        self._lock = threading.Lock()
+
+    def cache_tag(self):
+        """Identify the model choice in cache keys; routed requests share one tag so routing can adapt freely"""
+        return self.pinned or "routed:" + ",".join(self.models)
+
+    def _route_settings(self, mode):
+        return self.routes.get(mode, DEFAULT_ROUTE)
+
+    def _max_tokens(self, model, settings):
+        return min(settings["max_tokens"], MAX_TOKENS, profile(model)["max_output"])
+
+    def estimate_seconds(self, model, prompt_tokens, output_tokens):
+        """Worst-case seconds for a call that writes its whole output budget"""
+        settings = profile(model)
+        seconds = (settings["first_token_s"] + prompt_tokens / PREFILL_TOKENS_PER_SECOND
+                   + output_tokens / settings["tokens_per_second"])
+        with self._lock:
+            return seconds * self._slowdown.get(model, 1.0)
+
+    def _fits(self, model, prompt_tokens, output_tokens):
+        return prompt_tokens + output_tokens + PROMPT_OVERHEAD_TOKENS <= profile(model)["context"]
+
+    def route(self, mode, prompt_tokens):
+        """Choose the model, output budget and timeout for one request
+
+        Among the candidates whose context fits the prompt, those meeting the
+        mode's latency and cost targets are ranked by its objective. When none
+        meets them, the fastest is used. The fastest other model that fits is
+        kept as the fallback for a timeout. Returns a dict that is also counted
+        and attached to the current trace.
+        """
+        settings = self._route_settings(mode)
+        candidates = [self.pinned] if self.pinned else self.models
+        estimates = {}
+        for model in dict.fromkeys(candidates + self.models):
+            output_tokens = self._max_tokens(model, settings)
+            if self._fits(model, prompt_tokens, output_tokens):
+                seconds = self.estimate_seconds(model, prompt_tokens, output_tokens)
+                estimates[model] = (seconds, estimate_cost(model, prompt_tokens, output_tokens))
+
+        fitting = [model for model in candidates if model in estimates]
+        within = [
+            model for model in fitting
+            if estimates[model][0] <= settings["latency_slo_s"]
+            and (settings["max_cost_usd"] is None or (estimates[model][1] or 0) <= settings["max_cost_usd"])
+        ]
+        if within:
+            reason = settings["objective"]
+            if reason == "latency":
+                within.sort(key=lambda model: estimates[model][0])
+            elif reason == "cost":
+                within.sort(key=lambda model: (estimates[model][1] or 0, estimates[model][0]))
+            model = within[0]
+        elif fitting:
+            reason = "slo_unmet"
+            model = min(fitting, key=lambda model: estimates[model][0])
+        else:
+            # Nothing fits; the largest context gives the request its best chance
+            reason = "over_context"
+            model = max(candidates, key=lambda model: profile(model)["context"])
+
+        fallbacks = sorted((other for other in estimates if other != model), key=lambda other: estimates[other][0])
+        seconds, cost = estimates.get(model, (self.estimate_seconds(model, prompt_tokens, 0), None))
+        decision = {
+            "mode": mode,
+            "model": model,
+            "fallbacks": fallbacks[:1],
+            "reason": reason,
+            "max_tokens": self._max_tokens(model, settings),
+            "temperature": TEMPERATURE,
+            "timeout_s": round(max(settings["latency_slo_s"], seconds) * TIMEOUT_MULTIPLE, 1),
+            "prompt_tokens": prompt_tokens,
+            "estimated_s": round(seconds, 2),
+            "estimated_cost_usd": None if cost is None else round(cost, 6)
+        }
+        REGISTRY.inc("docusense_route_decisions_total", {"mode": mode, "model": model, "reason": reason})
+        annotate(routed_model=model, route_reason=reason, route_estimated_s=decision["estimated_s"])
+        return decision
+
+    def input_budget(self, mode):
+        """Most prompt tokens one request of this mode can carry within a model's context and the latency target"""
+        settings = self._route_settings(mode)
+        budgets = []
+        for model in [self.pinned] if self.pinned else self.models:
+            output_tokens = self._max_tokens(model, settings)
+            context_budget = profile(model)["context"] - output_tokens - PROMPT_OVERHEAD_TOKENS
+            spare_seconds = settings["latency_slo_s"] - self.estimate_seconds(model, 0, output_tokens)
+            budgets.append(min(context_budget, int(spare_seconds * PREFILL_TOKENS_PER_SECOND)))
+        return max(budgets)
+
+    def smallest_context_budget(self):
+        """Prompt tokens every candidate can take, whatever the mode"""
+        return min(
+            profile(model)["context"] - min(MAX_TOKENS, profile(model)["max_output"]) - PROMPT_OVERHEAD_TOKENS
+            for model in ([self.pinned] if self.pinned else []) + self.models
+        )
+
+    def fallback(self, decision, model, error):
+        """Record that a call to model timed out and return the model to retry on, or None"""
+        remaining = [other for other in decision["fallbacks"] if other != model]
+        if not remaining or not is_timeout(error):
+            return None
+        REGISTRY.inc("docusense_route_fallbacks_total", {"mode": decision["mode"], "from": model, "to": remaining[0]})
+        annotate(fallback_from=model, fallback_to=remaining[0])
+        return remaining[0]
+
+    def observe(self, model, prompt_tokens, completion_tokens, seconds):
+        """Fold a finished call's duration into the model's latency estimates"""
+        estimated = self.estimate_seconds(model, prompt_tokens, completion_tokens)
+        if not estimated or seconds <= 0:
+            return
+        with self._lock:
+            ratio = seconds * self._slowdown.get(model, 1.0) / estimated
+            previous = self._slowdown.get(model, 1.0)
+            self._slowdown[model] = previous + LATENCY_SMOOTHING * (ratio - previous)
+
+    def stats(self):
+        """Observed-to-estimated latency ratio per model"""
+        with self._lock:
+            return {model: round(ratio, 3) for model, ratio in self._slowdown.items()}
+
+
+ROUTER = ModelRouter()
@@ -0,0 +1,208 @@
+"""
+Near-Duplicate Detection for DocuSense AI
+MinHash signatures over word shingles and a SQLite-backed LSH index, so a
+resubmitted essay, template resume or recurring invoice can reuse the
+feedback of an earlier, nearly identical document
+"""
+
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+# NumPy is imported on first use so app startup doesn't pay for it
+
+# Bump whenever shingling or hashing changes so stored signatures are ignored
+INDEX_VERSION = "1"
+
+# Estimated Jaccard similarity of word shingles above which feedback is reused;
+# changing about 1% of an essay's words brings it to 0.92, and 5% to 0.75
+SIMILARITY_THRESHOLD = 0.9
+
+# Documents kept in the index; the oldest are dropped beyond this
+MAX_DOCUMENTS = int(os.getenv("DOCUSENSE_NEAR_DUPLICATE_MAX_DOCS", "500000"))
+
+SHINGLE_WORDS = 5
+
+# Shorter documents share too few shingles for a meaningful similarity
+MIN_SHINGLES = 20
+
+# 16 bands of 8 rows make documents above about 0.7 similarity likely candidates
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Shingles hashed per block, bounding the permutation matrix's memory
+HASH_BLOCK = 8192
+
+WORD_PATTERN = re.compile(r"\w+")
+
+PERMUTATION_SEED = 20240601
+
+
+@functools.lru_cache(maxsize=1)
+def _permutations():
+    import numpy as np
+
+    # Fixed seed, so signatures stay comparable across processes and restarts
+    rng = np.random.default_rng(PERMUTATION_SEED)
+    multipliers = rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    return multipliers, rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text):
+    """Hash each run of SHINGLE_WORDS lowercased words to a 32-bit value"""
+    import numpy as np
+
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return np.zeros(0, dtype=np.uint64)
+    ids = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    # Polynomial rolling combination of the word hashes, wrapping at 64 bits
+    combined = np.zeros(len(words) - SHINGLE_WORDS + 1, dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        combined = combined * np.uint64(1_000_003) + ids[offset:len(ids) - SHINGLE_WORDS + 1 + offset]
+    return np.unique(combined >> np.uint64(32))
+
+
+def signature(text):
+    """Return the MinHash signature of a text, or None when it is too short to compare"""
+    import numpy as np
+
+    values = shingles(text)
+    if len(values) < MIN_SHINGLES:
+        return None
+    multipliers, offsets = _permutations()
+    minimum = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(values), HASH_BLOCK):
+        block = values[start:start + HASH_BLOCK]
+        # Multiply-shift hashing, one row per permutation; overflow wraps by design
+        hashed = (np.outer(multipliers, block) + offsets[:, None]) >> np.uint64(32)
+        np.minimum(minimum, hashed.min(axis=1), out=minimum)
+    return minimum.astype(np.uint32)
+
+
+def similarity(first, second):
+    """Estimate the Jaccard similarity of two documents from their signatures"""
+    return float((first == second).mean())
+
+
+def _unpack(stored):
+    import numpy as np
+
+    return np.frombuffer(stored, dtype=np.uint32)
+
+
+def _band_keys(namespace, sig):
+    """Hash each band of a signature, together with the namespace, to a signed 64-bit key"""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8,
+                                 person=f"{INDEX_VERSION}:{band}".encode())
+        digest.update(namespace.encode("utf-8"))
+        keys.append(int.from_bytes(digest.digest(), "big", signed=True))
+    return keys
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash LSH index mapping documents to the cache keys of their feedback
+
+    Each document's signature is split into bands stored under hashed keys, so
+    a lookup reads only the documents sharing at least one band, however large
+    the index grows. Namespaces keep modes and prompt variants apart.
+    """
+
+    def __init__(self, path=":memory:", threshold=SIMILARITY_THRESHOLD, max_documents=MAX_DOCUMENTS):
+        self.threshold = threshold
+        self.max_documents = max_documents
+        self.matches = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    feedback_key TEXT NOT NULL UNIQUE,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS bands (
+                    band_key INTEGER NOT NULL,
+                    document_id INTEGER NOT NULL,
+                    PRIMARY KEY (band_key, document_id)
+                ) WITHOUT ROWID
+            """)
+
+    def find(self, namespace, text=None, sig=None):
+        """Return near-duplicates of a document, most similar first
+
+        Each match is a dict with the similarity, the feedback_key of the
+        matched document and when it was analyzed. Pass a precomputed sig to
+        avoid hashing the text again.
+        """
+        sig = signature(text) if sig is None else sig
+        if sig is None:
+            return []
+        keys = _band_keys(namespace, sig)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, signature, feedback_key, created_at FROM documents WHERE id IN ("
+                f"SELECT DISTINCT document_id FROM bands WHERE band_key IN ({','.join('?' * len(keys))})"
+                ") AND namespace = ?",
+                (*keys, namespace)
+            ).fetchall()
+
+        matches = []
+        for _, stored, feedback_key, created_at in rows:
+            score = similarity(sig, _unpack(stored))
+            if score >= self.threshold:
+                matches.append({"similarity": round(score, 3), "feedback_key": feedback_key, "analyzed_at": created_at})
+        if matches:
+            with self._lock:
+                self.matches += 1
+        return sorted(matches, key=lambda match: -match["similarity"])
+
+    def add(self, namespace, feedback_key, text=None, sig=None):
+        """Index a document whose feedback is cached under feedback_key, unless it already is"""
+        sig = signature(text) if sig is None else sig
+        if sig is None:
+            return
+        keys = _band_keys(namespace, sig)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO documents (namespace, signature, feedback_key, created_at) VALUES (?, ?, ?, ?)",
+                (namespace, sig.tobytes(), feedback_key, time.time())
+            )
+            if not cursor.rowcount:
+                return
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO bands (band_key, document_id) VALUES (?, ?)",
+                [(key, cursor.lastrowid) for key in keys]
+            )
+            self._evict(cursor.lastrowid)
+
+    def _evict(self, newest_id):
+        oldest_kept = newest_id - self.max_documents
+        if oldest_kept <= 0:
+            return
+        stale = self._conn.execute("SELECT id, signature, namespace FROM documents WHERE id <= ?", (oldest_kept,)).fetchall()
+        for document_id, stored, namespace in stale:
+            keys = _band_keys(namespace, _unpack(stored))
+            self._conn.executemany(
+                "DELETE FROM bands WHERE band_key = ? AND document_id = ?", [(key, document_id) for key in keys]
+            )
+        self._conn.execute("DELETE FROM documents WHERE id <= ?", (oldest_kept,))
+
+    def stats(self):
+        """Return the number of indexed documents and of lookups that found a near-duplicate"""
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {"documents": documents, "matches": self.matches}
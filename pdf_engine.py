@@ -0,0 +1,175 @@
+"""
+PDF Extraction Engine for DocuSense AI
+Page-level text extraction that streams pages in order and spreads large
+documents across a process pool
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import span
+from uploads import UploadRejected, check_page_count
+
+# PyMuPDF is imported inside the functions that use it, keeping this module cheap to import
+
+# Bump whenever extraction output changes so cached text is invalidated
+EXTRACTOR_VERSION = "2"
+
+# Documents with at least this many pages are split across worker processes
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("DOCUSENSE_PARALLEL_PAGE_THRESHOLD", "64"))
+MIN_PAGES_PER_TASK = 16
+
+# Pages end with a newline, so this leaves a blank line between pages
+PAGE_SEPARATOR = "\n"
+
+# Worker processes are started once and reused for every large document
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(pdf, start, stop):
+    """Worker task: return (start, page texts) for pages in [start, stop)"""
+    return start, list(iter_page_texts(pdf, start, stop))
+
+
+def _get_pool(workers):
+    """Return the shared extraction pool, creating it on first use"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn avoids forking the multi-threaded Streamlit server process
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def open_document(pdf):
+    """Open a PDF given as a file path or an in-memory buffer
+
+    Paths are read by MuPDF directly; a buffer is copied into MuPDF, so large
+    documents are best spooled to disk first (see uploads.spool).
+    """
+    import fitz  # PyMuPDF
+    try:
+        if isinstance(pdf, (str, os.PathLike)):
+            return fitz.open(pdf, filetype="pdf")
+        return fitz.open(stream=pdf, filetype="pdf")
+    except fitz.FileDataError as e:
+        raise UploadRejected(f"The PDF could not be read: {e}", 422) from e
+
+
+def pdf_size(pdf):
+    """Size in bytes of a PDF given as a path or a buffer"""
+    return os.path.getsize(pdf) if isinstance(pdf, (str, os.PathLike)) else len(pdf)
+
+
+def iter_page_texts(pdf, start=0, stop=None):
+    """Yield the text of each page in [start, stop) from a single document handle"""
+    doc = open_document(pdf)
+    try:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for number in range(start, stop):
+            yield doc.load_page(number).get_text()
+    finally:
+        doc.close()
+
+
+def get_page_count(pdf):
+    """Return the number of pages in a PDF"""
+    doc = open_document(pdf)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def default_worker_count():
+    """Return the configured number of extraction processes"""
+    configured = os.getenv("DOCUSENSE_EXTRACTION_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def _split_ranges(page_count, workers):
+    """Split pages into contiguous ranges, two per worker for load balancing"""
+    size = max(MIN_PAGES_PER_TASK, -(-page_count // (workers * 2)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def _iter_parallel(pdf, page_count, workers, progress):
+    """Yield page texts in document order while ranges finish in any order"""
+    ranges = _split_ranges(page_count, workers)
+    finished = {}
+    next_start = 0
+    done = 0
+
+    pool = _get_pool(workers)
+    # A spooled document reaches the workers as its path rather than pickled bytes
+    futures = [pool.submit(_extract_page_range, pdf, start, stop) for start, stop in ranges]
+    try:
+        for future in as_completed(futures):
+            start, texts = future.result()
+            finished[start] = texts
+            done += len(texts)
+            if progress:
+                progress(done, page_count)
+
+            while next_start in finished:
+                texts = finished.pop(next_start)
+                yield from texts
+                next_start += len(texts)
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_pages(pdf, max_workers=None, progress=None):
+    """Yield page texts in order, using a process pool for large documents
+
+    pdf is a file path or an in-memory buffer. Documents over
+    DOCUSENSE_MAX_PAGES are rejected before any page is read. progress, if
+    given, is called as progress(pages_done, page_count).
+    """
+    page_count = get_page_count(pdf)
+    check_page_count(page_count)
+    workers = max_workers or default_worker_count()
+    yielded = 0
+
+    if workers > 1 and page_count >= PARALLEL_PAGE_THRESHOLD:
+        try:
+            for text in _iter_parallel(pdf, page_count, workers, progress):
+                yielded += 1
+                yield text
+            return
+        except (BrokenProcessPool, OSError):
+            # Pools can be unavailable in restricted sandboxes; finish inline instead
+            _reset_pool()
+
+    for number, text in enumerate(iter_page_texts(pdf, start=yielded), yielded + 1):
+        if progress:
+            progress(number, page_count)
+        yield text
+
+
+def extract_text(pdf, max_workers=None, progress=None):
+    """Extract the full text of a PDF path or buffer, assembled with a single join"""
+    with span("extract", mb=round(pdf_size(pdf) / (1024 * 1024), 2)):
+        return PAGE_SEPARATOR.join(iter_pages(pdf, max_workers, progress)).strip()
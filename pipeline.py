@@ -0,0 +1,34 @@
+"""
+Document Pipeline for DocuSense AI
+Extraction steps shared by the batch command line and the API service,
+written to run inside worker processes
+"""
+
+from compression import compress_pdf
+from config import create_compression_cache, create_extraction_cache
+from extraction_cache import hash_pdf
+from pdf_engine import extract_text
+
+# One extraction and compression cache per worker process, created on first use
+_extraction_cache = None
+_compression_cache = None
+
+
+def extract_document(pdf, compress=True, digest=None):
+    """Extract text from a PDF path or bytes, using the shared on-disk caches
+
+    Pass a path for large documents so workers read the file rather than
+    receiving pickled bytes, and digest if it is already known. Returns the
+    full text and the boilerplate-stripped text sent to the model.
+    """
+    global _extraction_cache, _compression_cache
+    if _extraction_cache is None:
+        _extraction_cache = create_extraction_cache(max_memory_mb=8)
+        _compression_cache = create_compression_cache(max_memory_mb=8)
+
+    # Each worker already owns a core, so don't fan out further
+    digest = digest or hash_pdf(pdf)
+    text = _extraction_cache.get_or_extract(pdf, lambda data: extract_text(data, max_workers=1), digest)
+    prompt_text = _compression_cache.get_or_extract(pdf, compress_pdf, digest) if compress and text else None
+    return text, prompt_text or text
+
@@ -0,0 +1,175 @@
+"""
+Local Pre-analysis for DocuSense AI
+Runs spaCy over extracted text to compute writing statistics and pick out the
+sentences worth the model's attention, so essay prompts can carry a compact
+digest instead of the full document
+"""
+
+import re
+from collections import Counter
+
+from chunking import count_tokens, split_paragraphs
+
+# Only sentence boundaries, dependencies and entities are needed
+DISABLED_COMPONENTS = ["lemmatizer", "textcat", "textcat_multilabel"]
+BATCH_SIZE = 32
+
+LONG_SENTENCE_WORDS = 35
+REPEATED_PHRASE_MIN_COUNT = 3
+MAX_REPEATED_PHRASES = 10
+MAX_FLAGGED_SENTENCES = 40
+MAX_TOPIC_SENTENCES = 60
+MAX_ENTITIES_PER_LABEL = 8
+
+# Extracted PDF text rarely separates paragraphs with blank lines, so the opening
+# and closing are taken as sentences rather than as whole first and last paragraphs
+INTRO_SENTENCES = 3
+CONCLUSION_SENTENCES = 3
+
+# A digest is only sent in place of the essay when it is at most this share of its tokens
+MAX_DIGEST_SHARE = 0.6
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "with"
+}
+
+
+def count_syllables(word):
+    """Estimate syllables by counting vowel groups"""
+    word = word.lower()
+    groups = re.findall(r"[aeiouy]+", word)
+    count = len(groups)
+    if word.endswith("e") and count > 1 and not word.endswith(("le", "ee")):
+        count -= 1
+    return max(count, 1)
+
+
+def _repeated_phrases(sentence_words):
+    """Return word trigrams used at least REPEATED_PHRASE_MIN_COUNT times"""
+    counts = Counter()
+    for words in sentence_words:
+        lowered = [w.lower() for w in words]
+        for i in range(len(lowered) - 2):
+            trigram = tuple(lowered[i:i + 3])
+            if not set(trigram) <= _STOPWORDS:
+                counts[trigram] += 1
+
+    selected = []
+    considered = []
+    for trigram, n in counts.most_common():
+        if n < REPEATED_PHRASE_MIN_COUNT or len(selected) == MAX_REPEATED_PHRASES:
+            break
+        # "in the end of the day" should be reported once, not as four overlapping trigrams
+        overlaps = any(
+            count == n and (trigram[1:] == seen[:2] or trigram[:2] == seen[1:])
+            for seen, count in considered
+        )
+        considered.append((trigram, n))
+        if not overlaps:
+            selected.append((trigram, n))
+    return [(" ".join(t), n) for t, n in selected]
+
+
+def preanalyze(nlp, text):
+    """Compute a writing digest for a document with a loaded spaCy pipeline"""
+    paragraphs = split_paragraphs(text)
+    disabled = [name for name in DISABLED_COMPONENTS if name in nlp.pipe_names]
+
+    sentences = []
+    entities = {}
+    topic_sentences = []
+    for doc in nlp.pipe(paragraphs, batch_size=BATCH_SIZE, disable=disabled):
+        first = True
+        for sent in doc.sents:
+            words = [token.text for token in sent if token.is_alpha]
+            if not words:
+                continue
+            passive = any(token.dep_ in ("nsubjpass", "auxpass") for token in sent)
+            sentences.append({"text": sent.text.strip(), "words": words, "passive": passive})
+            if first and len(topic_sentences) < MAX_TOPIC_SENTENCES:
+                topic_sentences.append(sent.text.strip())
+                first = False
+        for ent in doc.ents:
+            names = entities.setdefault(ent.label_, Counter())
+            names[ent.text.strip()] += 1
+
+    word_count = sum(len(s["words"]) for s in sentences)
+    syllables = sum(count_syllables(w) for s in sentences for w in s["words"])
+    sentence_count = len(sentences)
+    words_per_sentence = word_count / sentence_count if sentence_count else 0
+    syllables_per_word = syllables / word_count if word_count else 0
+
+    repeated = _repeated_phrases(s["words"] for s in sentences)
+    repeated_set = [phrase for phrase, _ in repeated]
+
+    flagged = []
+    for sentence in sentences:
+        issues = []
+        if sentence["passive"]:
+            issues.append("passive voice")
+        if len(sentence["words"]) > LONG_SENTENCE_WORDS:
+            issues.append("long sentence")
+        lowered = " ".join(sentence["words"]).lower()
+        repeats = [phrase for phrase in repeated_set if phrase in lowered]
+        if repeats:
+            issues.append(f'repeats "{repeats[0]}"')
+        if issues and len(flagged) < MAX_FLAGGED_SENTENCES:
+            flagged.append({"text": sentence["text"], "issues": issues})
+
+    return {
+        "statistics": {
+            "paragraph_count": len(paragraphs),
+            "sentence_count": sentence_count,
+            "word_count": word_count,
+            "avg_sentence_length": round(words_per_sentence, 1),
+            "flesch_reading_ease": round(206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word, 1),
+            "flesch_kincaid_grade": round(0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59, 1),
+            "passive_sentence_count": sum(1 for s in sentences if s["passive"]),
+            "long_sentence_count": sum(1 for s in sentences if len(s["words"]) > LONG_SENTENCE_WORDS),
+            "repeated_phrases": [f"{phrase} (x{n})" for phrase, n in repeated]
+        },
+        "entities": {
+            label: [name for name, _ in names.most_common(MAX_ENTITIES_PER_LABEL)]
+            for label, names in entities.items()
+        },
+        "introduction": " ".join(s["text"] for s in sentences[:INTRO_SENTENCES]),
+        "conclusion": " ".join(s["text"] for s in sentences[max(INTRO_SENTENCES, sentence_count - CONCLUSION_SENTENCES):]),
+        "topic_sentences": topic_sentences,
+        "flagged_sentences": flagged
+    }
+
+
+def format_digest(digest):
+    """Render a digest as the compact text sent to the model"""
+    stats = digest["statistics"]
+    lines = [
+        "WRITING STATISTICS (computed locally):",
+        f"- Paragraphs: {stats['paragraph_count']}, sentences: {stats['sentence_count']}, words: {stats['word_count']}",
+        f"- Average sentence length: {stats['avg_sentence_length']} words",
+        f"- Flesch reading ease: {stats['flesch_reading_ease']}, grade level: {stats['flesch_kincaid_grade']}",
+        f"- Passive sentences: {stats['passive_sentence_count']}, long sentences: {stats['long_sentence_count']}"
+    ]
+    if stats["repeated_phrases"]:
+        lines.append(f"- Repeated phrases: {', '.join(stats['repeated_phrases'])}")
+    if digest["entities"]:
+        lines.append("- Named entities: " + "; ".join(
+            f"{label}: {', '.join(names)}" for label, names in digest["entities"].items()
+        ))
+
+    lines += ["", "INTRODUCTION:", digest["introduction"]]
+    if digest["topic_sentences"]:
+        lines += ["", "TOPIC SENTENCE OF EACH PARAGRAPH:"]
+        lines += [f"{i}. {sentence}" for i, sentence in enumerate(digest["topic_sentences"], 1)]
+    if digest["conclusion"]:
+        lines += ["", "CONCLUSION:", digest["conclusion"]]
+    if digest["flagged_sentences"]:
+        lines += ["", "FLAGGED SENTENCES:"]
+        lines += [f"- [{', '.join(s['issues'])}] {s['text']}" for s in digest["flagged_sentences"]]
+
+    return "\n".join(lines)
+
+
+def digest_is_compact(digest, text):
+    """Whether sending the digest instead of the full text clearly saves prompt tokens"""
+    return count_tokens(format_digest(digest)) <= MAX_DIGEST_SHARE * count_tokens(text)
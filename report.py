@@ -0,0 +1,271 @@
+"""
+Report Generation for DocuSense AI
+Renders analysis feedback as a PDF (ReportLab), HTML or JSON report, caching
+rendered reports by a hash of their content and rendering batches in parallel
+"""
+
+import hashlib
+import html
+import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from metrics import span
+
+# Bump whenever report output changes so cached reports are invalidated
+REPORT_VERSION = "1"
+
+REPORT_FORMATS = {
+    "pdf": ("application/pdf", ".pdf"),
+    "html": ("text/html", ".html"),
+    "json": ("application/json", ".json")
+}
+
+REPORT_CACHE_MB = int(os.getenv("DOCUSENSE_REPORT_CACHE_MB", "32"))
+
+SCORE_ROWS = {
+    "Student Essay": [("Grammar", "grammar_score"), ("Content", "content_score"), ("Structure", "structure_score")],
+    "Resume": [("Content", "content_score"), ("Formatting", "formatting_score"), ("Impact", "impact_score")],
+    "Invoice": [("Completeness", "completeness_score"), ("Clarity", "clarity_score"),
+                ("Professionalism", "professionalism_score")]
+}
+
+FEEDBACK_SECTIONS = [
+    ('Content Feedback', 'content_feedback'),
+    ('Grammar Feedback', 'grammar_feedback'),
+    ('Structure Feedback', 'structure_feedback'),
+    ('Formatting Feedback', 'formatting_feedback'),
+    ('Impact Feedback', 'impact_feedback'),
+    ('Completeness Feedback', 'completeness_feedback'),
+    ('Clarity Feedback', 'clarity_feedback'),
+    ('Professionalism Feedback', 'professionalism_feedback')
+]
+
+LIST_SECTIONS = [
+    ('Strengths', 'strengths'),
+    ('Areas for Improvement', 'areas_for_improvement'),
+    ('Suggestions', 'suggestions')
+]
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>DocuSense AI - {mode} Report</title>
+<style>
+body {{ font-family: Helvetica, Arial, sans-serif; max-width: 800px; margin: 2rem auto; color: #2c3e50; }}
+h1 {{ text-align: center; color: #1f77b4; }}
+table {{ border-collapse: collapse; margin: 1rem 0; }}
+th, td {{ border: 1px solid #000; padding: 0.4rem 1.2rem; text-align: center; }}
+th {{ background: #808080; color: #f5f5f5; }}
+td {{ background: #f5f5dc; }}
+</style>
+</head>
+<body>
+<h1>DocuSense AI - Document Analysis Report</h1>
+<p><b>Document Type:</b> {mode}<br><b>Analysis Date:</b> {date}</p>
+<h2>Overall Score: {overall}/100</h2>
+{body}
+</body>
+</html>
+"""
+
+
+def _score_rows(feedback, mode):
+    """Return the (category, score) rows for the scores table"""
+    rows = [(name, feedback[key]) for name, key in SCORE_ROWS.get(mode, []) if key in feedback]
+    return rows or [("Overall", feedback.get('overall_score', 0))]
+
+
+@lru_cache(maxsize=1)
+def _pdf_styles():
+    """Build the ReportLab styles once per process"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    )
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    return styles, title_style, table_style
+
+
+def _render_pdf(feedback, mode, generated):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+    styles, title_style, table_style = _pdf_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+
+    # Title
+    story.append(Paragraph("DocuSense AI - Document Analysis Report", title_style))
+    story.append(Spacer(1, 20))
+
+    # Report details
+    story.append(Paragraph(f"<b>Document Type:</b> {escape(mode)}", styles['Normal']))
+    story.append(Paragraph(f"<b>Analysis Date:</b> {generated}", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    # Overall score
+    story.append(Paragraph(f"<b>Overall Score:</b> {feedback.get('overall_score', 0)}/100", styles['Heading2']))
+    story.append(Spacer(1, 15))
+
+    # Detailed scores
+    story.append(Paragraph("<b>Detailed Scores:</b>", styles['Heading3']))
+    scores_table = Table([['Category', 'Score']] + [[name, f"{score}/100"] for name, score in _score_rows(feedback, mode)])
+    scores_table.setStyle(table_style)
+    story.append(scores_table)
+    story.append(Spacer(1, 20))
+
+    # Feedback sections
+    for section_title, key in FEEDBACK_SECTIONS:
+        if feedback.get(key):
+            story.append(Paragraph(f"<b>{section_title}:</b>", styles['Heading3']))
+            story.append(Paragraph(escape(str(feedback[key])), styles['Normal']))
+            story.append(Spacer(1, 15))
+
+    # Lists
+    for list_title, key in LIST_SECTIONS:
+        if feedback.get(key):
+            story.append(Paragraph(f"<b>{list_title}:</b>", styles['Heading3']))
+            for item in feedback[key]:
+                story.append(Paragraph(f"• {escape(str(item))}", styles['Normal']))
+            story.append(Spacer(1, 15))
+
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _render_html(feedback, mode, generated):
+    body = ["<h3>Detailed Scores:</h3>", "<table><tr><th>Category</th><th>Score</th></tr>"]
+    body += [f"<tr><td>{html.escape(name)}</td><td>{score}/100</td></tr>" for name, score in _score_rows(feedback, mode)]
+    body.append("</table>")
+
+    for section_title, key in FEEDBACK_SECTIONS:
+        if feedback.get(key):
+            body.append(f"<h3>{section_title}:</h3>\n<p>{html.escape(str(feedback[key]))}</p>")
+
+    for list_title, key in LIST_SECTIONS:
+        if feedback.get(key):
+            items = "".join(f"<li>{html.escape(str(item))}</li>" for item in feedback[key])
+            body.append(f"<h3>{list_title}:</h3>\n<ul>{items}</ul>")
+
+    return HTML_TEMPLATE.format(
+        mode=html.escape(mode),
+        date=generated,
+        overall=feedback.get('overall_score', 0),
+        body="\n".join(body)
+    ).encode("utf-8")
+
+
+def _render_json(feedback, mode, generated):
+    return json.dumps({"mode": mode, "generated": generated, "feedback": feedback}, indent=2).encode("utf-8")
+
+
+RENDERERS = {"pdf": _render_pdf, "html": _render_html, "json": _render_json}
+
+
+class ReportCache:
+    """In-memory LRU of rendered reports, bounded by total size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._reports = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._reports:
+                self._reports.move_to_end(key)
+                return self._reports[key]
+            return None
+
+    def put(self, key, report):
+        if len(report) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._reports:
+                self._bytes -= len(self._reports.pop(key))
+            self._reports[key] = report
+            self._bytes += len(report)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._reports.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+_cache = ReportCache(REPORT_CACHE_MB * 1024 * 1024)
+
+
+def report_key(feedback, mode, fmt, generated):
+    """Hash the content a report is rendered from, including the time stamped on it"""
+    payload = json.dumps([REPORT_VERSION, fmt, mode, generated, feedback], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_report(feedback, mode, original_text=None, fmt="pdf"):
+    """Render a report in the given format and return its bytes, reusing cached renders
+
+    HTML and JSON are built without importing ReportLab.
+    """
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown report format {fmt!r}; expected one of {', '.join(RENDERERS)}")
+
+    with span("report", format=fmt) as attrs:
+        # Stamped to the minute, so repeat exports reuse a render without showing a stale time
+        generated = datetime.now().strftime('%Y-%m-%d %H:%M')
+        key = report_key(feedback, mode, fmt, generated)
+        report = _cache.get(key)
+        attrs["cached"] = report is not None
+        if report is None:
+            report = RENDERERS[fmt](feedback, mode, generated)
+            _cache.put(key, report)
+    return report
+
+
+def create_pdf_report(feedback, mode, original_text):
+    """Create a PDF report of the feedback"""
+    return io.BytesIO(render_report(feedback, mode, original_text, "pdf"))
+
+
+def _render_args(args):
+    return render_report(*args)
+
+
+def render_reports(items, fmt="pdf", max_workers=None):
+    """Render many (feedback, mode) reports, spreading PDFs across processes
+
+    Returns the report bytes in the same order as items.
+    """
+    items = [(feedback, mode, None, fmt) for feedback, mode in items]
+    workers = min(max_workers or os.cpu_count() or 1, len(items))
+    if fmt != "pdf" or workers <= 1:
+        return [render_report(*item) for item in items]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_render_args, items, chunksize=max(1, len(items) // (workers * 4))))
@@ -0,0 +1,105 @@
+"""
+Response Cache for DocuSense AI
+SQLite-backed cache of parsed LLM feedback keyed on mode, model, temperature,
+prompt version and a hash of the normalized document text
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_text(text):
+    """Collapse whitespace so cosmetic re-extractions map to the same key"""
+    return " ".join(text.split())
+
+
+def make_key(mode, model, temperature, prompt_version, text):
+    """Build the cache key for one analysis request"""
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{mode}|{model}|{temperature}|{prompt_version}|{text_hash}"
+
+
+class ResponseCache:
+    """Persistent feedback cache with TTL and size-based LRU eviction
+
+    near_duplicates, a near_duplicates.NearDuplicateIndex, lets analyses
+    reuse the cached feedback of nearly identical documents as well.
+    """
+
+    def __init__(self, path=":memory:", ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES,
+                 near_duplicates=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.near_duplicates = near_duplicates
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    feedback TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def get(self, key):
+        """Return cached feedback for a key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT feedback, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, feedback):
+        """Store feedback and evict expired and least recently used entries"""
+        payload = json.dumps(feedback)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, feedback, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self):
+        """Return hit/miss counters and current entry count"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -0,0 +1,156 @@
+"""
+Revision Tracking for DocuSense AI
+Stable paragraph fingerprints, content-defined sections and paragraph diffs,
+so a revised document only asks the model about the sections that changed
+"""
+
+import difflib
+import hashlib
+import os
+
+from chunking import chunk_text, count_tokens
+
+# Modes whose feedback still makes sense when assembled from separately analyzed sections
+REVISION_MODES = ("Student Essay", "Resume")
+
+# Average section size; sections range from an eighth of this to four times it.
+# Each section's list feedback is kept separately, so smaller sections re-request less after an edit
+SECTION_TOKENS = int(os.getenv("DOCUSENSE_REVISION_SECTION_TOKENS", "1000"))
+
+MIN_SECTION_FRACTION = 8
+MAX_SECTION_MULTIPLE = 4
+
+# Shorter documents get smaller sections, so they still split into about this many
+# and an edit to a resume re-sends only a small part of it
+MIN_SECTIONS = 8
+MIN_SECTION_TARGET = 64
+
+
+def normalize_paragraph(text):
+    return " ".join(text.split())
+
+
+def fingerprint(paragraph):
+    """Hash a paragraph's text, ignoring whitespace, so re-extraction gives the same value"""
+    return hashlib.sha256(normalize_paragraph(paragraph).encode("utf-8")).hexdigest()[:16]
+
+
+def section_target(tokens, limit=SECTION_TOKENS):
+    """Return the average section size for a document of this many tokens
+
+    Rounded down to a power of two, so the small length changes of an edit
+    keep the same size and with it the same section boundaries.
+    """
+    target = max(tokens // MIN_SECTIONS, MIN_SECTION_TARGET)
+    return min(limit, 1 << (target.bit_length() - 1))
+
+
+def split_units(text):
+    """Split text into the paragraphs that are fingerprinted
+
+    Compressed prompt text carries one PDF text block per line, so lines are
+    paragraphs; uncompressed text falls back to visual lines, which an edit
+    only re-wraps within its own paragraph.
+    """
+    return [normalize_paragraph(line) for line in text.splitlines() if line.strip()]
+
+
+def split_sections(text, target_tokens=SECTION_TOKENS, model="gpt-3.5-turbo"):
+    """Group paragraphs into sections with boundaries chosen by paragraph content
+
+    Whether a paragraph ends a section is decided by its fingerprint, with
+    odds proportional to its length, so sections average target_tokens
+    whatever the paragraph size. Boundaries depend on the paragraphs
+    themselves rather than their positions, so an edit usually changes only
+    its own section; the small minimum and large maximum section sizes are
+    the only position-dependent rules. Returns dicts of paragraphs, text
+    and tokens.
+    """
+    min_tokens = target_tokens // MIN_SECTION_FRACTION
+    max_tokens = target_tokens * MAX_SECTION_MULTIPLE
+    sections = []
+    paragraphs, tokens = [], 0
+
+    for unit in split_units(text):
+        pieces = [unit] if count_tokens(unit, model) <= max_tokens else chunk_text(unit, max_tokens, model)
+        for piece in pieces:
+            digest = fingerprint(piece)
+            paragraphs.append((digest, piece))
+            piece_tokens = count_tokens(piece, model)
+            tokens += piece_tokens
+            if (tokens >= min_tokens and _ends_section(digest, piece_tokens, target_tokens)) or tokens >= max_tokens:
+                sections.append(_section(paragraphs, tokens))
+                paragraphs, tokens = [], 0
+
+    if paragraphs:
+        sections.append(_section(paragraphs, tokens))
+    return sections
+
+
+def _ends_section(digest, tokens, target_tokens):
+    return int(digest, 16) % 10000 < tokens * 10000 // target_tokens
+
+
+def _section(paragraphs, tokens):
+    return {"paragraphs": paragraphs, "text": "\n".join(text for _, text in paragraphs), "tokens": tokens}
+
+
+class Revision:
+    """One analyzed version of a document: its sections and the feedback for each
+
+    feedback maps a section's response cache key to the list feedback (such
+    as suggestions) about that section, groups maps the cache key of each
+    whole-document request to the scores and assessments judged over the
+    text it sent, and overall holds the document's scores and assessments
+    under document_key, so the next revision can reuse them and update its
+    scores even without a response cache.
+    """
+
+    def __init__(self, text, target_tokens=SECTION_TOKENS, model="gpt-3.5-turbo"):
+        self.target_tokens = target_tokens
+        self.sections = split_sections(text, target_tokens, model)
+        self.feedback = {}
+        self.groups = {}
+        self.overall = {}
+        self.document_key = None
+        self.reanalyzed = []
+        self.requests = 0
+        self.sent_tokens = 0
+
+    @property
+    def paragraphs(self):
+        return [paragraph for section in self.sections for paragraph in section["paragraphs"]]
+
+    def stats(self):
+        """Return the section and token counts, and how much was sent to the model"""
+        return {
+            "sections": len(self.sections),
+            "reanalyzed": len(self.reanalyzed),
+            "requests": self.requests,
+            "tokens": sum(section["tokens"] for section in self.sections),
+            "sent_tokens": self.sent_tokens
+        }
+
+
+def diff_paragraphs(previous, current):
+    """Compare two revisions paragraph by paragraph
+
+    Returns {"unchanged": count, "changes": [...]}, each change a dict with
+    a type of "added", "removed" or "changed" and the paragraphs before and
+    after it.
+    """
+    old, new = previous.paragraphs, current.paragraphs
+    matcher = difflib.SequenceMatcher(a=[digest for digest, _ in old], b=[digest for digest, _ in new], autojunk=False)
+    kinds = {"replace": "changed", "delete": "removed", "insert": "added"}
+
+    unchanged, changes = 0, []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            unchanged += i2 - i1
+            continue
+        changes.append({
+            "type": kinds[tag],
+            "before": [text for _, text in old[i1:i2]],
+            "after": [text for _, text in new[j1:j2]]
+        })
+    return {"unchanged": unchanged, "changes": changes}
@@ -0,0 +1,193 @@
+"""
+Feedback Schemas for DocuSense AI
+JSON schemas for each mode's feedback, a tolerant parser that salvages the
+valid fields of a malformed reply, and helpers for asking the model for only
+the fields it left out
+"""
+
+import json
+import re
+
+from json_stream import IncrementalJSONParser
+
+SCORE = {"type": "integer", "minimum": 0, "maximum": 100}
+TEXT = {"type": "string"}
+TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+
+
+def _object_schema(properties):
+    # Structured outputs require every property to be listed as required
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+FEEDBACK_SCHEMAS = {
+    "Student Essay": _object_schema({
+        "overall_score": SCORE,
+        "grammar_score": SCORE,
+        "content_score": SCORE,
+        "structure_score": SCORE,
+        "grammar_issues": TEXT_LIST,
+        "content_feedback": TEXT,
+        "structure_feedback": TEXT,
+        "suggestions": TEXT_LIST,
+        "strengths": TEXT_LIST,
+        "areas_for_improvement": TEXT_LIST
+    }),
+
+    "Resume": _object_schema({
+        "overall_score": SCORE,
+        "content_score": SCORE,
+        "formatting_score": SCORE,
+        "impact_score": SCORE,
+        "content_feedback": TEXT,
+        "formatting_feedback": TEXT,
+        "impact_feedback": TEXT,
+        "suggestions": TEXT_LIST,
+        "strengths": TEXT_LIST,
+        "areas_for_improvement": TEXT_LIST,
+        "keywords_missing": TEXT_LIST
+    }),
+
+    "Invoice": _object_schema({
+        "overall_score": SCORE,
+        "completeness_score": SCORE,
+        "clarity_score": SCORE,
+        "professionalism_score": SCORE,
+        "completeness_feedback": TEXT,
+        "clarity_feedback": TEXT,
+        "professionalism_feedback": TEXT,
+        "suggestions": TEXT_LIST,
+        "strengths": TEXT_LIST,
+        "areas_for_improvement": TEXT_LIST,
+        "missing_elements": TEXT_LIST
+    })
+}
+
+# Invoices checked locally only ask the model for the subjective review
+INVOICE_REVIEW_SCHEMA = _object_schema({
+    key: FEEDBACK_SCHEMAS["Invoice"]["properties"][key]
+    for key in ("clarity_score", "professionalism_score", "clarity_feedback", "professionalism_feedback",
+                "suggestions", "strengths", "areas_for_improvement")
+})
+
+
+def feedback_schema(mode, local=False):
+    """Return the schema the model's reply must follow for a mode"""
+    if local and mode == "Invoice":
+        return INVOICE_REVIEW_SCHEMA
+    return FEEDBACK_SCHEMAS[mode]
+
+
+def subschema(schema, keys):
+    """Return a schema restricted to the given properties"""
+    return _object_schema({key: schema["properties"][key] for key in keys})
+
+
+def list_fields(schema):
+    """Return the properties that hold lists of observations, such as suggestions"""
+    return [key for key, value in schema["properties"].items() if value["type"] == "array"]
+
+
+def section_field(number, key):
+    return f"section_{number}_{key}"
+
+
+def revision_schema(schema, sections, overall=True):
+    """Return a schema for the list fields of each numbered section, plus the other fields if overall"""
+    lists = list_fields(schema)
+    properties = {key: value for key, value in schema["properties"].items() if overall and key not in lists}
+    for number in sections:
+        properties.update({section_field(number, key): schema["properties"][key] for key in lists})
+    return _object_schema(properties)
+
+
+def response_format(schema, name, strict=True):
+    """Build the response_format parameter for a chat completion
+
+    Models without structured outputs get JSON mode, which still guarantees
+    syntactically valid JSON.
+    """
+    if not strict:
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": re.sub(r"[^a-zA-Z0-9_-]", "_", name), "schema": schema, "strict": True}
+    }
+
+
+def _coerce(value, schema):
+    """Return value converted to the schema's type, or None if it can't be"""
+    kind = schema["type"]
+    if kind == "integer":
+        if isinstance(value, str):
+            # "85", "85/100" and "85%" are all common
+            match = re.match(r"\s*(\d+(?:\.\d+)?)", value)
+            value = float(match.group(1)) if match else None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return int(min(max(round(value), schema["minimum"]), schema["maximum"]))
+    if kind == "string":
+        if isinstance(value, (list, dict)):
+            return None
+        return str(value) if value is not None else None
+    if kind == "array":
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            return None
+        # Items like {"error": ..., "correction": ...} are flattened to text
+        return [item if isinstance(item, str) else json.dumps(item) for item in value if item not in (None, "")]
+    return value
+
+
+def validate_feedback(data, schema):
+    """Split a parsed reply into its valid fields and the required fields still missing"""
+    valid = {}
+    for key, value in data.items():
+        field_schema = schema["properties"].get(key)
+        if field_schema is None:
+            continue
+        value = _coerce(value, field_schema)
+        if value is not None:
+            valid[key] = value
+    missing = [key for key in schema["required"] if key not in valid]
+    return valid, missing
+
+
+def salvage_json(text):
+    """Recover as many top-level fields as possible from a possibly malformed JSON reply"""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+
+    # Truncated or partly invalid: keep every member that parses on its own
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    if not parser.complete:
+        parser.feed("}")
+    return dict(parser.fields)
+
+
+def parse_feedback(feedback_text, schema):
+    """Parse the model's reply against a schema, returning (valid fields, missing fields)"""
+    return validate_feedback(salvage_json(feedback_text), schema)
+
+
+def repair_prompt(schema, missing):
+    """Ask for only the fields missing from an earlier reply"""
+    return (
+        "Your previous reply was missing these fields or gave them invalid values: "
+        f"{', '.join(missing)}. Reply with a JSON object containing only these fields, following this schema:\n"
+        + json.dumps(subschema(schema, missing))
+    )
@@ -0,0 +1,163 @@
+"""
+Session Store for DocuSense AI
+Process-wide store of per-session payloads such as extracted text and
+feedback, compressed and held under one byte cap, so each Streamlit session
+keeps only small handles and memory stays bounded however many sessions run
+"""
+
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_IDLE_SECONDS = 30 * 60
+
+# Bookkeeping per entry beyond its compressed bytes: the key, handle and index entries
+ENTRY_OVERHEAD_BYTES = 256
+
+# Idle sessions are looked for at most this often
+EXPIRY_INTERVAL_SECONDS = 60
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def _zstd():
+    # Imported on first use; zlib is used when zstandard is not installed
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_codec():
+    return "zstd" if _zstd() is not None else "zlib"
+
+
+def compress(data, codec):
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(blob, codec):
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class SessionStore:
+    """Compressed payloads of every session, with LRU eviction under a byte cap
+
+    put() returns a small handle for the session to keep in place of the
+    payload. Sessions idle for longer than idle_seconds are dropped whole.
+    A handle may name a source, a (kind, key) pair looked up through the
+    sources callables, that rebuilds its payload once evicted; get()
+    returns None for a payload that is gone and has no source.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, idle_seconds=DEFAULT_IDLE_SECONDS, sources=None, codec=None):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.sources = sources or {}
+        self.codec = codec or default_codec()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._sessions = {}
+        self._next_expiry = 0
+        self._lock = threading.Lock()
+
+    def put(self, session_id, value, source=None):
+        """Store a payload for a session and return its handle"""
+        handle = {"id": uuid.uuid4().hex, "session": session_id, "source": source}
+        self._store(handle, value)
+        return handle
+
+    def get(self, handle):
+        """Return a handle's payload, rebuilding it from its source after eviction"""
+        with self._lock:
+            self._touch(handle["session"])
+            entry = self._entries.get(handle["id"])
+            if entry is not None:
+                self._entries.move_to_end(handle["id"])
+        if entry is not None:
+            self._count("hit")
+            return pickle.loads(decompress(entry[0], self.codec))
+
+        value = self._rebuild(handle)
+        self._count("miss" if value is None else "rebuild")
+        if value is not None:
+            self._store(handle, value)
+        return value
+
+    def discard(self, handle):
+        """Drop a payload the session no longer needs"""
+        with self._lock:
+            self._remove(handle["id"])
+
+    def _rebuild(self, handle):
+        if not handle.get("source"):
+            return None
+        kind, key = handle["source"]
+        load = self.sources.get(kind)
+        return load(key) if load is not None else None
+
+    def _store(self, handle, value):
+        # Compressed before taking the lock, so large payloads don't stall other sessions
+        blob = compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), self.codec)
+        size = len(blob) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            self._remove(handle["id"])
+            self._touch(handle["session"])
+            # Too large to keep at all; only its source can bring it back
+            if size > self.max_bytes:
+                return
+            self._entries[handle["id"]] = (blob, size, handle["session"])
+            self._sessions[handle["session"]][1].add(handle["id"])
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._count("eviction")
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        session = self._sessions.get(entry[2])
+        if session is not None:
+            session[1].discard(entry_id)
+
+    def _touch(self, session_id):
+        now = time.time()
+        if now >= self._next_expiry:
+            self._expire_idle(now)
+        self._sessions.setdefault(session_id, [now, set()])[0] = now
+
+    def _expire_idle(self, now):
+        self._next_expiry = now + EXPIRY_INTERVAL_SECONDS
+        idle = [session_id for session_id, (seen, _) in self._sessions.items() if now - seen > self.idle_seconds]
+        for session_id in idle:
+            for entry_id in list(self._sessions.pop(session_id)[1]):
+                self._remove(entry_id)
+                self._count("expiry")
+
+    def _count(self, event):
+        REGISTRY.inc("docusense_session_store_events_total", {"event": event})
+
+    def stats(self):
+        """Return the stored bytes, the cap, and the number of entries and live sessions"""
+        with self._lock:
+            return {
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "entries": len(self._entries),
+                "sessions": len(self._sessions),
+                "codec": self.codec
+            }
@@ -36,7 +36,18 @@ def install_dependencies():
     return run_command("pip install -r requirements.txt", "Installing Python dependencies")
 
 def install_spacy_model():
-    """Install spaCy English model"""
+    """Install spaCy English model unless it is already installed
+
+    The app no longer downloads the model at startup, so this step (or the
+    model wheel in requirements.txt) must run before deploying.
+    """
+    try:
+        from spacy.util import is_package
+        if is_package("en_core_web_sm"):
+            print("✅ spaCy English model already installed")
+            return True
+    except ImportError:
+        pass
     return run_command("python -m spacy download en_core_web_sm", "Installing spaCy English model")
 
 def create_env_file():
@@ -52,12 +63,44 @@ def create_env_file():
             f.write("# OpenAI API Configuration\n")
             f.write("# Get your API key from: https://platform.openai.com/api-keys\n")
             f.write("OPENAI_API_KEY=your_openai_api_key_here\n\n")
-            f.write("# Optional: Custom OpenAI Model (default: gpt-3.5-turbo)\n")
-            f.write("# OPENAI_MODEL=gpt-4\n\n")
+            f.write("# Optional: Pin every request to one OpenAI model (default: routed per mode)\n")
+            f.write("# OPENAI_MODEL=gpt-4o-mini\n\n")
+            f.write("# Optional: Models the router chooses from, and per-mode targets as JSON\n")
+            f.write("# DOCUSENSE_ROUTER_MODELS=gpt-4.1-mini,gpt-4o-mini,gpt-4.1-nano\n")
+            f.write("# DOCUSENSE_MODEL_ROUTES={\"Invoice\": {\"latency_slo_s\": 5}}\n")
+            f.write("# DOCUSENSE_ROUTER_TIMEOUT_MULTIPLE=2\n\n")
             f.write("# Optional: Custom temperature for AI responses (default: 0.3)\n")
             f.write("# OPENAI_TEMPERATURE=0.3\n\n")
             f.write("# Optional: Custom max tokens for AI responses (default: 2000)\n")
-            f.write("# OPENAI_MAX_TOKENS=2000\n")
+            f.write("# OPENAI_MAX_TOKENS=2000\n\n")
+            f.write("# Optional: Directory for persistent caches (empty disables disk caching)\n")
+            f.write("# DOCUSENSE_CACHE_DIR=.docusense_cache\n\n")
+            f.write("# Optional: In-memory budget for extracted text in MB (default: 64)\n")
+            f.write("# DOCUSENSE_EXTRACTION_CACHE_MB=64\n\n")
+            f.write("# Optional: Lifetime and size cap of cached AI feedback\n")
+            f.write("# DOCUSENSE_RESPONSE_CACHE_TTL_HOURS=168\n")
+            f.write("# DOCUSENSE_RESPONSE_CACHE_MB=256\n\n")
+            f.write("# Optional: Similarity above which near-duplicate documents reuse feedback (empty disables)\n")
+            f.write("# DOCUSENSE_NEAR_DUPLICATE_THRESHOLD=0.9\n")
+            f.write("# DOCUSENSE_NEAR_DUPLICATE_MAX_DOCS=500000\n\n")
+            f.write("# Optional: Memory cap for all sessions' text and feedback, and idle session expiry\n")
+            f.write("# DOCUSENSE_SESSION_STORE_MB=128\n")
+            f.write("# DOCUSENSE_SESSION_IDLE_MINUTES=30\n\n")
+            f.write("# Optional: Background analysis worker threads (default: 8)\n")
+            f.write("# DOCUSENSE_JOB_WORKERS=8\n\n")
+            f.write("# Optional: Let API requests without their own key use OPENAI_API_KEY (default: off)\n")
+            f.write("# DOCUSENSE_API_USE_SERVER_KEY=1\n\n")
+            f.write("# Optional: LLM backend - openai, record, replay or fake (default: openai)\n")
+            f.write("# DOCUSENSE_LLM_BACKEND=openai\n")
+            f.write("# DOCUSENSE_LLM_RECORDINGS=llm_recordings\n\n")
+            f.write("# Optional: Per-analysis JSON log - stderr, a file path, or empty to disable\n")
+            f.write("# DOCUSENSE_ANALYSIS_LOG=stderr\n\n")
+            f.write("# Optional: Upload limits and the size above which uploads are spooled to disk\n")
+            f.write("# DOCUSENSE_MAX_UPLOAD_MB=50\n")
+            f.write("# DOCUSENSE_MAX_PAGES=2000\n")
+            f.write("# DOCUSENSE_SPOOL_THRESHOLD_MB=8\n\n")
+            f.write("# Optional: Average section size for revision-aware re-analysis (default: 1000)\n")
+            f.write("# DOCUSENSE_REVISION_SECTION_TOKENS=1000\n")
         print("✅ .env file created successfully")
         print("⚠️  Please edit .env file and add your OpenAI API key")
         return True
@@ -70,6 +113,10 @@ def main():
     print("🚀 DocuSense AI Setup")
     print("=" * 50)
     
+    # Container builds can install just the model in their own layer
+    if "--model-only" in sys.argv:
+        sys.exit(0 if install_spacy_model() else 1)
+    
     # Check Python version
     if not check_python_version():
         sys.exit(1)
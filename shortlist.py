@@ -0,0 +1,139 @@
+"""
+Resume Shortlisting for DocuSense AI
+Hashed TF-IDF vectors built with NumPy rank every resume against a job
+description in one vectorized pass, so only the best matches need a full
+LLM analysis
+"""
+
+import os
+import re
+import zlib
+
+# NumPy is imported on first use so app startup doesn't pay for it
+
+# Hashed feature space; collisions are rare well below this many distinct terms
+FEATURE_BITS = int(os.getenv("DOCUSENSE_SHORTLIST_FEATURE_BITS", "20"))
+N_FEATURES = 1 << FEATURE_BITS
+
+# Job description terms reported per shortlisted resume
+MAX_MATCHED_TERMS = 15
+
+# Term-to-feature lookups kept between documents before the memo is reset
+MAX_CACHED_TERMS = 1_000_000
+
+# Keeps skills such as "c++", "c#" and "node.js" as single terms
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "about", "across", "all", "also", "an", "and", "any", "are", "as", "at", "be", "been", "but", "by",
+    "can", "do", "for", "from", "has", "have", "he", "her", "his", "i", "in", "into", "is", "it", "its", "me",
+    "more", "my", "not", "of", "on", "or", "our", "she", "so", "such", "than", "that", "the", "their", "them",
+    "there", "these", "they", "this", "to", "us", "was", "we", "were", "will", "with", "within", "you", "your"
+}
+
+_buckets = {}
+
+
+def terms(text):
+    """Return a document's words and adjacent word pairs, lowercased and without stopwords"""
+    words = [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def _bucket(term):
+    # crc32 is stable across processes, unlike hash()
+    bucket = _buckets.get(term)
+    if bucket is None:
+        if len(_buckets) >= MAX_CACHED_TERMS:
+            _buckets.clear()
+        bucket = _buckets[term] = zlib.crc32(term.encode("utf-8")) & (N_FEATURES - 1)
+    return bucket
+
+
+def _term_counts(text):
+    """Return a document's sorted feature indices and how often each occurs"""
+    import numpy as np
+
+    ids = np.fromiter((_bucket(term) for term in terms(text)), dtype=np.int64)
+    return np.unique(ids, return_counts=True)
+
+
+def build_matrix(texts):
+    """Hash texts into a sparse count matrix held as (rows, columns, counts) arrays"""
+    import numpy as np
+
+    rows, columns, counts = [], [], []
+    for row, text in enumerate(texts):
+        doc_columns, doc_counts = _term_counts(text)
+        rows.append(np.full(len(doc_columns), row, dtype=np.int64))
+        columns.append(doc_columns)
+        counts.append(doc_counts)
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(rows), np.concatenate(columns), np.concatenate(counts)
+
+
+def score_resumes(job_description, resume_texts):
+    """Return the cosine similarity of each resume to the job description
+
+    Terms are weighted by sublinear term frequency and a smoothed inverse
+    document frequency over the resumes and the description, so terms
+    every applicant shares count for little.
+    """
+    import numpy as np
+
+    n = len(resume_texts)
+    rows, columns, counts = build_matrix(resume_texts)
+    job_columns, job_counts = _term_counts(job_description)
+    if n == 0:
+        return np.zeros(0)
+
+    document_frequency = np.bincount(columns, minlength=N_FEATURES)
+    document_frequency[job_columns] += 1
+    idf = np.log((2 + n) / (1 + document_frequency)) + 1
+
+    weights = (1 + np.log(counts)) * idf[columns]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=n))
+
+    job_vector = np.zeros(N_FEATURES)
+    job_vector[job_columns] = (1 + np.log(job_counts)) * idf[job_columns]
+    job_norm = np.linalg.norm(job_vector)
+    if not job_norm:
+        return np.zeros(n)
+
+    dot = np.bincount(rows, weights=weights * job_vector[columns], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nan_to_num(dot / (norms * job_norm))
+
+
+def matched_terms(job_description, resume_text, limit=MAX_MATCHED_TERMS):
+    """Return the job description's words that also appear in a resume, most frequent first"""
+    resume_words = set(terms(resume_text))
+    counts = {}
+    for term in terms(job_description):
+        if " " not in term and term in resume_words:
+            counts[term] = counts.get(term, 0) + 1
+    return sorted(counts, key=lambda term: -counts[term])[:limit]
+
+
+def shortlist(job_description, resumes, top_k):
+    """Rank (name, text) resumes against a job description
+
+    Returns a dict per resume, best match first, with its rank, score and,
+    for the top_k, the description's words it mentions.
+    """
+    import numpy as np
+
+    names = [name for name, _ in resumes]
+    texts = [text for _, text in resumes]
+    scores = score_resumes(job_description, texts)
+    # Stable, so resumes with equal scores keep their input order
+    order = np.argsort(-scores, kind="stable")
+
+    ranked = []
+    for rank, i in enumerate(order, 1):
+        entry = {"file": names[i], "rank": rank, "score": round(float(scores[i]), 4)}
+        if rank <= top_k:
+            entry["matched_terms"] = matched_terms(job_description, texts[i])
+        ranked.append(entry)
+    return ranked
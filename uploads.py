@@ -0,0 +1,157 @@
+"""
+Upload Handling for DocuSense AI
+Size and page limits that reject oversized PDFs before any extraction work,
+and spooling of large uploads to temporary files so PyMuPDF and worker
+processes open them by path instead of holding extra copies in memory
+"""
+
+import contextlib
+import hashlib
+import os
+import tempfile
+
+MB = 1024 * 1024
+
+# Uploads above this size are written to disk before PyMuPDF opens them
+SPOOL_THRESHOLD_BYTES = int(float(os.getenv("DOCUSENSE_SPOOL_THRESHOLD_MB", "8")) * MB)
+MAX_UPLOAD_BYTES = int(os.getenv("DOCUSENSE_MAX_UPLOAD_MB", "50")) * MB
+MAX_PAGES = int(os.getenv("DOCUSENSE_MAX_PAGES", "2000"))
+
+# Empty uses the system temp directory
+SPOOL_DIR = os.getenv("DOCUSENSE_SPOOL_DIR") or None
+
+SPOOL_CHUNK_BYTES = MB
+
+
+class UploadRejected(ValueError):
+    """An upload that breaks a size, page or format limit"""
+
+    def __init__(self, message, status_code=413):
+        super().__init__(message)
+        self.status_code = status_code
+
+    def __reduce__(self):
+        # Keeps the status code when raised inside a worker process
+        return UploadRejected, (str(self), self.status_code)
+
+
+def check_size(size):
+    """Reject an upload larger than DOCUSENSE_MAX_UPLOAD_MB"""
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadRejected(f"Uploads are limited to {MAX_UPLOAD_BYTES // MB} MB")
+
+
+def check_page_count(page_count):
+    """Reject a document with more pages than DOCUSENSE_MAX_PAGES"""
+    if page_count > MAX_PAGES:
+        raise UploadRejected(f"Documents are limited to {MAX_PAGES} pages; this one has {page_count}", 422)
+
+
+def _new_spool_file():
+    return tempfile.NamedTemporaryFile(prefix="docusense-", suffix=".pdf", dir=SPOOL_DIR, delete=False)
+
+
+class SpooledPdf:
+    """A PDF received in chunks, kept in memory up to a threshold and on disk beyond it
+
+    The digest is computed as chunks arrive, so caches never need the whole
+    document in memory. Use .pdf wherever a PDF is expected: it is a file path
+    once spooled and the in-memory buffer otherwise.
+    """
+
+    def __init__(self, threshold=SPOOL_THRESHOLD_BYTES, max_bytes=MAX_UPLOAD_BYTES):
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.path = None
+        self.digest = None
+        self._buffer = bytearray()
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk):
+        """Append a chunk, rejecting the upload as soon as it passes max_bytes"""
+        if self.size + len(chunk) > self.max_bytes:
+            self.close()
+            raise UploadRejected(f"Uploads are limited to {self.max_bytes // MB} MB")
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+        if self._file is None and self.size > self.threshold:
+            self._file = _new_spool_file()
+            self.path = self._file.name
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer += chunk
+
+    def finish(self):
+        """Flush to disk, check the PDF signature and return self"""
+        if self._file is not None:
+            self._file.close()
+            with open(self.path, "rb") as f:
+                head = f.read(4)
+        else:
+            head = bytes(self._buffer[:4])
+        if head != b"%PDF":
+            self.close()
+            raise UploadRejected("Request body must be a PDF document", 400)
+        self.digest = self._hash.hexdigest()
+        return self
+
+    @property
+    def pdf(self):
+        return self.path or self._buffer
+
+    def close(self):
+        """Delete the temporary file, if one was written"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path:
+            with contextlib.suppress(OSError):
+                os.remove(self.path)
+            self.path = None
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextlib.contextmanager
+def spool(data, threshold=SPOOL_THRESHOLD_BYTES):
+    """Yield data itself when small, or the path of a temporary copy on disk when large
+
+    The copy is written through memoryview slices, so no second in-memory
+    copy of the document is made.
+    """
+    if len(data) <= threshold:
+        yield data
+        return
+
+    view = memoryview(data)
+    with _new_spool_file() as f:
+        path = f.name
+        for start in range(0, len(view), SPOOL_CHUNK_BYTES):
+            f.write(view[start:start + SPOOL_CHUNK_BYTES])
+    try:
+        yield path
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+def spooled(extract):
+    """Wrap extract(pdf) so large in-memory PDFs reach it as a temporary file path
+
+    Suited to ExtractionCache.get_or_extract, which only calls it on a miss.
+    """
+    def run(data):
+        with spool(data) as pdf:
+            return extract(pdf)
+    return run